@@ -0,0 +1,453 @@
+# backtest.py
+#
+# Offline replay of recorded l2Book snapshots through the unchanged
+# market_maker_loop (or hl_ml_bot.trade_loop) on a virtual clock, against a
+# local matching simulator for post-only orders. Virtual time only advances
+# when every task is idle, so sleeps, timeouts and STALE_TIMEOUT cost nothing
+# in wall time and a run goes as fast as the strategy code allows: every
+# event runs the real (Python, per‐tick) quoting path, ~2k events/s per
+# process, so a long recording or a large grid is spread over --procs
+# processes rather than vectorized.
+#
+#   python backtest.py book.jsonl
+#   python backtest.py book.jsonl --grid QUOTE_OFFSET_TICKS=1,2,3 ORDER_SIZE_USD=25,50 --procs 8
+#   python backtest.py book.jsonl --strategy ml
+#
+# Input: one l2Book websocket message (or its "data" payload) per line, or a
+# recorder.py directory (RECORD_DIR).
+
+import argparse
+import asyncio
+import contextlib
+import importlib
+import itertools
+import json
+import os
+import selectors
+import time
+from multiprocessing import get_context
+
+import config
+import utils
+
+
+#─── virtual clock ─────────────────────────────────────────────────────────────
+class VirtualClock:
+    """
+    Simulated wall clock. The event loop runs on `elapsed` (seconds since
+    `start`): small numbers keep timer arithmetic exact, where epoch-sized
+    floats would round a sub-microsecond advance to nothing.
+    """
+
+    def __init__(self, start):
+        self.start   = start
+        self.elapsed = 0.0
+
+    def time(self):
+        return self.start + self.elapsed
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """
+    Never blocks: when the loop would wait for its next timer, jump the
+    clock there instead.
+    """
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if not events and timeout:
+            self.clock.elapsed += timeout
+        return events
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock):
+        super().__init__(_VirtualSelector(clock))
+        self.clock = clock
+
+    def time(self):
+        return self.clock.elapsed
+
+
+#─── data ──────────────────────────────────────────────────────────────────────
+def load_events(path, coin):
+    """
+    Stream (ts_ms, bids, asks) for `coin`, without loading the whole file.
+    A directory is read as a recorder.py root (binary, memory-mapped).
+    """
+    if os.path.isdir(path):
+        from recorder import BookReader
+        yield from BookReader(path, coin).events()
+        return
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            msg = json.loads(line)
+            data = msg.get("data", msg)
+            if data.get("coin") != coin:
+                continue
+            bids, asks = data["levels"]
+            if bids and asks:
+                yield data["time"], bids, asks
+
+
+#─── matching simulator ────────────────────────────────────────────────────────
+class _SimOrder:
+    __slots__ = ("oid", "is_buy", "px", "sz", "filled", "ahead", "level_sz", "seen_level")
+
+    def __init__(self, oid, is_buy, px, sz, level_sz):
+        self.oid        = oid
+        self.is_buy     = is_buy
+        self.px         = px
+        self.sz         = sz
+        self.filled     = 0.0
+        self.ahead      = level_sz or 0.0   # displayed size queued in front of us
+        self.level_sz   = level_sz          # last seen size at our price (None = no level)
+        self.seen_level = level_sz is not None
+
+
+def _level_size(levels, px):
+    for l in levels:
+        if float(l["px"]) == px:
+            return float(l["sz"])
+    return None
+
+
+class SimExchange:
+    """
+    Matching simulator with the `AsyncExchange` surface, for Alo and IOC
+    orders.
+
+    Alo orders that would cross are rejected. A resting order joins the back of
+    its price level. On every book update:
+      * the opposite side trading through our price fills us completely;
+      * our level shrinking is treated as trading at that level — it eats
+        the queue ahead of us first, then fills us (partial fills);
+      * our level disappearing while the touch moved past our price fills
+        what is left (the level was swept).
+    Fills are pushed into the fill tracker exactly like websocket userFills.
+    Maker fees/rebates come from config. An IOC order whose limit reaches
+    the touch fills completely there (reduce‐only: up to the position) and
+    pays BACKTEST_TAKER_FEE_PCT.
+    """
+
+    def __init__(self, coin, tracker, latency=None):
+        self.coin      = coin
+        self.tracker   = tracker
+        self.latency   = (config.BACKTEST_LATENCY_MS if latency is None else latency) / 1000
+        self.maker_fee = config.BASE_MAKER_FEE_PCT - config.REBATE_PCT
+        self.taker_fee = config.BACKTEST_TAKER_FEE_PCT
+        self.orders    = {}
+        self.bids      = []
+        self.asks      = []
+        self.best_bid  = 0.0
+        self.best_ask  = 0.0
+        self.ts        = 0
+        self._oid      = 0
+        self._tid      = 0
+        # account
+        self.position  = 0.0
+        self.cash      = 0.0
+        self.fees      = 0.0
+        self.volume    = 0.0
+        self.n_fills   = 0
+        self.peak      = 0.0
+        self.max_dd    = 0.0
+
+    #─── account ───────────────────────────────────────────────────────────────
+    def equity(self):
+        mid = (self.best_bid + self.best_ask) / 2
+        return self.cash + self.position * mid - self.fees
+
+    def _book_fill(self, is_buy, px, sz, fee_rate):
+        notional = px * sz
+        self.position += sz if is_buy else -sz
+        self.cash     -= notional if is_buy else -notional
+        self.fees     += notional * fee_rate
+        self.volume   += notional
+        self.n_fills  += 1
+        eq = self.equity()
+        self.peak   = max(self.peak, eq)
+        self.max_dd = max(self.max_dd, self.peak - eq)
+
+    def _push_fill(self, oid, is_buy, px, sz, fee_rate):
+        self._tid += 1
+        self._book_fill(is_buy, px, sz, fee_rate)
+        self.tracker.on_fills([{
+            "coin": self.coin, "px": str(px), "sz": str(sz),
+            "side": "B" if is_buy else "A", "time": self.ts,
+            "oid": oid, "tid": self._tid, "crossed": fee_rate == self.taker_fee,
+            "fee": str(px * sz * fee_rate),
+        }])
+
+    def _fill(self, o, sz):
+        sz = min(sz, o.sz - o.filled)
+        if sz <= 0:
+            return
+        o.filled += sz
+        self._push_fill(o.oid, o.is_buy, o.px, sz, self.maker_fee)
+        if o.sz - o.filled <= 1e-12:
+            del self.orders[o.oid]
+            self.tracker.on_order_updates([{"order": {"oid": o.oid, "coin": self.coin}, "status": "filled"}])
+
+    #─── book ──────────────────────────────────────────────────────────────────
+    def on_book(self, bids, asks, ts):
+        self.bids, self.asks, self.ts = bids, asks, ts
+        self.best_bid = float(bids[0]["px"])
+        self.best_ask = float(asks[0]["px"])
+        for o in list(self.orders.values()):
+            self._match(o)
+
+    def _match(self, o):
+        if o.is_buy:
+            if self.best_ask <= o.px:
+                return self._fill(o, o.sz)
+            swept = self.best_bid < o.px
+            sz = _level_size(self.bids, o.px) if self.best_bid >= o.px else None
+        else:
+            if self.best_bid >= o.px:
+                return self._fill(o, o.sz)
+            swept = self.best_ask > o.px
+            sz = _level_size(self.asks, o.px) if self.best_ask <= o.px else None
+
+        if sz is None:
+            if swept and o.seen_level:
+                self._fill(o, o.sz)
+            o.level_sz = None
+            return
+
+        o.seen_level = True
+        prev = o.level_sz if o.level_sz is not None else sz
+        traded = prev - sz
+        o.level_sz = sz
+        if traded > 0:
+            mine = traded - o.ahead
+            o.ahead = max(0.0, o.ahead - traded)
+            if mine > 0:
+                self._fill(o, mine)
+
+    #─── exchange surface ──────────────────────────────────────────────────────
+    def _place(self, req):
+        px, sz, is_buy = float(req["limit_px"]), float(req["sz"]), req["is_buy"]
+        if req.get("order_type", {}).get("limit", {}).get("tif") == "Ioc":
+            return self._take(px, sz, is_buy, req.get("reduce_only"))
+        if (is_buy and px >= self.best_ask) or (not is_buy and px <= self.best_bid):
+            return {"error": "Post only order would have immediately matched"}
+        self._oid += 1
+        levels = self.bids if is_buy else self.asks
+        self.orders[self._oid] = _SimOrder(self._oid, is_buy, px, sz, _level_size(levels, px))
+        return {"resting": {"oid": self._oid}}
+
+    def _take(self, px, sz, is_buy, reduce_only):
+        touch = self.best_ask if is_buy else self.best_bid
+        if reduce_only:
+            # only what closes the position
+            sz = min(sz, max(0.0, -self.position if is_buy else self.position))
+            if sz <= 0:
+                return {"error": "Reduce only order would increase position."}
+        if (is_buy and px < touch) or (not is_buy and px > touch):
+            return {"error": "Order could not immediately match against any resting orders."}
+        self._oid += 1
+        self._push_fill(self._oid, is_buy, touch, sz, self.taker_fee)
+        return {"filled": {"totalSz": str(sz), "avgPx": str(touch), "oid": self._oid}}
+
+    @staticmethod
+    def _ok(kind, statuses):
+        return {"status": "ok", "response": {"type": kind, "data": {"statuses": statuses}}}
+
+    async def bulk_orders(self, order_requests, timeout=None):
+        await asyncio.sleep(self.latency)
+        statuses = [self._place(r) for r in order_requests]
+        await asyncio.sleep(self.latency)
+        return self._ok("order", statuses)
+
+    async def order(self, coin, is_buy, sz, limit_px, order_type, reduce_only=False, cloid=None, timeout=None):
+        return await self.bulk_orders([{"is_buy": is_buy, "sz": sz, "limit_px": limit_px,
+                                        "order_type": order_type, "reduce_only": reduce_only}])
+
+    async def bulk_modify(self, modify_requests, timeout=None):
+        await asyncio.sleep(self.latency)
+        statuses = []
+        for m in modify_requests:
+            if self.orders.pop(m["oid"], None) is None:
+                statuses.append({"error": "Cannot modify canceled or filled order"})
+            else:
+                statuses.append(self._place(m["order"]))
+        await asyncio.sleep(self.latency)
+        return self._ok("order", statuses)
+
+    async def bulk_cancel(self, cancel_requests, timeout=None):
+        await asyncio.sleep(self.latency)
+        statuses = []
+        for c in cancel_requests:
+            if self.orders.pop(c["oid"], None) is None:
+                statuses.append({"error": "Order was never placed, already canceled, or filled."})
+            else:
+                statuses.append("success")
+        await asyncio.sleep(self.latency)
+        return self._ok("cancel", statuses)
+
+    async def cancel(self, coin, oid, timeout=None):
+        return await self.bulk_cancel([{"coin": coin, "oid": oid}])
+
+    async def info(self, payload, timeout=None):
+        return []
+
+    async def user_fills(self, address, timeout=None):
+        return []
+
+    async def open_orders(self, address, timeout=None):
+        return [{"coin": self.coin, "oid": oid} for oid in self.orders]
+
+    async def all_mids(self, timeout=None):
+        return {self.coin: str((self.best_bid + self.best_ask) / 2)}
+
+    async def close(self):
+        pass
+
+
+#─── runner ────────────────────────────────────────────────────────────────────
+def run_backtest(path, overrides=None, strategy="mm", verbose=False):
+    """
+    Replay `path` through one strategy with config `overrides` applied and
+    return a summary dict. Must run in a process that has not imported
+    order_manager yet (run_grid uses a fresh process per parameter set).
+    """
+    config.BACKTEST_MODE = True
+    for k, v in (overrides or {}).items():
+        setattr(config, k, v)
+
+    events = load_events(path, config.TRADING_COIN)
+    try:
+        first = next(events)
+    except StopIteration:
+        raise ValueError(f"{path}: no l2Book events for {config.TRADING_COIN}")
+
+    # import here, after the overrides, and outside the timed section
+    importlib.import_module("order_manager")
+    if strategy == "ml":
+        importlib.import_module("hl_ml_bot")
+
+    clock = VirtualClock(first[0] / 1000)
+    loop = VirtualClockLoop(clock)
+    asyncio.set_event_loop(loop)
+    utils.set_clock(clock.time)
+
+    out = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    t0 = time.perf_counter()
+    try:
+        with out:
+            sim, n = loop.run_until_complete(_run(itertools.chain([first], events), strategy))
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+    wall = time.perf_counter() - t0
+
+    pnl = sim.equity()
+    return {
+        "params": overrides or {},
+        "strategy": strategy,
+        "events": n,
+        "sim_hours": round((sim.ts - first[0]) / 3_600_000, 3),
+        "fills": sim.n_fills,
+        "volume_usd": round(sim.volume, 2),
+        "fees_usd": round(sim.fees, 4),
+        "position": round(sim.position, 6),
+        "pnl_usd": round(pnl, 4),
+        "return_pct": round(100 * pnl / config.BACKTEST_START_EQUITY, 4),
+        "max_drawdown_usd": round(sim.max_dd, 4),
+        "wall_s": round(wall, 3),
+        "events_per_s": round(n / wall) if wall else None,
+    }
+
+
+async def _run(events, strategy):
+    from fills import fill_tracker
+    from orderbook import get_book
+    import order_manager as om
+
+    book = get_book(config.TRADING_COIN)
+    sim = SimExchange(config.TRADING_COIN, fill_tracker)
+    quoter = om.get_quoter(config.TRADING_COIN)
+    om.client = quoter.engine.client = sim
+
+    done = asyncio.get_running_loop().create_future()
+
+    async def replay(*args, **kwargs):
+        n = 0
+        for ts, bids, asks in events:
+            delay = ts / 1000 - utils.now()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sim.on_book(bids, asks, ts)
+            book.update(bids, asks, ts)
+            n += 1
+            await asyncio.sleep(0)
+        done.set_result(n)
+
+    if strategy == "ml":
+        import hl_ml_bot
+        hl_ml_bot.listen_orderbook = replay   # trade_loop starts its own "listener"
+        task = asyncio.ensure_future(hl_ml_bot.trade_loop())
+    else:
+        asyncio.ensure_future(replay())
+        task = asyncio.ensure_future(om.market_maker_loop())
+
+    await asyncio.wait([done, task], return_when=asyncio.FIRST_COMPLETED)
+    if not done.done():
+        task.result()   # the strategy died: surface its exception
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return sim, done.result()
+
+
+def run_grid(path, grid, procs=None, strategy="mm"):
+    """
+    Run every combination of `grid` ({config name: [values]}) in a process
+    pool, one fresh process per parameter set.
+    """
+    keys = list(grid)
+    combos = [dict(zip(keys, vals)) for vals in itertools.product(*(grid[k] for k in keys))]
+    with get_context("spawn").Pool(procs, maxtasksperchild=1) as pool:
+        return pool.starmap(run_backtest, [(path, c, strategy) for c in combos])
+
+
+def _parse_grid(items):
+    grid = {}
+    for item in items:
+        key, _, vals = item.partition("=")
+        if not hasattr(config, key):
+            raise SystemExit(f"unknown config setting {key}")
+        parsed = []
+        for v in vals.split(","):
+            try:
+                parsed.append(json.loads(v))
+            except ValueError:
+                parsed.append(v)
+        grid[key] = parsed
+    return grid
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded l2Book data through the bot")
+    parser.add_argument("path")
+    parser.add_argument("--strategy", choices=["mm", "ml"], default="mm")
+    parser.add_argument("--grid", nargs="*", default=[], metavar="KEY=v1,v2")
+    parser.add_argument("--procs", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    grid = _parse_grid(args.grid)
+    if grid:
+        results = run_grid(args.path, grid, args.procs, args.strategy)
+        results.sort(key=lambda r: r["pnl_usd"], reverse=True)
+    else:
+        results = [run_backtest(args.path, strategy=args.strategy, verbose=args.verbose)]
+
+    for r in results:
+        print(json.dumps(r))
@@ -0,0 +1,297 @@
+# bench.py
+#
+# Hot‐path benchmarks with stored baselines: the per‐call cost of book
+# parsing, quote pricing, book signals, candle building and feature
+# extraction, and tick‐to‐order latency end to end (local_exchange pushes a
+# book over the websocket → listener → quoter → signed order/modify arrives
+# back at the server's HTTP endpoint). Everything runs offline; no keys needed.
+#
+#   python bench.py                  # run and compare with BENCH_BASELINE
+#   python bench.py --save           # run and store the results as the baseline
+#   python bench.py compute tick     # only the cases whose name contains one of these
+#
+# Exits non‐zero when a case is slower than its baseline by more than
+# BENCH_TOLERANCE. Baselines are machine‐relative: every run also times a
+# fixed reference workload (`calibrate`), stored with the baseline, and the
+# baseline is scaled by how much slower or faster that is now, so a slower
+# or busier box doesn't read as a regression. Re‐saving on the box the
+# comparison runs on is still the most precise.
+
+import asyncio
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+import config
+config.BACKTEST_MODE = True   # offline instrument rules and no key file, before order_manager loads
+
+from config import TRADING_COIN, BENCH_BASELINE, BENCH_TOLERANCE
+
+COIN = TRADING_COIN
+
+
+#─── timing ────────────────────────────────────────────────────────────────────
+def per_call(fn, args, repeat=7):
+    """
+    Best of `repeat` passes over `args`, in µs per call.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for a in args:
+            fn(*a)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(args) * 1e6
+
+
+def _levels(mid_units, tick, depth=20, rng=random):
+    bids = [{"px": f"{(mid_units - 1 - j) * tick:.6g}", "sz": f"{rng.uniform(1, 50):.2f}", "n": rng.randint(1, 5)}
+            for j in range(depth)]
+    asks = [{"px": f"{(mid_units + 1 + j) * tick:.6g}", "sz": f"{rng.uniform(1, 50):.2f}", "n": rng.randint(1, 5)}
+            for j in range(depth)]
+    return bids, asks
+
+
+#─── cases ─────────────────────────────────────────────────────────────────────
+def bench_parse(n=20_000):
+    from order_manager import parse_orderbook
+    from ws_decode import decode_l2book
+    rng = random.Random(1)
+    frames = []
+    for i in range(n):
+        bids, asks = _levels(15_000 + rng.randint(-50, 50), 0.01, rng=rng)
+        frames.append(json.dumps({"channel": "l2Book",
+                                  "data": {"coin": COIN, "time": 1_700_000_000_000 + i, "levels": [bids, asks]}}))
+    books = [(json.dumps({"bids": json.loads(f)["data"]["levels"][0], "asks": json.loads(f)["data"]["levels"][1]}),)
+             for f in frames]
+    return {
+        "parse_orderbook": per_call(parse_orderbook, books),
+        "decode_l2book":   per_call(decode_l2book, [(f,) for f in frames]),
+    }
+
+
+def bench_quotes(n=20_000):
+    from order_manager import get_quoter
+    q = get_quoter(COIN)
+    rng = random.Random(2)
+    books = []
+    for _ in range(n):
+        bid = round(rng.uniform(100, 200), 2)
+        books.append((bid, round(bid + 0.01 * rng.randint(1, 3), 2)))
+    sz = np.array([rng.randint(1, 5_000) for _ in range(20)], dtype=np.int64)
+    for i, (bid, ask) in enumerate(books[:100]):
+        q.sig.on_book(i * 0.1, bid, ask, sz, sz[::-1])   # a full window: every volatility term is live
+    return {
+        "compute_price": per_call(lambda b, a: q.compute_price("buy", b, a, 1), books),
+        "build_quotes":  per_call(q.build_quotes, books),
+    }
+
+
+def bench_candles(n=50_000):
+    import hl_ml_bot
+    from indicators import IndicatorEngine
+    rng = random.Random(3)
+    px, ticks = 150.0, []
+    for _ in range(n):
+        px *= 1 + rng.gauss(0, 1e-4)
+        ticks.append((px,))
+    out = {"add_to_candles": per_call(hl_ml_bot.add_to_candles, ticks)}
+
+    bars = [(p * 1.001, p * 0.999, p) for (p,) in ticks[:5_000]]
+    eng = IndicatorEngine()
+    out["indicators_update"] = per_call(eng.update, bars, repeat=1)
+    return out
+
+
+def bench_features(n=2_000):
+    try:
+        import pandas as pd
+        from features import extract_features
+    except ImportError as e:
+        print(f"  (extract_features skipped: {e})")
+        return {}
+    rng = random.Random(4)
+    px, rows = 150.0, []
+    for i in range(n):
+        px *= 1 + rng.gauss(0, 2e-3)
+        rows.append({"timestamp": i * 300_000, "high": px * 1.001, "low": px * 0.999, "close": px})
+    df = pd.DataFrame(rows)
+    # extract_features writes its columns into the frame: a fresh copy per call
+    return {"extract_features": per_call(lambda: extract_features(df.copy()), [()] * 10, repeat=3)}
+
+
+def bench_signals(n=100_000):
+    from signals import BookSignals
+    rng = random.Random(7)
+    t, k, books = 0.0, 15_000, []
+    for _ in range(n):
+        t += rng.expovariate(10)
+        k += rng.choice((-1, 0, 0, 1))
+        books.append((t, (k - 1) / 100, (k + 1) / 100,
+                      np.array([rng.randint(1, 5_000) for _ in range(20)], dtype=np.int64),
+                      np.array([rng.randint(1, 5_000) for _ in range(20)], dtype=np.int64)))
+    sig = BookSignals()
+    return {"signals_on_book": per_call(sig.on_book, books, repeat=1)}
+
+
+def bench_position(n=100_000):
+    from position_manager import Position
+    rng = random.Random(5)
+    fills = [(rng.choice(("buy", "sell")), round(rng.uniform(149, 151), 2), round(rng.uniform(0.01, 0.5), 2))
+             for _ in range(n)]
+    pos = Position("X")
+    return {"position_on_fill": per_call(pos.on_fill, fills)}
+
+
+#─── tick to order ─────────────────────────────────────────────────────────────
+async def _tick_to_order(ticks=300, warmup=20, gap=0.02):
+    """
+    µs from `publish_book` on the local exchange to the order or modify it
+    causes arriving there, over the real websocket listener, quoter and
+    signing HTTP client. Every push moves the book a few ticks so each one
+    needs a requote.
+    """
+    from eth_account import Account
+    from hyperliquid.exchange import Exchange
+    from exchange_client import AsyncExchange
+    from local_exchange import LocalExchange, DEFAULT_META
+    from websocket_handler import listen_orderbook
+    from order_manager import get_quoter
+
+    server = LocalExchange()
+    url = await server.start()
+    hl = await asyncio.to_thread(Exchange, Account.create(), url, meta=DEFAULT_META,
+                                 spot_meta={"universe": [], "tokens": []})
+    client = AsyncExchange(hl, base_url=url)
+    await client.signer().warm_up()
+    q = get_quoter(COIN)
+    q.engine.client = client
+
+    arrived = asyncio.Event()
+    def on_request(path, kind):
+        if path == "/exchange" and kind in ("order", "batchModify"):
+            arrived.set()
+    server.on_request = on_request
+
+    tasks = [asyncio.create_task(listen_orderbook(coins=[COIN], url=url.replace("http", "ws") + "/ws",
+                                                  standby=False, mirror=False)),
+             asyncio.create_task(q.run())]
+    rng, k, samples, missed = random.Random(6), 15_000, [], 0
+    try:
+        while not server.subscribers:
+            await asyncio.sleep(0.01)
+        for i in range(warmup + ticks):
+            k += rng.choice((-5, -4, 4, 5))
+            bids, asks = _levels(k, 0.01, rng=rng)
+            await asyncio.sleep(gap)   # let the previous requote settle
+            arrived.clear()
+            t0 = time.perf_counter()
+            await server.publish_book(COIN, bids, asks)
+            try:
+                await asyncio.wait_for(arrived.wait(), 1.0)
+            except asyncio.TimeoutError:
+                missed += 1
+                continue
+            if i >= warmup:
+                samples.append((time.perf_counter() - t0) * 1e6)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await client.close()
+        await server.stop()
+
+    if missed:
+        print(f"  ({missed} pushes caused no order)")
+    samples.sort()
+    return {
+        "tick_to_order_p50": samples[len(samples) // 2],
+        "tick_to_order_p90": samples[int(len(samples) * 0.9)],
+    }
+
+
+def bench_tick_to_order():
+    return asyncio.run(_tick_to_order())
+
+
+CASES = [bench_parse, bench_quotes, bench_signals, bench_candles, bench_features, bench_position,
+         bench_tick_to_order]
+
+
+#─── baselines ─────────────────────────────────────────────────────────────────
+def _reference(data):
+    # interpreter‐bound mix like the cases: dict/list work, string formatting, parsing
+    out = []
+    for d in data:
+        out.append(float(d["px"]) * d["n"] + len(f"{d['sz']}:{d['n']}"))
+    return json.loads(json.dumps(out))[-1]
+
+def calibrate():
+    """
+    µs for a fixed workload, the yardstick for how fast this box runs now.
+    """
+    data = [{"px": f"{150 + i * 0.01:.2f}", "sz": f"{i % 50}.5", "n": i % 7} for i in range(200)]
+    return per_call(_reference, [(data,)] * 200, repeat=15)
+
+
+def compare(results, baseline, tolerance=BENCH_TOLERANCE, scale=1.0):
+    """
+    Print every result against its baseline × `scale`; returns the names
+    that regressed.
+    """
+    slower = []
+    for name, us in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:20} {us:10.2f} µs   (no baseline)")
+            continue
+        base *= scale
+        change = us / base - 1
+        flag = ""
+        if change > tolerance:
+            slower.append(name)
+            flag = "  ← REGRESSION"
+        print(f"{name:20} {us:10.2f} µs   baseline {base:10.2f} µs   {change:+7.1%}{flag}")
+    return slower
+
+
+def main(argv):
+    save = "--save" in argv
+    only = [a for a in argv if not a.startswith("--")]
+    calib = calibrate()
+    results = {}
+    for case in CASES:
+        if only and not any(o in case.__name__ for o in only):
+            continue
+        print(f"… {case.__name__[6:]}")
+        results.update(case())
+
+    try:
+        with open(BENCH_BASELINE) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+    calib = min(calib, calibrate())   # best of before and after the cases
+    scale = calib / baseline.get("calibration", calib)
+    print(f"reference workload {calib:.2f} µs: baselines scaled ×{scale:.2f}")
+    slower = compare(results, baseline, scale=scale)
+    if save:
+        # cases not re‐run keep their times, at this box's speed
+        baseline = {k: round(v * scale, 3) for k, v in baseline.items()}
+        baseline.update({k: round(v, 3) for k, v in results.items()})
+        baseline["calibration"] = round(calib, 3)
+        with open(BENCH_BASELINE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"💾 baseline saved to {BENCH_BASELINE}")
+        return 0
+    if slower:
+        print(f"❌ {len(slower)} slower than baseline by > {BENCH_TOLERANCE:.0%}: {', '.join(slower)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
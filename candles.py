@@ -0,0 +1,248 @@
+# candles.py
+#
+# Event‐driven OHLCV bars for several timeframes at once. Every book update
+# (the mid, via OrderBook.listeners) and every public trade (price and
+# size, from the websocket "trades" channel) goes into each series, so highs
+# and lows see every move rather than whatever a polling loop happened to
+# sample. Closed bars live in a NumPy ring buffer per timeframe
+# (CANDLE_HISTORY rows of t, open, high, low, close, volume); the still‐open
+# bar is a plain list, updated in place.
+#
+# Bars are snapshotted to CANDLE_SNAPSHOT_DIR, and `warm_start` restores
+# them and then replays whatever recorder.py captured since, so a restart
+# has its history back in seconds instead of waiting for live bars.
+# Timestamps are exchange time (book.ts / trade time), the clock the
+# recordings carry too.
+
+import asyncio
+import os
+import numpy as np
+
+from config import (
+    TRADING_COIN, BACKTEST_MODE, RECORD_DIR,
+    CANDLE_INTERVALS_MIN, CANDLE_HISTORY, CANDLE_SNAPSHOT_DIR, CANDLE_SNAPSHOT_SEC,
+)
+from orderbook import PX_MUL
+
+T, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+
+class CandleSeries:
+    """
+    One timeframe. `update` returns the bar it closed, if any.
+    """
+
+    def __init__(self, minutes, size=CANDLE_HISTORY):
+        self.minutes  = minutes
+        self.interval = minutes * 60
+        self.size     = size
+        self.bars     = np.zeros((size, 6))
+        self.n        = 0      # bars closed so far (the ring holds the last `size`)
+        self.cur      = None   # open bar: [t, open, high, low, close, volume]
+
+    def update(self, t, px, vol=0.0):
+        start = t - t % self.interval
+        cur = self.cur
+        if cur is not None and start == cur[T]:
+            if px > cur[HIGH]:
+                cur[HIGH] = px
+            elif px < cur[LOW]:
+                cur[LOW] = px
+            cur[CLOSE] = px
+            cur[VOLUME] += vol
+            return None
+        if cur is not None and start < cur[T]:
+            return None   # older than the open bar (late trade print): dropped
+        closed = None
+        if cur is not None:
+            self.bars[self.n % self.size] = cur
+            self.n += 1
+            closed = cur
+        self.cur = [start, px, px, px, px, vol]
+        return closed
+
+    def __len__(self):
+        # closed bars available
+        return min(self.n, self.size)
+
+    def closed(self, k=None):
+        """
+        The last `k` (default all available) closed bars, oldest first, as a
+        (k, 6) array copy.
+        """
+        k = len(self) if k is None else min(k, len(self))
+        return self.bars[np.arange(self.n - k, self.n) % self.size]
+
+
+class CandleBuilder:
+    """
+    Every timeframe in `intervals` (minutes) for one coin. `on_close(minutes,
+    fn)` registers fn(bar) for that timeframe's closed bars, restored ones
+    included. Live inputs (`on_book`, `on_trades`) count only once `attach`
+    is called, after `warm_start` (which runs in a worker thread) is done.
+    """
+
+    def __init__(self, coin, intervals=CANDLE_INTERVALS_MIN, size=CANDLE_HISTORY,
+                 snapshot_dir=CANDLE_SNAPSHOT_DIR):
+        self.coin         = coin
+        self.series       = {m: CandleSeries(m, size) for m in intervals}
+        self.snapshot_dir = snapshot_dir
+        self.last_t       = 0.0   # newest price fed, s
+        self.live         = False   # set by attach
+        self._listeners   = {m: [] for m in intervals}
+        self._series      = list(self.series.values())
+
+    def on_close(self, minutes, fn):
+        self._listeners[minutes].append(fn)
+
+    #─── inputs ────────────────────────────────────────────────────────────────
+    def on_price(self, t, px, vol=0.0):
+        if t > self.last_t:
+            self.last_t = t
+        for s in self._series:
+            bar = s.update(t, px, vol)
+            if bar is not None:
+                for fn in self._listeners[s.minutes]:
+                    fn(bar)
+
+    def on_book(self, book):
+        # OrderBook listener: the mid, at the book's exchange time
+        if book.stale:
+            return
+        bid, ask = book.best_bid_ask()
+        self.on_price(book.ts / 1000 if book.ts else book.recv_ts, (bid + ask) / 2)
+
+    def on_trades(self, trades):
+        # websocket "trades" data: prices and sizes, volume included; the
+        # listener may start before attach, while warm_start still runs
+        if not self.live:
+            return
+        for tr in trades:
+            if tr.get("coin") == self.coin:
+                self.on_price(tr["time"] / 1000, float(tr["px"]), float(tr["sz"]))
+
+    def attach(self, book):
+        self.live = True
+        if self.on_book not in book.listeners:
+            book.listeners.append(self.on_book)
+
+    #─── snapshot ──────────────────────────────────────────────────────────────
+    def _path(self):
+        return os.path.join(self.snapshot_dir, f"{self.coin}.npz")
+
+    def save(self):
+        if BACKTEST_MODE:
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        arrays = {"last_t": np.array(self.last_t)}
+        for m, s in self.series.items():
+            arrays[f"bars_{m}"] = s.closed()
+            arrays[f"cur_{m}"] = np.array(s.cur if s.cur is not None else [], dtype=np.float64)
+        tmp = self._path() + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, self._path())
+
+    def load(self):
+        """
+        Restore the snapshot; listeners get every restored closed bar, in
+        order. Returns False if there is none.
+        """
+        try:
+            with np.load(self._path()) as z:
+                snap = {k: z[k] for k in z.files}
+        except (OSError, ValueError):
+            return False
+        self.last_t = float(snap["last_t"])
+        for m, s in self.series.items():
+            bars = snap.get(f"bars_{m}")
+            if bars is None:
+                continue   # timeframe added since the snapshot: builds from here on
+            bars = bars[-s.size:]
+            s.bars[:len(bars)] = bars
+            s.n = len(bars)
+            cur = snap[f"cur_{m}"]
+            s.cur = cur.tolist() if len(cur) else None
+            for bar in bars:
+                for fn in self._listeners[m]:
+                    fn(bar)
+        return True
+
+    def replay_recorded(self, root=RECORD_DIR):
+        """
+        Feed the mids recorder.py captured after `last_t`; returns how many.
+        """
+        from recorder import BookReader
+        n = 0
+        for a in BookReader(root, self.coin).slices(start_ms=int(self.last_t * 1000) + 1):
+            bid, ask = a["bid_px"][:, 0], a["ask_px"][:, 0]
+            ok = (bid > 0) & (ask > 0)
+            mids = ((bid[ok] + ask[ok]) / (2 * PX_MUL)).tolist()
+            for t, px in zip((a["ts"][ok] / 1000).tolist(), mids):
+                self.on_price(t, px)
+            n += len(mids)
+        return n
+
+    def warm_start(self, root=RECORD_DIR):
+        """
+        Snapshot, then recordings since. Call before attaching to a live book
+        (it runs in a worker thread). No‐op in backtests.
+        """
+        if BACKTEST_MODE:
+            return
+        restored = self.load()
+        replayed = self.replay_recorded(root)
+        bars = ", ".join(f"{m}m {len(s)}" for m, s in self.series.items())
+        print(f"🕯️  {self.coin} candles: {'snapshot' if restored else 'no snapshot'} + "
+              f"{replayed} recorded books → {bars} bars")
+
+    async def persist(self, interval=CANDLE_SNAPSHOT_SEC):
+        if BACKTEST_MODE:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.save()
+            except OSError as e:
+                print(f"[CANDLES] snapshot failed: {e}")
+
+
+_builders = {}
+
+def get_candles(coin=TRADING_COIN):
+    b = _builders.get(coin)
+    if b is None:
+        b = _builders[coin] = CandleBuilder(coin)
+    return b
+
+def save_all():
+    for b in _builders.values():
+        b.save()
+
+
+if __name__ == "__main__":
+    # per‐update cost, and the ring buffer against a pandas resample
+    import random
+    import time
+    import pandas as pd
+
+    random.seed(5)
+    n, t, px = 300_000, 1_700_000_000.0, 150.0
+    ticks = []
+    for _ in range(n):
+        t += random.expovariate(10)
+        px *= 1 + random.gauss(0, 1e-4)
+        ticks.append((t, px))
+    b = CandleBuilder("X", size=100_000, snapshot_dir=None)
+    t0 = time.perf_counter()
+    for tk in ticks:
+        b.on_price(*tk)
+    dt = time.perf_counter() - t0
+    print(f"{n} updates × {len(b.series)} timeframes: {dt / n * 1e6:.2f} µs per update")
+
+    s = pd.Series([p for _, p in ticks], index=pd.to_datetime([t for t, _ in ticks], unit="s"))
+    for m, series in b.series.items():
+        ref = s.resample(f"{m}min").ohlc().dropna().iloc[:-1]   # the last bar is still open
+        got = series.closed()
+        ok = len(ref) == len(got) and np.allclose(ref.values, got[:, OPEN:CLOSE + 1])
+        print(f"{m:>2}m: {len(got)} bars, match pandas resample: {ok}")
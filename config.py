@@ -3,51 +3,160 @@ import os
 
 # Trading pair
 TRADING_COIN      = "SOL"
+TRADING_COINS     = [TRADING_COIN]   # every coin quoted; TRADING_COIN is the default/ML coin
+SHARD_PROCESSES   = 1                # split TRADING_COINS across this many worker processes
 
 # Endpoints
 API_URL           = "wss://api.hyperliquid.xyz/ws"
 EXCHANGE_HTTP_URL = "https://api.hyperliquid.xyz"
 
+# Startup (order_manager.init_exchange)
+SDK_CONFIG_PATH    = "examples/config.json"      # secret_key / account_address, relative to the repo
+META_SNAPSHOT_PATH = "data/exchange_meta.json"   # warm‐start copy of exchange meta, refreshed on every start
+
+# HTTP execution client
+REQUEST_TIMEOUT = 2.0   # seconds per order/cancel/info request
+HTTP_POOL_SIZE  = 16    # max pooled keep-alive connections
+SIGN_WORKERS    = 2     # processes signing order actions off the event loop; 0 = sign inline
+
+# Request‐weight budget (ratelimit.py)
+RATE_LIMIT_WEIGHT          = 1200   # per IP per minute (exchange rule); split across shard processes
+RATE_LIMIT_RESERVE         = 100    # weight only cancels / flattens may spend
+RATE_LIMIT_BACKOFF_MIN_SEC = 1.0    # pause after a 429, doubling on each repeat…
+RATE_LIMIT_BACKOFF_MAX_SEC = 30.0   # …up to this
+RATE_LIMIT_SLOWDOWN        = 0.5    # share of the budget quotes and /info may use right after a 429
+RATE_LIMIT_RECOVER_SEC     = 60.0   # back to the full rate over this long
+
+# Websocket supervisor (websocket_handler.py)
+WS_BACKOFF_MIN_SEC = 0.1     # reconnect delay cap after the first failure; doubles per attempt, full jitter
+WS_BACKOFF_MAX_SEC = 10.0    # upper bound of the reconnect delay
+WS_RECV_TIMEOUT    = 15.0    # s without any message (heartbeat pongs included) = dead connection
+WS_STANDBY         = False   # hot standby l2Book connection; books go stale only when both are down
+WS_BOOK_DEPTH      = 20      # levels per side kept from each l2Book push
+BOOK_STALE_SEC     = 5.0     # a book not updated for this long counts as stale and quotes are pulled
+
 # Redis
 REDIS_HOST = "localhost"
 REDIS_PORT = 6379
+REDIS_MIRROR = True   # publish books, signals and fills to Redis Streams (redis_client.py)
+
+# Redis Streams bus (redis_client.py)
+REDIS_MAX_CONNECTIONS = 8          # pooled connections per process
+REDIS_STREAM_MAXLEN   = 100_000    # entries kept per stream (approximate trim on every XADD)
+REDIS_STREAM_QUEUE    = 50_000     # entries buffered for the publisher before the oldest are dropped
+REDIS_STREAM_BATCH    = 500        # XADDs per pipelined round trip
+REDIS_BOOK_DEPTH      = 10         # levels per side in each book entry
+REDIS_READ_COUNT      = 500        # entries per XREADGROUP
+REDIS_READ_BLOCK_MS   = 1_000      # XREADGROUP block time
+
+# l2Book recorder (recorder.py)
+RECORD_BOOK       = False          # append every l2Book push to RECORD_DIR
+RECORD_DIR        = "data/l2book"  # one subdirectory per coin
+RECORD_DEPTH      = 20             # levels kept per side
+RECORD_ROTATE_MIN = 60             # minutes per file
+RECORD_QUEUE      = 10_000         # pushes buffered for the writer thread before dropping
+
+# Shared‐memory book fan‐out (shm_book.py)
+BOOK_FEED      = "ws"     # "ws": own websocket; "shm": follow the `python shm_book.py` ingest process; "redis": follow ghostbot:book:{coin} (another host's listener)
+SHM_BOOK_DEPTH = 20       # levels per side in the shared segment
+SHM_POLL_SEC   = 0.0005   # how often followers check the change counter
+
+# Feature cache (features.py)
+FEATURE_CACHE_DIR    = "data/features"
+FEATURE_CACHE_MAX_MB = 512   # least recently used entries are deleted past this
 
 # Prometheus
 PROMETHEUS_PORT = 8000
 
+# Latency instrumentation & flight recorder (metrics.py)
+FLIGHT_RECORDER_SIZE = 2_000          # last tick‐to‐trade traces kept in memory
+FLIGHT_RECORDER_DIR  = "data/flight"  # dumps: SIGUSR1, or a failed order/cancel request
+FLIGHT_DUMP_MIN_SEC  = 60             # at most one error‐triggered dump per this many seconds
+LOOP_LAG_SEC         = 0.1            # event‐loop lag probe interval
+
 # Sizing & risk
 MAX_DELTA_USD       = 100     # absolute USD exposure cap
 ORDER_SIZE_USD      = 50      # target USD per layer
 MIN_ORDER_SIZE_USD  = 10      # minimum USD per layer
 
-# Orderbook‐imbalance tilt
+# Orderbook‐imbalance tilt (signals.py)
 IMBALANCE_THRESHOLD = 1.2     # lean into >20% depth skew
+IMBALANCE_DEPTH     = 5       # levels per side summed for the depth ratio
+IMBALANCE_SIZE_MULT = 0.5     # size on the side quoting against the lean
 
 # Quote & spread
-TICK_SIZE           = 0.01    # SOL perpetual tick
+TICK_SIZE           = None    # fixed tick for TRADING_COIN; None = exchange rule (instruments.py)
 QUOTE_OFFSET_TICKS  = 1       # base offset in ticks
 
 # Fees & rebates
 BASE_MAKER_FEE_PCT  = 0.00015  # 0.015%
 REBATE_PCT          = 0.00003  # 0.003%
+TAKER_FEE_PCT       = 0.00045  # 0.045%, paid by market (IOC) orders
+MARKET_SLIPPAGE_PCT = 0.01     # market orders: IOC limit this far through the touch
 
 # Volatility filter
 VOLATILITY_THRESHOLD_PCT = 0.005  # 0.5% mid‐price swing
+VOL_WINDOW_SEC           = 5.0    # rolling mid high/low window
+VOL_EWMA_HALFLIFE_SEC    = 30.0   # realized‐volatility EWMA half‐life
 
 # Layering settings
 NUM_LAYERS    = 3
 LAYER_OFFSETS = [1, 2, 3]   # tick multiples per layer
 
 # Timeouts & pacing
-STALE_TIMEOUT = 2.5   # seconds to auto‐cancel unmoved layer
-LOOP_SLEEP    = 0.05  # main loop interval (50 ms)
+STALE_TIMEOUT         = 2.5   # seconds to auto‐cancel unmoved layer
+LOOP_SLEEP            = 0.05  # cool-down after an auto-flatten (loop is book-driven)
+ORDER_RECONCILE_SEC   = 30.0  # open orders checked against the quote registry this often (within 1 s of a failed request)
+ORDER_RECONCILE_GRACE = 5.0   # s; younger orders we don't track may still be waiting for their ack
+
+# Fill tracking (pushed over the websocket; REST only as a fallback)
+FILL_RECONCILE_SEC = 5.0   # userFillsByTime reconciliation interval
 
-# Latency guard
-MAX_LATENCY_MS = 200  # ms to HTTP‐ping /info endpoint
+# ML filter (hl_ml_bot → market_maker_loop pause signal)
+ML_FILTER         = False  # run the model alongside the market maker in main.py
+MIN_PROB          = 0.6    # pause quoting when P(up) ≥ this or ≤ 1 − this
+ML_SIGNAL_MAX_AGE = 900    # s; older scores no longer pause quoting
+
+# Latency guard (latency.py)
+MAX_LATENCY_MS       = 200   # ms to HTTP‐ping /info endpoint; above it quotes are widened
+LATENCY_PULL_MULT    = 2.0   # above MAX_LATENCY_MS × this (or a failed ping) quotes are pulled
+LATENCY_WIDEN_MULT   = 2     # quote offset multiplier while widened
+LATENCY_PING_SEC     = 1.0   # /info RTT sample interval
+LATENCY_EWMA_ALPHA   = 0.3   # weight of the newest sample
+LATENCY_WINDOW       = 256   # samples kept per source for percentiles
+LATENCY_RECOVER_SEC  = 5.0   # latency must stay back under budget this long before quotes are restored
+LATENCY_FLOOR_SEC    = 900   # book age is measured above its minimum over this window (follows clock drift, not slowdowns)
 
 # Backtest dry‐run toggle
 BACKTEST_MODE = False
 
+# Backtest / matching simulator (backtest.py)
+BACKTEST_SZ_DECIMALS  = 2      # SOL size decimals, used offline instead of exchange meta
+BACKTEST_LATENCY_MS   = 20     # simulated one‐way order/cancel latency
+BACKTEST_TAKER_FEE_PCT = TAKER_FEE_PCT  # paid by simulated market (IOC) orders
+BACKTEST_START_EQUITY = 1000   # USD, only for reporting returns
+
+# Candles (candles.py)
+CANDLE_INTERVALS_MIN = [1, 5, 15]      # timeframes built at once (hl_ml_bot trades INTERVAL_MIN)
+CANDLE_HISTORY       = 1_000           # closed bars kept per timeframe
+CANDLE_SNAPSHOT_DIR  = "data/candles"  # one .npz per coin, for warm starts
+CANDLE_SNAPSHOT_SEC  = 60.0            # snapshot interval
+CANDLE_TRADES        = True            # also subscribe to trades (volume, trade‐price highs/lows)
+
+# Benchmarks (bench.py)
+BENCH_BASELINE  = "bench_baseline.json"   # stored results, rewritten by `python bench.py --save`
+BENCH_TOLERANCE = 0.5                     # slower than baseline by more than this fraction fails (shared boxes jitter ±30%)
+
+# Position ledger (position_manager.py)
+POSITION_SNAPSHOT_DIR  = "data/positions"   # one JSON per coin, for fast restarts
+POSITION_SNAPSHOT_SEC  = 5.0                # snapshot changed positions / publish PnL gauges this often
+POSITION_RECONCILE_SEC = 30.0               # sizes checked against clearinghouseState this often
+
 # Database
-POSTGRES_DSN = os.environ['POSTGRES_DSN']
+POSTGRES_DSN   = os.environ.get('POSTGRES_DSN')  # unset: fills go to DB_SPILL_PATH only
+DB_QUEUE_SIZE  = 10_000                   # fills buffered in memory before spilling to disk
+DB_BATCH_SIZE  = 500                      # rows per COPY
+DB_FLUSH_SEC   = 1.0                      # max time a fill waits in memory
+DB_TIMEOUT     = 5.0                      # per flush; slower counts as down
+DB_SPILL_PATH  = "data/fills_spill.jsonl" # durable fallback, replayed on reconnect/restart
 
@@ -0,0 +1,262 @@
+# db.py
+#
+# Write‐behind fill journal. `record_fill` only appends to an in‐memory
+# queue; `FillJournal.run` flushes it in batches to Postgres with COPY on a
+# small asyncpg pool, so no database round trip ever runs inside the
+# trading loop. When Postgres is slow or down (or the queue is full), rows
+# go to an append‐only JSON‐lines spill file instead; it is replayed with
+# ON CONFLICT (id) DO NOTHING once the database answers again, including on
+# the next start.
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+import asyncpg
+
+from config import (
+    TRADING_COIN, POSTGRES_DSN, BACKTEST_MODE,
+    DB_QUEUE_SIZE, DB_BATCH_SIZE, DB_FLUSH_SEC, DB_TIMEOUT, DB_SPILL_PATH,
+)
+from metrics import db_queue_depth, db_flush_seconds, db_spilled_total
+from utils import now
+
+COLUMNS = ("id", "ts", "coin", "side", "px", "sz", "fee")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fills (
+    id   text PRIMARY KEY,
+    ts   timestamptz NOT NULL,
+    coin text NOT NULL,
+    side text NOT NULL,
+    px   double precision NOT NULL,
+    sz   double precision NOT NULL,
+    fee  double precision NOT NULL
+)
+"""
+
+REPLAY_SQL = """
+INSERT INTO fills (id, ts, coin, side, px, sz, fee)
+SELECT * FROM unnest($1::text[], $2::timestamptz[], $3::text[], $4::text[],
+                     $5::float8[], $6::float8[], $7::float8[])
+ON CONFLICT (id) DO NOTHING
+"""
+
+RETRY_SEC = 5.0   # after a failure, spill straight to disk this long before trying Postgres again
+
+
+def _record(row):
+    # rows are kept JSON‐friendly (epoch ts); asyncpg wants a datetime
+    return (row[0], datetime.fromtimestamp(row[1], timezone.utc)) + tuple(row[2:])
+
+
+def _read_spill(path):
+    rows = []
+    with open(path) as f:
+        for line in f:
+            try:
+                rows.append(tuple(json.loads(line)))
+            except ValueError:
+                continue   # torn last line from a crash
+    return rows
+
+
+class FillJournal:
+    def __init__(self, dsn=POSTGRES_DSN, spill_path=DB_SPILL_PATH, max_queue=DB_QUEUE_SIZE,
+                 batch=DB_BATCH_SIZE, flush_sec=DB_FLUSH_SEC, timeout=DB_TIMEOUT):
+        self.dsn        = dsn
+        self.spill_path = spill_path
+        self.max_queue  = max_queue
+        self.batch      = batch
+        self.flush_sec  = flush_sec
+        self.timeout    = timeout
+        self.queue      = deque()
+        self.pool       = None
+        self.written    = 0
+        self.spilled    = 0
+        self._retry_at  = 0.0
+        self._wake      = None
+        self._overflow  = []     # rows past max_queue, waiting for the spill task
+        self._spilling  = None   # that task while it runs
+        self._spill_lock = threading.Lock()   # spill appends vs. the replay's rename
+        self._task      = None   # the run() task, stopped by close()
+        self._closing   = False
+
+    #─── producer side (trading loop) ──────────────────────────────────────────
+    def record(self, side, px, sz, fee, coin=TRADING_COIN):
+        row = (uuid.uuid4().hex, now(), coin, side, float(px), float(sz), float(fee))
+        if len(self.queue) >= self.max_queue:
+            # writer can't keep up: never drop a fill, never block on Postgres
+            # or on the disk (the spill file is written in a worker thread)
+            self._overflow.append(row)
+            self._depth()
+            if self._spilling is None:
+                self._spilling = asyncio.get_running_loop().create_task(self._spill_overflow())
+            return
+        self.queue.append(row)
+        self._depth()
+        if self._wake is not None and len(self.queue) >= self.batch:
+            self._wake.set()
+
+    def _depth(self):
+        # rows not yet handed to Postgres or the spill file, overflow included
+        db_queue_depth.set(len(self.queue) + len(self._overflow))
+
+    #─── writer task ───────────────────────────────────────────────────────────
+    async def run(self):
+        self._task = asyncio.current_task()
+        self._wake = asyncio.Event()
+        try:
+            if not self.dsn:
+                print(f"[DB] POSTGRES_DSN not set: journaling fills to {self.spill_path} only")
+            if await self._connect():
+                await self._replay()
+            while True:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.flush_sec)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                await self.flush()
+        except asyncio.CancelledError:
+            if not self._closing:
+                raise
+
+    async def flush(self):
+        while self.queue:
+            n = min(self.batch, len(self.queue))
+            rows = [self.queue.popleft() for _ in range(n)]
+            self._depth()
+            try:
+                ok = await self._write(rows)
+            except asyncio.CancelledError:
+                # close() stopped us mid‐write: it flushes these again (a
+                # COPY that did land makes that batch fail and spill, and
+                # the replay skips the ids already there)
+                self.queue.extendleft(reversed(rows))
+                raise
+            if not ok:
+                await asyncio.to_thread(self._spill_sync, rows)
+
+    async def close(self):
+        """
+        Stop the writer task, then flush what is queued (to Postgres or the
+        spill file) and close the pool.
+        """
+        self._closing = True
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._spilling is not None:
+            await self._spilling
+        await self.flush()
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+        print(f"[DB] journal closed: {self.written} fills written, {self.spilled} spilled")
+
+    #─── Postgres ──────────────────────────────────────────────────────────────
+    def _available(self):
+        return time.monotonic() >= self._retry_at
+
+    def _failed(self, what, e):
+        print(f"[DB] {what} failed: {e!r}; spilling to {self.spill_path}")
+        self._retry_at = time.monotonic() + RETRY_SEC
+
+    async def _connect(self):
+        if self.pool is not None:
+            return True
+        if not self.dsn or not self._available():
+            return False
+        try:
+            self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=2, timeout=self.timeout)
+            await self.pool.execute(SCHEMA, timeout=self.timeout)
+        except Exception as e:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool = None
+            self._failed("connect", e)
+            return False
+        return True
+
+    async def _write(self, rows):
+        if not self._available() or not await self._connect():
+            return False
+        if not await self._replay():   # older spilled rows first
+            return False
+        t0 = time.perf_counter()
+        try:
+            async with self.pool.acquire(timeout=self.timeout) as conn:
+                await conn.copy_records_to_table(
+                    "fills", records=[_record(r) for r in rows], columns=COLUMNS, timeout=self.timeout)
+        except Exception as e:
+            self._failed(f"COPY of {len(rows)} fills", e)
+            return False
+        db_flush_seconds.observe(time.perf_counter() - t0)
+        self.written += len(rows)
+        return True
+
+    #─── spill file ────────────────────────────────────────────────────────────
+    async def _spill_overflow(self):
+        try:
+            while self._overflow:
+                rows, self._overflow = self._overflow, []
+                self._depth()
+                await asyncio.to_thread(self._spill_sync, rows)
+        finally:
+            self._spilling = None
+
+    def _spill_sync(self, rows):
+        d = os.path.dirname(self.spill_path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with self._spill_lock, open(self.spill_path, "a") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in rows))
+            f.flush()
+            os.fsync(f.fileno())
+        self.spilled += len(rows)
+        db_spilled_total.inc(len(rows))
+
+    def _take_spill(self):
+        with self._spill_lock:
+            os.replace(self.spill_path, self.spill_path + ".replay")
+
+    async def _replay(self):
+        """
+        Move spilled rows into Postgres. The file is renamed first, so new
+        spills start a fresh file; a replay cut short is retried later and
+        the id key keeps it from double‐inserting. False if Postgres failed.
+        """
+        pending = self.spill_path + ".replay"
+        for path in (pending, self.spill_path):
+            if not os.path.exists(path):
+                continue
+            if path == self.spill_path:
+                await asyncio.to_thread(self._take_spill)
+            rows = await asyncio.to_thread(_read_spill, pending)
+            try:
+                async with self.pool.acquire(timeout=self.timeout) as conn:
+                    for i in range(0, len(rows), self.batch):
+                        cols = list(zip(*(_record(r) for r in rows[i:i + self.batch])))
+                        await conn.execute(REPLAY_SQL, *cols, timeout=self.timeout)
+            except Exception as e:
+                self._failed("spill replay", e)
+                return False
+            os.remove(pending)
+            self.written += len(rows)
+            print(f"[DB] replayed {len(rows)} spilled fills")
+        return True
+
+
+fill_journal = FillJournal()
+
+def record_fill(side, px, size, fee, coin=TRADING_COIN):
+    """
+    Journal one fill; returns immediately. Persisted by `fill_journal.run()`.
+    """
+    if not BACKTEST_MODE:
+        fill_journal.record(side, px, size, fee, coin)
@@ -0,0 +1,358 @@
+# exchange_client.py
+
+import asyncio
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import aiohttp
+from hyperliquid.utils.constants import MAINNET_API_URL
+from hyperliquid.utils.error import ClientError, ServerError
+
+from config import REQUEST_TIMEOUT, HTTP_POOL_SIZE, SIGN_WORKERS
+from ratelimit import scheduler as default_scheduler, request_weight, URGENT, QUOTE, INFO
+
+# the SDK's signing helpers pull in eth_account & co. (~0.5 s of imports):
+# loaded with the signing Exchange (order_manager.init_exchange), not here
+signing = None
+
+def load_signing():
+    global signing
+    if signing is None:
+        from hyperliquid.utils import signing as _signing
+        signing = _signing
+    return signing
+
+
+#─── signing ───────────────────────────────────────────────────────────────────
+class KeySigner:
+    """
+    The `sign_message` of an eth_account LocalAccount, holding the parsed
+    key: LocalAccount passes its raw key bytes, and eth_account derives
+    the public key from them again on every signature (~20% of its cost).
+    """
+
+    def __init__(self, wallet):
+        from eth_account import Account
+        from eth_keys import keys
+        self.wallet   = wallet
+        self._account = Account
+        self._key     = keys.PrivateKey(bytes(wallet.key))
+
+    def sign_message(self, message):
+        return self._account.sign_message(message, private_key=self._key)
+
+
+_worker_signer = None   # in a signing worker process
+
+def _init_worker(key):
+    global _worker_signer
+    from eth_account import Account
+    load_signing()
+    _worker_signer = KeySigner(Account.from_key(key))
+
+def _worker_ready():
+    return _worker_signer is not None
+
+def _worker_sign(action, vault_address, nonce, expires_after, is_mainnet):
+    return signing.sign_l1_action(_worker_signer, action, vault_address, nonce, expires_after, is_mainnet)
+
+
+class SigningPool:
+    """
+    `sign_l1_action` in SIGN_WORKERS worker processes. Signing is ~5 ms of
+    pure‐Python ECDSA that holds the GIL, so a thread would still stall the
+    event loop; in processes the websocket keeps being read meanwhile, and
+    the (up to three) actions of one requote are signed in parallel. With
+    no workers it signs inline.
+    """
+
+    def __init__(self, wallet, workers=SIGN_WORKERS):
+        self.wallet = wallet
+        self.signer = KeySigner(wallet)
+        self.pool   = None
+        if workers:
+            self.pool = ProcessPoolExecutor(workers, mp_context=get_context("spawn"),
+                                            initializer=_init_worker, initargs=(bytes(wallet.key),))
+            self._workers = workers
+
+    async def warm_up(self):
+        """
+        Start every worker (spawn + imports, ~1 s) before the first order needs one.
+        """
+        if self.pool is not None:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self.pool, _worker_ready) for _ in range(self._workers)))
+
+    async def sign(self, action, vault_address, nonce, expires_after, is_mainnet):
+        if self.pool is None:
+            return signing.sign_l1_action(self.signer, action, vault_address, nonce, expires_after, is_mainnet)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.pool, _worker_sign, action, vault_address, nonce, expires_after, is_mainnet)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncExchange:
+    """
+    Async twin of `hyperliquid.exchange.Exchange` for the hot path.
+
+    Actions are built and signed with the SDK helpers (wallet, vault and asset
+    metadata come from the wrapped sync `Exchange`), but are sent over one
+    pooled keep-alive aiohttp session, so several requests can be in flight
+    at once and none of them blocks the event loop. Every request carries its
+    own timeout, and waits for request‐weight budget in `scheduler`
+    (ratelimit.py) at its priority. Actions are signed off the event loop
+    (SigningPool).
+
+    `hl` may be None (set later) for a client that only makes /info
+    requests until then; `base_url` is then required.
+    """
+
+    def __init__(self, hl, base_url=None, timeout=REQUEST_TIMEOUT, pool_size=HTTP_POOL_SIZE,
+                 scheduler=default_scheduler, sign_workers=SIGN_WORKERS):
+        if hl is None and not base_url:
+            raise ValueError("AsyncExchange needs a signing Exchange (`hl`) or a `base_url`")
+        if hl is not None:
+            load_signing()
+        self.hl        = hl
+        self.base_url  = base_url or hl.base_url
+        self.timeout   = timeout
+        self.pool_size = pool_size
+        self.scheduler = scheduler
+        self.sign_workers = sign_workers
+        self._signer   = None   # SigningPool for hl.wallet, made on first use
+        self._session  = None
+        self._nonce    = 0
+
+    #─── transport ─────────────────────────────────────────────────────────────
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.pool_size,
+                    keepalive_timeout=60,
+                    ttl_dns_cache=300,
+                ),
+                headers={"Content-Type": "application/json"},
+                json_serialize=json.dumps,
+            )
+        return self._session
+
+    async def post(self, path, payload, timeout=None, priority=INFO):
+        """
+        Send once the scheduler admits it. A 429 backs the scheduler off;
+        an URGENT request is then retried once, after the pause.
+        """
+        weight = request_weight(path, payload)
+        for attempt in (0, 1):
+            await self.scheduler.acquire(priority, weight)
+            try:
+                resp = await self._send(path, payload, timeout)
+            except ClientError as e:
+                if e.status_code != 429:
+                    raise
+                self.scheduler.throttled()
+                if priority != URGENT or attempt:
+                    raise
+                continue
+            self.scheduler.succeeded()
+            return resp
+
+    async def _send(self, path, payload, timeout=None):
+        session = self._get_session()
+        to = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        async with session.post(self.base_url + path, json=payload, timeout=to) as resp:
+            text = await resp.text()
+            if resp.status >= 500:
+                raise ServerError(resp.status, text)
+            if resp.status >= 400:
+                try:
+                    err = json.loads(text)
+                    raise ClientError(resp.status, err.get("code"), err.get("msg"), dict(resp.headers), err.get("data"))
+                except (ValueError, AttributeError):
+                    raise ClientError(resp.status, None, text, dict(resp.headers))
+            try:
+                return json.loads(text)
+            except ValueError:
+                return {"error": f"Could not parse JSON: {text}"}
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._signer is not None:
+            self._signer.close()
+            self._signer = None
+
+    #─── signing ───────────────────────────────────────────────────────────────
+    def _next_nonce(self):
+        # concurrent requests can land in the same millisecond; nonces must be
+        # unique per signer, so keep them strictly increasing
+        self._nonce = max(int(time.time() * 1000), self._nonce + 1)
+        return self._nonce
+
+    def signer(self):
+        """
+        The SigningPool for the current `hl.wallet` (`hl` can be swapped in later).
+        """
+        if self._signer is None or self._signer.wallet is not self.hl.wallet:
+            if self._signer is not None:
+                self._signer.close()
+            load_signing()
+            self._signer = SigningPool(self.hl.wallet, self.sign_workers)
+        return self._signer
+
+    async def _post_action(self, action, timeout=None, priority=QUOTE):
+        nonce = self._next_nonce()
+        signature = await self.signer().sign(
+            action,
+            self.hl.vault_address,
+            nonce,
+            self.hl.expires_after,
+            self.base_url == MAINNET_API_URL,
+        )
+        payload = {
+            "action": action,
+            "nonce": nonce,
+            "signature": signature,
+            "vaultAddress": self.hl.vault_address,
+            "expiresAfter": self.hl.expires_after,
+        }
+        return await self.post("/exchange", payload, timeout, priority)
+
+    def _asset(self, coin):
+        return self.hl.info.name_to_asset(coin)
+
+    #─── exchange surface ──────────────────────────────────────────────────────
+    async def bulk_orders(self, order_requests, timeout=None):
+        wires = [signing.order_request_to_order_wire(o, self._asset(o["coin"])) for o in order_requests]
+        # reduce‐only orders are flattens (submit_market): they go ahead of
+        # quotes, with cancels; IOC entries (hl_ml_bot) queue as quotes
+        urgent = any(o.get("reduce_only") for o in order_requests)
+        return await self._post_action(signing.order_wires_to_order_action(wires), timeout,
+                                       URGENT if urgent else QUOTE)
+
+    async def order(self, coin, is_buy, sz, limit_px, order_type, reduce_only=False, cloid=None, timeout=None):
+        order = {
+            "coin": coin,
+            "is_buy": is_buy,
+            "sz": sz,
+            "limit_px": limit_px,
+            "order_type": order_type,
+            "reduce_only": reduce_only,
+        }
+        if cloid:
+            order["cloid"] = cloid
+        return await self.bulk_orders([order], timeout)
+
+    async def bulk_modify(self, modify_requests, timeout=None):
+        action = {
+            "type": "batchModify",
+            "modifies": [
+                {
+                    "oid": m["oid"] if isinstance(m["oid"], int) else m["oid"].to_raw(),
+                    "order": signing.order_request_to_order_wire(m["order"], self._asset(m["order"]["coin"])),
+                }
+                for m in modify_requests
+            ],
+        }
+        return await self._post_action(action, timeout)
+
+    async def bulk_cancel(self, cancel_requests, timeout=None):
+        action = {
+            "type": "cancel",
+            "cancels": [{"a": self._asset(c["coin"]), "o": c["oid"]} for c in cancel_requests],
+        }
+        return await self._post_action(action, timeout, URGENT)
+
+    async def cancel(self, coin, oid, timeout=None):
+        return await self.bulk_cancel([{"coin": coin, "oid": oid}], timeout)
+
+    #─── info ──────────────────────────────────────────────────────────────────
+    async def info(self, payload, timeout=None):
+        # identical queries already in flight share one request
+        return await self.scheduler.coalesce(payload, lambda: self.post("/info", payload, timeout))
+
+    async def ping(self, timeout=None):
+        """
+        Round trip of a small /info request (exchangeStatus, weight 2) in ms.
+        It goes ahead of queued /info requests (QUOTE priority) and the clock
+        starts once the scheduler lets it through, so time spent waiting for
+        request budget is not counted as exchange latency.
+        """
+        payload = {"type": "exchangeStatus"}
+        await self.scheduler.acquire(QUOTE, request_weight("/info", payload))
+        t0 = time.perf_counter()
+        try:
+            await self._send("/info", payload, timeout)
+        except ClientError as e:
+            if e.status_code == 429:
+                self.scheduler.throttled()
+            raise
+        self.scheduler.succeeded()
+        return (time.perf_counter() - t0) * 1e3
+
+    async def user_fills(self, address, timeout=None):
+        return await self.info({"type": "userFills", "user": address}, timeout)
+
+    async def open_orders(self, address, timeout=None):
+        return await self.info({"type": "openOrders", "user": address}, timeout)
+
+    async def all_mids(self, timeout=None):
+        return await self.info({"type": "allMids"}, timeout)
+
+
+class DryRunExchange:
+    """
+    Stand‐in for `AsyncExchange` in BACKTEST_MODE: prints what would be sent
+    and acks every order as resting under a fake oid. Nothing ever fills.
+    """
+
+    def __init__(self):
+        self._oid = int(time.time() * 1000)
+
+    def _rest(self, orders, tag):
+        statuses = []
+        for o in orders:
+            self._oid += 1
+            side = "buy" if o["is_buy"] else "sell"
+            print(f"[DRY] {tag}{side} {o['sz']}@{o['limit_px']} → {self._oid}")
+            statuses.append({"resting": {"oid": self._oid}})
+        return {"status": "ok", "response": {"type": "order", "data": {"statuses": statuses}}}
+
+    async def bulk_orders(self, order_requests, timeout=None):
+        return self._rest(order_requests, "")
+
+    async def order(self, coin, is_buy, sz, limit_px, order_type, reduce_only=False, cloid=None, timeout=None):
+        return self._rest([{"is_buy": is_buy, "sz": sz, "limit_px": limit_px}], "")
+
+    async def bulk_modify(self, modify_requests, timeout=None):
+        return self._rest([m["order"] for m in modify_requests], "modify ")
+
+    async def bulk_cancel(self, cancel_requests, timeout=None):
+        print(f"[DRY] cancel {[c['oid'] for c in cancel_requests]}")
+        statuses = ["success"] * len(cancel_requests)
+        return {"status": "ok", "response": {"type": "cancel", "data": {"statuses": statuses}}}
+
+    async def cancel(self, coin, oid, timeout=None):
+        return await self.bulk_cancel([{"coin": coin, "oid": oid}])
+
+    async def info(self, payload, timeout=None):
+        return []
+
+    async def ping(self, timeout=None):
+        return 0.0
+
+    async def user_fills(self, address, timeout=None):
+        return []
+
+    async def open_orders(self, address, timeout=None):
+        return []
+
+    async def all_mids(self, timeout=None):
+        return {}
+
+    async def close(self):
+        pass
@@ -0,0 +1,146 @@
+# features.py
+#
+# The one batch definition of the model features (pandas_ta), shared by
+# train_model, hl_ml_bot and the parity check in indicators.py, plus an
+# on‐disk cache so the same candles are never run through it twice.
+#
+# Cache entries are Parquet files, one float64 column per feature, named
+# {key}-{rows}.parquet where key hashes FEATURE_VERSION, FEATURES and the
+# input candles. A lookup tries, in order:
+#   1. an entry for exactly these candles   → read it
+#   2. an entry for a prefix of them        → compute only the appended
+#      candles (with WARMUP_BARS of history before them) and write the
+#      extended entry; the prefix entry stays, since other datasets
+#      (walk‐forward folds, a shorter training set) may share it
+#   3. nothing                              → compute everything
+# Reads touch an entry's mtime; past FEATURE_CACHE_MAX_MB the least recently
+# used entries are deleted.
+# Every indicator is a fixed window or a geometric‐decay filter, so after
+# WARMUP_BARS the restart's seed weighs < 1e‐30 and the appended rows match
+# a full recompute to float precision.
+#
+# Bump FEATURE_VERSION whenever add_indicators changes.
+
+import glob
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+import pandas_ta as ta
+
+from config import FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_MB
+from indicators import FEATURES
+
+FEATURE_VERSION = 1
+WARMUP_BARS     = 1_000
+INPUT_COLUMNS   = ["timestamp", "high", "low", "close"]
+
+
+#─── definition ────────────────────────────────────────────────────────────────
+def add_indicators(df):
+    df["rsi"] = ta.rsi(df["close"], length=14)
+    df["ema"] = ta.ema(df["close"], length=14)
+    macd = ta.macd(df["close"])
+    df["macd"] = macd["MACD_12_26_9"]
+    df["macd_signal"] = macd["MACDs_12_26_9"]
+    df["macd_hist"] = macd["MACDh_12_26_9"]
+    df["stochrsi"] = ta.stochrsi(df["close"])["STOCHRSIk_14_14_3_3"]
+    df["adx"] = ta.adx(df["high"], df["low"], df["close"])["ADX_14"]
+    df["willr"] = ta.willr(df["high"], df["low"], df["close"])
+    df["atr"] = ta.atr(df["high"], df["low"], df["close"])
+    df["roc"] = ta.roc(df["close"])
+    return df
+
+def extract_features(df):
+    """
+    Feature rows for every candle with all indicators warm.
+    """
+    df = add_indicators(df)
+    df.dropna(subset=FEATURES, inplace=True)
+    return df[FEATURES]
+
+
+#─── cache ─────────────────────────────────────────────────────────────────────
+def _digest(df, n):
+    h = hashlib.sha256(f"v{FEATURE_VERSION}:{','.join(FEATURES)}:{n}".encode())
+    for col in INPUT_COLUMNS:
+        dtype = np.int64 if col == "timestamp" else np.float64
+        h.update(np.ascontiguousarray(df[col].to_numpy()[:n], dtype=dtype).data)
+    return h.hexdigest()[:32]
+
+def _entries(cache_dir):
+    """
+    (rows, key, path) for every cache entry, longest first.
+    """
+    out = []
+    for path in glob.glob(os.path.join(cache_dir, "*-*.parquet")):
+        key, _, rows = os.path.basename(path)[:-len(".parquet")].rpartition("-")
+        if rows.isdigit():
+            out.append((int(rows), key, path))
+    return sorted(out, reverse=True)
+
+def _compute(df, start=0):
+    part = df[INPUT_COLUMNS].iloc[start:].copy()
+    return add_indicators(part)[FEATURES]
+
+def _write(feats, path):
+    tmp = path + ".tmp"
+    feats.reset_index(drop=True).to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+def _read(path):
+    os.utime(path)   # recently used
+    return pd.read_parquet(path)
+
+def _prune(cache_dir, max_bytes, keep):
+    """
+    Delete the least recently used entries (oldest mtime) until the cache
+    fits in `max_bytes`; `keep` stays. Training processes may prune the
+    same directory at once, so entries can vanish underneath.
+    """
+    sized = []
+    for _, _, path in _entries(cache_dir):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        sized.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in sized)
+    for _, size, path in sorted(sized):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def cached_features(df, cache_dir=FEATURE_CACHE_DIR, max_mb=FEATURE_CACHE_MAX_MB):
+    """
+    FEATURES for every row of `df` (NaN while warming up), aligned to its
+    index. `df` needs timestamp/high/low/close in time order.
+    """
+    n = len(df)
+    key = _digest(df, n)
+    path = os.path.join(cache_dir, f"{key}-{n}.parquet")
+    if os.path.exists(path):
+        feats = _read(path)
+        print(f"🗂️  features: {n} rows from cache")
+        return feats.set_axis(df.index)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    prefix = next((e for e in _entries(cache_dir) if e[0] < n and e[1] == _digest(df, e[0])), None)
+    if prefix is None:
+        feats = _compute(df)
+        print(f"🗂️  features: {n} rows computed")
+    else:
+        m, _, old = prefix
+        start = max(0, m - WARMUP_BARS)
+        tail = _compute(df, start).iloc[m - start:]
+        feats = pd.concat([_read(old).set_axis(df.index[:m]), tail])
+        print(f"🗂️  features: {m} rows from cache, {n - m} appended rows computed")
+    _write(feats, path)
+    _prune(cache_dir, max_mb * 2**20, keep=path)
+    return feats.set_axis(df.index)
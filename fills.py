@@ -0,0 +1,122 @@
+# fills.py
+
+import asyncio
+import time
+from collections import OrderedDict
+
+from config import FILL_RECONCILE_SEC
+
+MAX_TRACKED_OIDS = 10_000
+MAX_SEEN_TIDS    = 50_000
+
+
+class FillTracker:
+    """
+    Fills and order statuses keyed by oid, fed by the `userFills` and
+    `orderUpdates` websocket channels and back‐filled by a periodic REST
+    reconciliation. Fills are de‐duplicated on `tid`, so both sources can
+    deliver the same fill safely. Every change bumps `seq` and wakes waiters,
+    the same way `OrderBook` does.
+    """
+
+    def __init__(self):
+        self.fills        = OrderedDict()   # oid -> [fill, ...]
+        self.status       = OrderedDict()   # oid -> "open" | "filled" | "canceled" | ...
+        self.last_fill_ms = 0
+        self.seq          = 0
+        self._seen_tids   = OrderedDict()
+        self._listeners   = []
+        self._updated     = asyncio.Event()
+
+    def add_listener(self, fn):
+        """
+        `fn(fill)` is called once for every new (de‐duplicated) fill.
+        """
+        self._listeners.append(fn)
+
+    #─── ingest ────────────────────────────────────────────────────────────────
+    def on_fills(self, fills):
+        changed = False
+        for f in fills:
+            tid = f.get("tid")
+            if tid in self._seen_tids:
+                continue
+            self._seen_tids[tid] = None
+            if len(self._seen_tids) > MAX_SEEN_TIDS:
+                self._seen_tids.popitem(last=False)
+
+            oid = f.get("oid")
+            self.fills.setdefault(oid, []).append(f)
+            if len(self.fills) > MAX_TRACKED_OIDS:
+                self.fills.popitem(last=False)
+            self.last_fill_ms = max(self.last_fill_ms, f.get("time", 0))
+            for fn in self._listeners:
+                fn(f)
+            changed = True
+        if changed:
+            self._notify()
+
+    def on_order_updates(self, updates):
+        for u in updates:
+            oid = u["order"]["oid"]
+            self.status[oid] = u["status"]
+            self.status.move_to_end(oid)
+            if len(self.status) > MAX_TRACKED_OIDS:
+                self.status.popitem(last=False)
+        if updates:
+            self._notify()
+
+    def _notify(self):
+        self.seq += 1
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    #─── queries ───────────────────────────────────────────────────────────────
+    def has_fill(self, oid):
+        return oid in self.fills
+
+    def filled_size(self, oid):
+        return sum(float(f["sz"]) for f in self.fills.get(oid, ()))
+
+    def is_closed(self, oid):
+        """
+        True once the exchange reports the order as no longer resting
+        (filled, canceled, rejected, ...).
+        """
+        st = self.status.get(oid)
+        return st is not None and st != "open"
+
+    def forget(self, oid):
+        self.fills.pop(oid, None)
+        self.status.pop(oid, None)
+
+    async def wait_for_update(self, last_seq, timeout=None):
+        while self.seq == last_seq:
+            try:
+                await asyncio.wait_for(self._updated.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+        return self.seq
+
+
+fill_tracker = FillTracker()
+
+
+#─── REST fallback ─────────────────────────────────────────────────────────────
+async def reconcile_fills(client, user, tracker=fill_tracker, interval=FILL_RECONCILE_SEC):
+    """
+    Safety net for dropped websocket messages: every `interval` seconds ask
+    only for fills newer than the last one we saw (`userFillsByTime`), rather
+    than the account's whole history.
+    """
+    since = int(time.time() * 1000)
+    while True:
+        await asyncio.sleep(interval)
+        start = max(since, tracker.last_fill_ms) - 1000
+        try:
+            fills = await client.info({"type": "userFillsByTime", "user": user, "startTime": start})
+        except Exception as e:
+            print(f"[FILLS] reconcile error: {e}")
+            continue
+        if fills:
+            tracker.on_fills(fills)
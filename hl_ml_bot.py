@@ -1,130 +1,157 @@
 # hl_ml_bot.py
-import asyncio, json, redis
-import pandas as pd
-import pandas_ta as ta
-from datetime import datetime, timedelta
-from sklearn.preprocessing import StandardScaler
-from joblib import load
+import asyncio
 from websocket_handler import listen_orderbook
-from datetime import timezone
+from shm_book import follow_shared_book
+from redis_client import follow_stream_book
+from orderbook import get_book
+from indicators import IndicatorEngine, FEATURES
+from utils import now as clock_now
+from predictor import Predictor, ml_gate, MODEL_PATH
+from candles import get_candles, HIGH, LOW, CLOSE
 
 
-from config import TRADING_COIN, REDIS_HOST, REDIS_PORT, ORDER_SIZE_USD, MIN_ORDER_SIZE_USD
-from order_manager import submit_market_order
+from config import TRADING_COIN, ORDER_SIZE_USD, MIN_PROB, BOOK_FEED, CANDLE_TRADES
+from order_manager import submit_market_order, init_exchange
+from instruments import get_instrument
 
 #─── ML Setup ──────────────────────────────────────────────
-MODEL_PATH   = "model_xgb.joblib" 
-MIN_PROB     = 0.6
-INTERVAL_MIN = 5
+INTERVAL_MIN = 5    # one of CANDLE_INTERVALS_MIN
 LOOKBACK     = 50  
 
 in_position = False
 position_side = None  
-r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
-model = load(MODEL_PATH)
-scaler = StandardScaler()
+book = get_book(TRADING_COIN)
+predictor = None   # load_predictor(): not read at import
 
-candles = []
+async def load_predictor():
+    global predictor
+    if predictor is None:
+        predictor = await asyncio.to_thread(Predictor, MODEL_PATH)
+    return predictor
 
-#─── OHLC Builder ──────────────────────────────────────────
-def add_to_candles(orderbook):
-    px = (float(orderbook["bids"][0]["px"]) + float(orderbook["asks"][0]["px"])) / 2
-    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
-    now -= timedelta(minutes=now.minute % INTERVAL_MIN)
-
-    if not candles or candles[-1]['time'] != now:
-        candles.append({'time': now, 'open': px, 'high': px, 'low': px, 'close': px})
-    else:
-        candles[-1]['high'] = max(candles[-1]['high'], px)
-        candles[-1]['low'] = min(candles[-1]['low'], px)
-        candles[-1]['close'] = px
-
-    if len(candles) > LOOKBACK:
-        candles.pop(0)
-
-
-
-#─── Feature Generator ─────────────────────────────────────
-def extract_features(df):
-    df["rsi"] = ta.rsi(df["close"], length=14)
-    df["ema"] = ta.ema(df["close"], length=14)
+indicators = IndicatorEngine()
 
-    macd = ta.macd(df["close"])
-    df["macd"] = macd["MACD_12_26_9"]
-    df["macd_signal"] = macd["MACDs_12_26_9"]
-    df["macd_hist"] = macd["MACDh_12_26_9"]
-
-    df["stochrsi"] = ta.stochrsi(df["close"])["STOCHRSIk_14_14_3_3"]
-    df["adx"] = ta.adx(df["high"], df["low"], df["close"])["ADX_14"]
-    df["willr"] = ta.willr(df["high"], df["low"], df["close"])
-    df["atr"] = ta.atr(df["high"], df["low"], df["close"])
-    df["roc"] = ta.roc(df["close"])
-
-    df.dropna(inplace=True)
-    return df[["rsi", "ema", "macd", "macd_signal", "macd_hist",
-               "stochrsi", "adx", "willr", "atr", "roc"]]
+#─── OHLC Builder ──────────────────────────────────────────
+# candles.py builds every timeframe from each book update and trade; the
+# model reads the INTERVAL_MIN series
+builder = get_candles(TRADING_COIN)
+candles = builder.series[INTERVAL_MIN]
+
+def _on_candle_close(bar):
+    # a candle just closed (or was restored) → advance the indicators once
+    indicators.update(bar[HIGH], bar[LOW], bar[CLOSE])
+
+builder.on_close(INTERVAL_MIN, _on_candle_close)
+
+def add_to_candles(px):
+    # a price from outside the book/trade feeds
+    builder.on_price(clock_now(), px)
+
+async def start_candles():
+    """
+    Warm‐start the candles (snapshot, then recordings since), then follow
+    every update of the book and keep snapshotting.
+    """
+    await asyncio.to_thread(builder.warm_start)
+    builder.attach(book)
+    asyncio.create_task(builder.persist())
+
+
+
+#─── Model Score ───────────────────────────────────────────
+def score():
+    """
+    Features and model P(up) for the still-open candle (not committed), or
+    (None, None) until the indicators are warm. Also feeds `ml_gate`, the
+    pause signal market_maker_loop checks.
+    """
+    c = candles.cur
+    feats = indicators.update(c[HIGH], c[LOW], c[CLOSE], commit=False)
+    if feats is None:
+        return None, None
+    prob = predictor.predict_proba(feats)
+    ml_gate.update(prob)
+    return feats, prob
+
+
+async def signal_loop():
+    """
+    Model only, no trading: keeps `ml_gate` fresh for market_maker_loop when
+    main.py runs with ML_FILTER.
+    """
+    await asyncio.gather(load_predictor(), start_candles())
+    while True:
+        if book.ready() and candles.cur is not None:
+            score()
+        await asyncio.sleep(3)
 
 
 #─── Trading Brain ─────────────────────────────────────────
 async def trade_loop():
     print("📊 Indicator-Based Trading Loop Started")
-    asyncio.create_task(listen_orderbook())
+    # candle history first, so no book is missed between the warm start and the feed
+    await start_candles()
+    # one websocket per host: with BOOK_FEED="shm" the book comes from the ingest process,
+    # with "redis" from another host's listener (books only: trades need the websocket)
+    if BOOK_FEED == "shm":
+        asyncio.create_task(follow_shared_book())
+    elif BOOK_FEED == "redis":
+        asyncio.create_task(follow_stream_book())
+    else:
+        asyncio.create_task(listen_orderbook(on_trades=builder.on_trades if CANDLE_TRADES else None))
+    # model and exchange setup finish while the candles fill up
+    setup = asyncio.gather(load_predictor(), init_exchange())
 
     dots = ""
-    while len(candles) < LOOKBACK:
-        raw = r.get(f"{TRADING_COIN}_orderbook")
-        if raw:
-            ob = json.loads(raw)
-            add_to_candles(ob)
+    while len(candles) < LOOKBACK or candles.cur is None:
         dots += "."
-        print(f"⏳ Gathering market data{dots}", end="\r")
+        print(f"⏳ Gathering market data ({len(candles)}/{LOOKBACK} candles){dots}", end="\r")
         await asyncio.sleep(3)
 
+    await setup
     print("\n✅ Sufficient candles collected — starting trades!\n")
 
     global in_position, position_side
+    inst = get_instrument(TRADING_COIN)
 
     while True:
-        raw = r.get(f"{TRADING_COIN}_orderbook")
-        if not raw:
+        if not book.ready():
             await asyncio.sleep(1)
             continue
 
-        ob = json.loads(raw)
-        add_to_candles(ob)
-
-        df = pd.DataFrame(candles)
-        indicators = extract_features(df.copy())
-        if indicators.empty:
+        feats, prob = score()
+        if feats is None:
             await asyncio.sleep(3)
             continue
 
-        last = indicators.iloc[-1]
-        px = candles[-1]['close']
+        last = dict(zip(FEATURES, feats))
+        px = candles.cur[CLOSE]
 
         # --- BUY CONDITIONS ---
         buy_signal = (
             last["rsi"] < 30 and
             last["macd"] > last["macd_signal"] and
-            df["ema"].iloc[-1] > df["ema"].iloc[-2]
+            last["ema"] > indicators.ema_before and
+            prob >= MIN_PROB
         )
 
         # --- SELL CONDITIONS ---
         sell_signal = (
             last["rsi"] > 70 and
             last["macd"] < last["macd_signal"] and
-            df["ema"].iloc[-1] < df["ema"].iloc[-2]
+            last["ema"] < indicators.ema_before and
+            prob <= 1 - MIN_PROB
         )
 
         if buy_signal and not in_position:
-            print(f"🟢 BUY @ {px:.2f} | RSI: {last['rsi']:.2f} | MACD Crossover")
-            await submit_market_order("buy", ORDER_SIZE_USD / px)
+            print(f"🟢 BUY @ {px:.2f} | RSI: {last['rsi']:.2f} | P(up): {prob:.2f} | MACD Crossover")
+            await submit_market_order("buy", inst.size_for_usd(ORDER_SIZE_USD, px))
             in_position = True
             position_side = "long"
 
         elif sell_signal and not in_position:
-            print(f"🔴 SELL @ {px:.2f} | RSI: {last['rsi']:.2f} | MACD Crossdown")
-            await submit_market_order("sell", ORDER_SIZE_USD / px)
+            print(f"🔴 SELL @ {px:.2f} | RSI: {last['rsi']:.2f} | P(up): {prob:.2f} | MACD Crossdown")
+            await submit_market_order("sell", inst.size_for_usd(ORDER_SIZE_USD, px))
             in_position = True
             position_side = "short"
 
@@ -133,14 +160,14 @@ async def trade_loop():
             # Close long if RSI is back to neutral
             if position_side == "long" and last["rsi"] > 50:
                 print(f"⚪ CLOSE LONG @ {px:.2f} | RSI normalized")
-                await submit_market_order("sell", ORDER_SIZE_USD / px)
+                await submit_market_order("sell", inst.size_for_usd(ORDER_SIZE_USD, px), reduce_only=True)
                 in_position = False
                 position_side = None
 
             # Close short if RSI is back to neutral
             elif position_side == "short" and last["rsi"] < 50:
                 print(f"⚪ CLOSE SHORT @ {px:.2f} | RSI normalized")
-                await submit_market_order("buy", ORDER_SIZE_USD / px)
+                await submit_market_order("buy", inst.size_for_usd(ORDER_SIZE_USD, px), reduce_only=True)
                 in_position = False
                 position_side = None
 
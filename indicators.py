@@ -0,0 +1,376 @@
+# indicators.py
+#
+# Streaming versions of the pandas_ta indicators defined in features.py.
+# Each bar costs O(1) (bounded by the fixed window lengths), no
+# DataFrame is built and nothing is recomputed from history. The numbers
+# match pandas_ta's defaults computed over the whole series fed so far:
+#
+#   rsi(14), ema(14), macd(12, 26, 9), stochrsi(14, 14, 3, 3) k,
+#   adx(14), willr(14), atr(14), roc(10)
+#
+#   python indicators.py            # per-update benchmark
+#   python indicators.py --check    # parity check against pandas_ta
+
+import sys
+import numpy as np
+
+FEATURES = ["rsi", "ema", "macd", "macd_signal", "macd_hist",
+            "stochrsi", "adx", "willr", "atr", "roc"]
+
+NAN = float("nan")
+EPS = sys.float_info.epsilon
+
+
+#─── building blocks ───────────────────────────────────────────────────────────
+# Every step(x, commit) returns the indicator value after `x`; with
+# commit=False the state is left untouched, so an unfinished candle can be
+# scored on every tick without polluting the history.
+
+class _Ring:
+    """
+    Fixed‐size window over the last `size` values, preallocated.
+    """
+    __slots__ = ("buf", "size", "i", "n")
+
+    def __init__(self, size):
+        self.buf  = [NAN] * size
+        self.size = size
+        self.i    = 0
+        self.n    = 0
+
+    def full_after_push(self):
+        return self.n + 1 >= self.size
+
+    def push(self, x):
+        self.buf[self.i] = x
+        self.i = (self.i + 1) % self.size
+        self.n += 1
+
+    def ago(self, k):
+        # k = 1 → most recently pushed value
+        return self.buf[(self.i - k) % self.size]
+
+    def minmax_with(self, x):
+        old = self.buf[self.i]
+        self.buf[self.i] = x
+        lo, hi = min(self.buf), max(self.buf)
+        self.buf[self.i] = old
+        return lo, hi
+
+    def mean_with(self, x):
+        return (sum(self.buf) - self.buf[self.i] + x) / self.size
+
+
+class _RMA:
+    """
+    pandas_ta rma: ewm(alpha=1/length, adjust=True, min_periods=length).
+    """
+    __slots__ = ("decay", "length", "num", "den", "n")
+
+    def __init__(self, length):
+        self.decay  = 1.0 - 1.0 / length
+        self.length = length
+        self.num    = 0.0
+        self.den    = 0.0
+        self.n      = 0
+
+    def step(self, x, commit=True):
+        if x != x:
+            # NaN: weights still decay, the value carries over
+            num, den, n = self.num * self.decay, self.den * self.decay, self.n
+        else:
+            num = x + self.num * self.decay
+            den = 1.0 + self.den * self.decay
+            n = self.n + 1
+        if commit:
+            self.num, self.den, self.n = num, den, n
+        return num / den if n >= self.length else NAN
+
+
+class _EMA:
+    """
+    pandas_ta ema: SMA of the first `length` values as the seed, then
+    ewm(span=length, adjust=False).
+    """
+    __slots__ = ("alpha", "length", "value", "total", "n")
+
+    def __init__(self, length):
+        self.alpha  = 2.0 / (length + 1)
+        self.length = length
+        self.value  = NAN
+        self.total  = 0.0
+        self.n      = 0
+
+    def step(self, x, commit=True):
+        n = self.n + 1
+        total, value = self.total, self.value
+        if n < self.length:
+            total += x
+            out = NAN
+        elif n == self.length:
+            value = out = (total + x) / self.length
+        else:
+            value = out = value + self.alpha * (x - value)
+        if commit:
+            self.n, self.total, self.value = n, total, value
+        return out
+
+
+class _SMA:
+    __slots__ = ("ring",)
+
+    def __init__(self, length):
+        self.ring = _Ring(length)
+
+    def step(self, x, commit=True):
+        out = self.ring.mean_with(x) if self.ring.full_after_push() else NAN
+        if commit:
+            self.ring.push(x)
+        return out
+
+
+#─── indicators ────────────────────────────────────────────────────────────────
+class _RSI:
+    __slots__ = ("prev", "pos", "neg")
+
+    def __init__(self, length=14):
+        self.prev = NAN
+        self.pos  = _RMA(length)
+        self.neg  = _RMA(length)
+
+    def step(self, close, commit=True):
+        prev = self.prev
+        if commit:
+            self.prev = close
+        if prev != prev:
+            return NAN
+        d = close - prev
+        p = self.pos.step(d if d > 0 else 0.0, commit)
+        n = self.neg.step(-d if d < 0 else 0.0, commit)
+        s = p + n
+        return 100.0 * p / s if s else NAN
+
+
+class _MACD:
+    __slots__ = ("fast", "slow", "signal")
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast   = _EMA(fast)
+        self.slow   = _EMA(slow)
+        self.signal = _EMA(signal)
+
+    def step(self, close, commit=True):
+        macd = self.fast.step(close, commit) - self.slow.step(close, commit)
+        if macd != macd:
+            return NAN, NAN, NAN
+        sig = self.signal.step(macd, commit)
+        return macd, sig, macd - sig
+
+
+class _StochRSI:
+    """
+    k line of stochrsi(length=14, rsi_length=14, k=3, d=3), fed RSI values.
+    """
+    __slots__ = ("window", "k")
+
+    def __init__(self, length=14, k=3):
+        self.window = _Ring(length)
+        self.k      = _SMA(k)
+
+    def step(self, rsi, commit=True):
+        if rsi != rsi:
+            return NAN
+        full = self.window.full_after_push()
+        lo, hi = self.window.minmax_with(rsi)
+        if commit:
+            self.window.push(rsi)
+        if not full:
+            return NAN
+        rng = hi - lo
+        stoch = 100.0 * (rsi - lo) / (rng if rng else EPS)
+        return self.k.step(stoch, commit)
+
+
+class _ADXATR:
+    """
+    adx(14) and atr(14) share the true range, so they are updated together.
+    """
+    __slots__ = ("prev_h", "prev_l", "prev_c", "atr", "pos", "neg", "adx")
+
+    def __init__(self, length=14):
+        self.prev_h = self.prev_l = self.prev_c = NAN
+        self.atr = _RMA(length)
+        self.pos = _RMA(length)
+        self.neg = _RMA(length)
+        self.adx = _RMA(length)
+
+    def step(self, high, low, close, commit=True):
+        ph, pl, pc = self.prev_h, self.prev_l, self.prev_c
+        if commit:
+            self.prev_h, self.prev_l, self.prev_c = high, low, close
+        if pc != pc:
+            return NAN, NAN
+
+        hl = high - low
+        tr = max(hl if hl else EPS, abs(high - pc), abs(pc - low))
+        atr = self.atr.step(tr, commit)
+
+        up, dn = high - ph, pl - low
+        pos = up if (up > dn and up > 0) else 0.0
+        neg = dn if (dn > up and dn > 0) else 0.0
+        pos_avg = self.pos.step(pos, commit)
+        neg_avg = self.neg.step(neg, commit)
+        if atr != atr:
+            return NAN, atr
+
+        k = 100.0 / atr
+        dmp, dmn = k * pos_avg, k * neg_avg
+        s = dmp + dmn
+        dx = 100.0 * abs(dmp - dmn) / s if s else NAN
+        return self.adx.step(dx, commit), atr
+
+
+class _WillR:
+    __slots__ = ("highs", "lows")
+
+    def __init__(self, length=14):
+        self.highs = _Ring(length)
+        self.lows  = _Ring(length)
+
+    def step(self, high, low, close, commit=True):
+        full = self.highs.full_after_push()
+        _, hh = self.highs.minmax_with(high)
+        ll, _ = self.lows.minmax_with(low)
+        if commit:
+            self.highs.push(high)
+            self.lows.push(low)
+        if not full or hh == ll:
+            return NAN
+        return 100.0 * ((close - ll) / (hh - ll) - 1.0)
+
+
+class _ROC:
+    __slots__ = ("closes", "length")
+
+    def __init__(self, length=10):
+        self.closes = _Ring(length)
+        self.length = length
+
+    def step(self, close, commit=True):
+        out = NAN
+        if self.closes.n >= self.length:
+            base = self.closes.ago(self.length)
+            out = 100.0 * (close - base) / base
+        if commit:
+            self.closes.push(close)
+        return out
+
+
+#─── engine ────────────────────────────────────────────────────────────────────
+class IndicatorEngine:
+    """
+    Feed one candle at a time. `update(..., commit=True)` on candle close
+    advances the state; `update(..., commit=False)` scores the still‐open
+    candle on a tick without advancing it.
+
+    Returns the FEATURES vector (np.float64, same order as
+    `features.extract_features`), or None until every indicator is warm —
+    the streaming equivalent of extract_features' dropna. `ema_before` is
+    the EMA of the last committed bar before this update, for slope checks.
+    """
+
+    def __init__(self):
+        self.rsi      = _RSI(14)
+        self.ema      = _EMA(14)
+        self.macd     = _MACD(12, 26, 9)
+        self.stochrsi = _StochRSI(14, 3)
+        self.adx_atr  = _ADXATR(14)
+        self.willr    = _WillR(14)
+        self.roc      = _ROC(10)
+        self.n          = 0
+        self.last       = None   # last committed feature vector (or None)
+        self.ema_before = NAN
+        self._ema       = NAN    # last committed ema
+
+    def update(self, high, low, close, commit=True):
+        rsi = self.rsi.step(close, commit)
+        ema = self.ema.step(close, commit)
+        macd, sig, hist = self.macd.step(close, commit)
+        stoch = self.stochrsi.step(rsi, commit)
+        adx, atr = self.adx_atr.step(high, low, close, commit)
+        willr = self.willr.step(high, low, close, commit)
+        roc = self.roc.step(close, commit)
+
+        warm = (rsi == rsi and ema == ema and sig == sig and stoch == stoch   # NaN != NaN
+                and adx == adx and willr == willr and atr == atr and roc == roc)
+        feats = np.array((rsi, ema, macd, sig, hist, stoch, adx, willr, atr, roc)) if warm else None
+
+        self.ema_before = self._ema
+        if commit:
+            self.n += 1
+            self._ema = ema
+            self.last = feats
+        return feats
+
+    def warm(self):
+        return self.last is not None
+
+
+#─── parity check & benchmark ──────────────────────────────────────────────────
+def _random_walk(n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    spread = np.abs(rng.normal(0, 0.001, n)) * close
+    return close + spread, close - spread, close
+
+
+def check_parity(n=2000, tol=1e-9):
+    """
+    Compare every feature against pandas_ta over the full series.
+    """
+    import pandas as pd
+    from features import add_indicators
+
+    high, low, close = _random_walk(n)
+    ref = add_indicators(pd.DataFrame({"high": high, "low": low, "close": close}))
+
+    eng = IndicatorEngine()
+    rows = [eng.update(h, l, c) for h, l, c in zip(high, low, close)]
+    first = next(i for i, r in enumerate(rows) if r is not None)
+    if first != ref[FEATURES].dropna().index[0]:
+        raise AssertionError(f"warm-up differs: {first} vs {ref[FEATURES].dropna().index[0]}")
+
+    got = np.vstack(rows[first:])
+    want = ref.iloc[first:][FEATURES].to_numpy()
+    err = np.abs(got - want) / np.maximum(1.0, np.abs(want))
+    worst = err.max(axis=0)
+    for name, e in zip(FEATURES, worst):
+        print(f"  {name:12} max rel err {e:.2e}")
+    if worst.max() > tol:
+        raise AssertionError("streaming indicators diverge from pandas_ta")
+    print("✅ parity OK")
+
+
+def bench(n=200_000):
+    import time
+    high, low, close = _random_walk(n)
+    high, low, close = high.tolist(), low.tolist(), close.tolist()
+    eng = IndicatorEngine()
+    t0 = time.perf_counter()
+    for h, l, c in zip(high, low, close):
+        eng.update(h, l, c)
+    dt = time.perf_counter() - t0
+    print(f"commit  : {dt / n * 1e6:.2f} µs/update ({n / dt:,.0f} bars/s)")
+
+    t0 = time.perf_counter()
+    for h, l, c in zip(high, low, close):
+        eng.update(h, l, c, commit=False)
+    dt = time.perf_counter() - t0
+    print(f"preview : {dt / n * 1e6:.2f} µs/update")
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv:
+        check_parity()
+    else:
+        bench()
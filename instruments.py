@@ -0,0 +1,191 @@
+# instruments.py
+#
+# Per‐coin trading rules, loaded once and shared by order_manager and
+# hl_ml_bot. Hyperliquid perps: a price may have at most PX_SIG_FIGS
+# significant figures and at most MAX_DECIMALS − szDecimals decimals
+# (integer prices are always valid); sizes are multiples of 10^−szDecimals.
+#
+# Prices are handled as integer units of 10^−px_decimals and sizes as
+# integer lots of 10^−sz_decimals, so tick offsets and rounding are exact;
+# floats only appear at the edges (book in, order out).
+#
+# The exchange meta the rules come from is also kept on disk (warm‐start
+# snapshot), so a restart can build the signing Exchange without waiting
+# for it.
+
+import asyncio
+import json
+import os
+
+from config import (
+    TRADING_COIN, TICK_SIZE, BACKTEST_MODE, BACKTEST_SZ_DECIMALS,
+    EXCHANGE_HTTP_URL, META_SNAPSHOT_PATH,
+)
+from utils import now
+
+PX_SIG_FIGS  = 5
+MAX_DECIMALS = 6   # perps; spot is 8
+
+
+class Instrument:
+    """
+    Static rules for one coin. `tick_units` is the price step at a given
+    price; `snap` rounds a price onto the grid, toward the passive side for
+    quotes so a rounding step never makes an Alo order cross.
+    """
+
+    def __init__(self, coin, asset, sz_decimals, tick_size=None):
+        self.coin        = coin
+        self.asset       = asset
+        self.sz_decimals = sz_decimals
+        self.px_decimals = MAX_DECIMALS - sz_decimals
+        self.one         = 10 ** self.px_decimals   # price units per 1.0
+        self.lot_mul     = 10 ** sz_decimals        # lots per 1.0
+        # a configured tick (coarser than the exchange's) overrides the rule
+        self.tick_fixed  = round(tick_size * self.one) if tick_size else None
+
+    def __repr__(self):
+        return f"Instrument({self.coin}, asset={self.asset}, szDecimals={self.sz_decimals})"
+
+    #─── prices ────────────────────────────────────────────────────────────────
+    def px_units(self, px):
+        return round(px * self.one)
+
+    def price(self, units):
+        # exact: the float nearest the decimal, as the book sends it
+        return units / self.one
+
+    def tick_units(self, units):
+        """
+        Smallest valid price step at `units`.
+        """
+        if self.tick_fixed:
+            return self.tick_fixed
+        digits = len(str(abs(units)))   # figures of the price in units
+        return min(10 ** max(0, digits - PX_SIG_FIGS), self.one)
+
+    def snap(self, units, side=None):
+        """
+        Onto the valid grid: down for a buy, up for a sell, nearest otherwise.
+        """
+        t = self.tick_units(units)
+        if side == "buy":
+            return units - units % t
+        if side == "sell":
+            return -(-units // t) * t
+        return (units + t // 2) // t * t
+
+    def offset(self, px, ticks, side):
+        """
+        `ticks` steps away from `px`, below for a buy and above for a sell,
+        in units on the valid grid.
+        """
+        u = self.px_units(px)
+        step = round(ticks * self.tick_units(u))
+        return self.snap(u - step if side == "buy" else u + step, side)
+
+    def round_px(self, px, side=None):
+        return self.price(self.snap(self.px_units(px), side))
+
+    #─── sizes ─────────────────────────────────────────────────────────────────
+    def lots(self, sz):
+        return round(sz * self.lot_mul)
+
+    def size(self, lots):
+        return lots / self.lot_mul
+
+    def round_sz(self, sz):
+        return self.size(self.lots(sz))
+
+    def size_for_usd(self, usd, px):
+        return self.round_sz(usd / px)
+
+
+#─── registry ──────────────────────────────────────────────────────────────────
+_instruments = {}
+_info        = None   # hyperliquid Info whose meta the rules come from
+
+def use_info(info):
+    """
+    Set the metadata source (the SDK's Info, which loads meta once).
+    """
+    global _info
+    _info = info
+    _instruments.clear()
+
+def get_instrument(coin=TRADING_COIN):
+    inst = _instruments.get(coin)
+    if inst is None:
+        inst = _instruments[coin] = _load(coin)
+    return inst
+
+def _load(coin):
+    tick = TICK_SIZE if coin == TRADING_COIN else None
+    if _info is None:
+        if not BACKTEST_MODE:
+            raise RuntimeError(f"no instrument metadata for {coin}: instruments.use_info() not called")
+        return Instrument(coin, None, BACKTEST_SZ_DECIMALS, tick)
+    asset = _info.name_to_asset(coin)
+    return Instrument(coin, asset, _info.asset_to_sz_decimals[asset], tick)
+
+
+#─── warm‐start snapshot ───────────────────────────────────────────────────────
+# Perp asset ids are only ever appended, so an old snapshot still maps the
+# coins it lists correctly; order_manager refreshes it on every start anyway.
+async def fetch_meta(client):
+    """
+    (meta, spotMeta) from /info, both requests in flight at once.
+    """
+    return tuple(await asyncio.gather(client.info({"type": "meta"}), client.info({"type": "spotMeta"})))
+
+def load_meta_snapshot(path=META_SNAPSHOT_PATH, base_url=EXCHANGE_HTTP_URL):
+    """
+    (meta, spotMeta) as saved for `base_url`, or None.
+    """
+    try:
+        with open(path) as f:
+            snap = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snap.get("base_url") != base_url:
+        return None   # mainnet and testnet number assets differently
+    return snap["meta"], snap["spotMeta"]
+
+def save_meta_snapshot(meta, spot_meta, path=META_SNAPSHOT_PATH, base_url=EXCHANGE_HTTP_URL):
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"base_url": base_url, "saved": now(), "meta": meta, "spotMeta": spot_meta}, f)
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    # against the float path this replaces (tick from log10, then "%.5g" and
+    # round()): where the two disagree, and the tick at a few prices
+    import math
+    import random
+    random.seed(1)
+    for szd in (0, 2, 4):
+        inst = Instrument("X", 0, szd)
+        n = diff = 0
+        for _ in range(50_000):
+            # log‐uniform prices under 1e5 (above that any integer is valid, the float path used 10)
+            u = inst.snap(round(10 ** random.uniform(0, math.log10(1e5 * inst.one))))
+            px = inst.price(u)
+            if not 0 < px < 1e5:
+                continue
+            tick = max(10.0 ** (math.floor(math.log10(px)) - 4), 10.0 ** -(6 - szd))
+            for side, sign in (("buy", -1), ("sell", 1)):
+                n += 1
+                old = round(float(f"{px + sign * 2 * tick:.5g}"), 6 - szd)
+                new = inst.price(inst.offset(px, 2, side))
+                if old != new:
+                    diff += 1
+                    print(f"  szDecimals {szd}: {side} 2 ticks from {px}: float {old}, integer {new}")
+        print(f"szDecimals {szd}: {diff} of {n} quotes differ")
+    inst = Instrument("X", 0, 2)
+    for px in (0.012345, 1.2345, 150.01, 99_999.0, 123_456.0):
+        u = inst.px_units(px)
+        print(f"{px:>12}: tick {inst.price(inst.tick_units(u))}, buy 1 tick → {inst.price(inst.offset(px, 1, 'buy'))}")
@@ -0,0 +1,254 @@
+# latency.py
+#
+# Latency guard: stop quoting on a stale view of the market while the
+# exchange is slow. Two sources feed it:
+#   rtt  round trip of a small /info request, sampled every LATENCY_PING_SEC
+#        (AsyncExchange.ping: ahead of queued /info, queueing not counted)
+#   age  how old each l2Book push is on arrival (local receive time minus the
+#        exchange `time`), measured above its minimum over the last
+#        LATENCY_FLOOR_SEC, so the clock offset between us and the exchange
+#        cancels out and drift in it is followed, but a slowdown shorter
+#        than the window never becomes the baseline
+# Each source keeps an EWMA and a window of recent samples for percentiles.
+# The guard's mode follows the worse EWMA:
+#   OK     under MAX_LATENCY_MS
+#   WIDEN  over it: quote offsets are multiplied by LATENCY_WIDEN_MULT
+#   PULL   over MAX_LATENCY_MS × LATENCY_PULL_MULT, or a ping failed (timed
+#          out, or the connection to the exchange failed): all quotes are
+#          cancelled
+# A ping answered 429 is out of request budget, not slow — the scheduler
+# backs off and the sample is skipped — as is one that failed locally (DNS,
+# a bug).
+# It escalates on the first sample over a threshold and steps back down one
+# mode at a time (PULL → WIDEN → OK), each step only after latency has stayed
+# under that mode's threshold for LATENCY_RECOVER_SEC.
+#
+#   python latency.py    # drive the guard against local_exchange with injected delays
+
+import asyncio
+import socket
+import time
+from collections import deque
+
+import aiohttp
+from hyperliquid.utils.error import ClientError
+
+from config import (
+    MAX_LATENCY_MS, LATENCY_PULL_MULT, LATENCY_WIDEN_MULT, LATENCY_PING_SEC,
+    LATENCY_EWMA_ALPHA, LATENCY_WINDOW, LATENCY_RECOVER_SEC, LATENCY_FLOOR_SEC,
+)
+from metrics import latency_ms, exchange_latency, latency_guard_state
+from utils import now
+
+OK, WIDEN, PULL = 0, 1, 2
+MODE_NAMES = {OK: "ok", WIDEN: "widen", PULL: "pull"}
+
+
+
+class LatencyEstimator:
+    """
+    EWMA plus a window of the last `window` samples, in ms.
+    """
+
+    def __init__(self, name, alpha=LATENCY_EWMA_ALPHA, window=LATENCY_WINDOW):
+        self.name    = name
+        self.alpha   = alpha
+        self.ewma    = 0.0
+        self.last    = 0.0
+        self.count   = 0
+        self.samples = deque(maxlen=window)
+        self._hist   = latency_ms.labels(name)
+
+    def add(self, ms):
+        self.ewma   = ms if not self.count else self.ewma + self.alpha * (ms - self.ewma)
+        self.last   = ms
+        self.count += 1
+        self.samples.append(ms)
+        self._hist.observe(ms)
+
+    def percentile(self, q):
+        """
+        Nearest‐rank percentile of the window; 0 when empty.
+        """
+        if not self.samples:
+            return 0.0
+        s = sorted(self.samples)
+        return s[min(len(s) - 1, int(q / 100 * len(s)))]
+
+    def stats(self):
+        return {
+            "ewma": self.ewma,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class WindowMin:
+    """
+    Minimum of the samples seen in the last `span` seconds: a monotonic
+    deque of (second, value), at most one entry per second.
+    """
+
+    def __init__(self, span):
+        self.span = span
+        self._q   = deque()
+
+    def add(self, t, v):
+        q, sec = self._q, int(t)
+        while q and q[-1][1] >= v:
+            q.pop()
+        if not q or q[-1][0] != sec:
+            q.append((sec, v))
+        while q[0][0] <= sec - self.span:
+            q.popleft()
+        return q[0][1]
+
+
+class LatencyGuard:
+    """
+    Quote mode from exchange latency; read by market_maker_loop through
+    `mode` / `widen`, the same way it reads ml_gate.
+    """
+
+    def __init__(self, budget_ms=MAX_LATENCY_MS, pull_mult=LATENCY_PULL_MULT,
+                 widen_mult=LATENCY_WIDEN_MULT, recover_sec=LATENCY_RECOVER_SEC,
+                 floor_sec=LATENCY_FLOOR_SEC):
+        self.budget_ms   = budget_ms
+        self.pull_ms     = budget_ms * pull_mult
+        self.widen_mult  = widen_mult
+        self.recover_sec = recover_sec
+        self.rtt         = LatencyEstimator("info_rtt")
+        self.age         = LatencyEstimator("ws_age")
+        self.mode        = OK
+        self.ping_failed = False
+        self._floor      = WindowMin(floor_sec)   # ms; min raw age (clock offset + fastest path)
+        self._calm_since = None
+
+    @property
+    def widen(self):
+        """
+        Multiplier for quote offsets.
+        """
+        return self.widen_mult if self.mode == WIDEN else 1
+
+    @property
+    def paused(self):
+        return self.mode == PULL
+
+    #─── samples ───────────────────────────────────────────────────────────────
+    def on_message(self, exchange_ms, recv_ts=None):
+        """
+        One l2Book push stamped `exchange_ms` by the exchange, received at
+        `recv_ts` (local epoch seconds, default now).
+        """
+        if not exchange_ms:
+            return
+        t = now() if recv_ts is None else recv_ts
+        raw = t * 1000 - exchange_ms
+        self.age.add(raw - self._floor.add(t, raw))
+        self._evaluate()
+
+    def on_ping(self, ms):
+        self.ping_failed = ms is None
+        if ms is not None:
+            self.rtt.add(ms)
+        self._evaluate()
+
+    #─── mode ──────────────────────────────────────────────────────────────────
+    def level(self):
+        ms = max(self.rtt.ewma, self.age.ewma)
+        if self.ping_failed or ms > self.pull_ms:
+            return PULL
+        if ms > self.budget_ms:
+            return WIDEN
+        return OK
+
+    def _evaluate(self):
+        lvl = self.level()
+        if lvl > self.mode:
+            self._set(lvl)
+        elif lvl < self.mode:
+            t = now()
+            if self._calm_since is None:
+                self._calm_since = t
+            elif t - self._calm_since >= self.recover_sec:
+                # one step; the calm timer starts over for the next
+                self._set(self.mode - 1)
+                self._calm_since = t
+        else:
+            self._calm_since = None
+
+    def _set(self, mode):
+        print(f"⏱️  latency guard: {MODE_NAMES[self.mode]} → {MODE_NAMES[mode]} "
+              f"(rtt {self.rtt.ewma:.0f} ms, book age {self.age.ewma:.0f} ms, "
+              f"budget {self.budget_ms:.0f} ms{', ping failed' if self.ping_failed else ''})")
+        self.mode        = mode
+        self._calm_since = None
+        latency_guard_state.set(mode)
+
+    def publish(self):
+        for est in (self.rtt, self.age):
+            for stat, v in est.stats().items():
+                exchange_latency.labels(est.name, stat).set(v)
+
+    #─── RTT sampler ───────────────────────────────────────────────────────────
+    async def run(self, client, interval=LATENCY_PING_SEC):
+        """
+        Ping the exchange (`client.ping`) every `interval`. A request slower
+        than the pull threshold is cut off and counted as a failed ping, as
+        is a failed connection; any other error skips the sample.
+        """
+        timeout = self.pull_ms / 1000
+        while True:
+            t0 = time.perf_counter()
+            try:
+                self.on_ping(await client.ping(timeout=timeout))
+            except aiohttp.ClientConnectorError as e:
+                if isinstance(e.os_error, socket.gaierror):
+                    print(f"⏱️  latency ping: DNS lookup failed ({e}); sample skipped")
+                else:
+                    self.on_ping(None)
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError):
+                self.on_ping(None)
+            except ClientError as e:
+                if e.status_code != 429:
+                    print(f"⏱️  latency ping: HTTP {e.status_code} ({e.error_message}); sample skipped")
+            except Exception as e:
+                print(f"⏱️  latency ping: {e!r}; sample skipped")
+            self.publish()
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - t0)))
+
+
+latency_guard = LatencyGuard()
+
+
+#─── local check ───────────────────────────────────────────────────────────────
+async def _demo():
+    """
+    Run the sampler against local_exchange while stepping its injected
+    delay through ok → widen → pull → ok.
+    """
+    from exchange_client import AsyncExchange
+    from local_exchange import LocalExchange
+
+    server = LocalExchange()
+    url = await server.start()
+    client = AsyncExchange(hl=None, base_url=url)
+    guard = LatencyGuard(budget_ms=100, recover_sec=1.0)
+    task = asyncio.create_task(guard.run(client, interval=0.1))
+    try:
+        for delay_ms, secs in ((5, 1.0), (150, 1.5), (400, 1.5), (5, 3.0)):
+            server.latency = delay_ms / 1000
+            await asyncio.sleep(secs)
+            r = guard.rtt.stats()
+            print(f"injected {delay_ms:>3} ms → mode {MODE_NAMES[guard.mode]:5} "
+                  f"(ewma {r['ewma']:.0f}, p95 {r['p95']:.0f} ms)")
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await client.close()
+        await server.stop()
+
+if __name__ == "__main__":
+    asyncio.run(_demo())
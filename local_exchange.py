@@ -0,0 +1,428 @@
+# local_exchange.py
+#
+# Local stand-in for the Hyperliquid HTTP and websocket APIs, for exercising
+# the bot without live keys. Books pushed with `publish_book` (or streamed by
+# `replay` from a recording or a scripted random walk) go to l2Book
+# subscribers on /ws. Orders rest until cancelled; with `fill_on_cross` a
+# resting order fills when a pushed book trades through its price, and
+# `touch_fill_prob` also fills orders sitting at the best price with that
+# probability per push. IOC orders fill at once at the last pushed touch
+# (reduce‐only: up to the position). Fills are pushed on userFills /
+# orderUpdates.
+#
+#   python local_exchange.py --port 8080 --latency-ms 20 --walk --fill-on-cross
+#   python local_exchange.py --replay book.jsonl --speed 10 --touch-fill-prob 0.05
+#   # then EXCHANGE_HTTP_URL=http://127.0.0.1:8080, API_URL=ws://127.0.0.1:8080/ws in config.py
+
+import asyncio
+import argparse
+import json
+import random
+import time
+from collections import deque
+from aiohttp import web
+
+from ratelimit import request_weight
+
+
+DEFAULT_META = {
+    "universe": [
+        {"name": "BTC", "szDecimals": 5},
+        {"name": "ETH", "szDecimals": 4},
+        {"name": "SOL", "szDecimals": 2},
+    ]
+}
+
+
+class LocalExchange:
+    """
+    Minimal /info + /exchange + /ws server. `latency` (seconds) is applied
+    to every request and can be overridden per action/info type via
+    `latency_by_type`, e.g. {"cancel": 1.5} to simulate a slow cancel.
+    `on_request(path, type)`, when set, is called as each request arrives.
+    With `weight_per_min`, requests past that much request weight in the
+    last minute (ratelimit.request_weight) are answered 429.
+    """
+
+    def __init__(self, meta=None, latency=0.0, latency_by_type=None,
+                 fill_on_cross=False, touch_fill_prob=0.0, maker_fee=0.00015, taker_fee=0.00045,
+                 seed=None, weight_per_min=None):
+        self.meta            = meta or DEFAULT_META
+        self.latency         = latency
+        self.latency_by_type = latency_by_type or {}
+        self.weight_per_min  = weight_per_min
+        self.weight_used     = 0      # admitted request weight
+        self.throttled       = 0      # requests answered 429
+        self._weights        = deque()   # (time, weight) admitted in the last minute
+        self._window         = 0
+        self.fill_on_cross   = fill_on_cross
+        self.touch_fill_prob = touch_fill_prob
+        self.maker_fee       = maker_fee
+        self.taker_fee       = taker_fee
+        self.on_request      = None
+        self.open_orders     = {}   # oid -> order dict
+        self.fills           = []
+        self.requests        = []   # (path, type) log, handy for assertions
+        self.books           = {}   # coin -> latest l2Book data
+        self.subscribers     = {}   # websocket -> set of subscribed coins
+        self.user_sockets    = set()   # websockets subscribed to orderUpdates / userFills
+        self.trade_subscribers = {}    # websocket -> set of coins subscribed to trades
+        self._next_oid       = 1
+        self._next_tid       = 1
+        self._rng            = random.Random(seed)
+        self._runner         = None
+
+    #─── handlers ──────────────────────────────────────────────────────────────
+    def _log(self, path, kind):
+        self.requests.append((path, kind))
+        if self.on_request is not None:
+            self.on_request(path, kind)
+
+    def _over_limit(self, path, body):
+        if not self.weight_per_min:
+            return False
+        w, t = request_weight(path, body), time.monotonic()
+        while self._weights and self._weights[0][0] < t - 60:
+            self._window -= self._weights.popleft()[1]
+        if self._window + w > self.weight_per_min:
+            self.throttled += 1
+            return True
+        self._weights.append((t, w))
+        self._window += w
+        self.weight_used += w
+        return False
+
+    async def _delay(self, kind):
+        delay = self.latency_by_type.get(kind, self.latency)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def handle_info(self, request):
+        body = await request.json()
+        kind = body.get("type")
+        self._log("/info", kind)
+        if self._over_limit("/info", body):
+            return web.Response(status=429, text="rate limited")
+        await self._delay(kind)
+
+        if kind == "meta":
+            return web.json_response(self.meta)
+        if kind == "spotMeta":
+            return web.json_response({"universe": [], "tokens": []})
+        if kind == "userFills":
+            return web.json_response(self.fills)
+        if kind == "userFillsByTime":
+            start = body.get("startTime", 0)
+            return web.json_response([f for f in self.fills if f["time"] >= start])
+        if kind == "clearinghouseState":
+            return web.json_response(self.clearinghouse_state())
+        if kind == "openOrders":
+            return web.json_response(list(self.open_orders.values()))
+        if kind == "allMids":
+            return web.json_response({})
+        if kind == "exchangeStatus":
+            return web.json_response({"time": int(time.time() * 1000), "specialStatuses": None})
+        return web.json_response({"error": f"unsupported info type {kind}"}, status=400)
+
+    async def handle_exchange(self, request):
+        body = await request.json()
+        action = body["action"]
+        kind = action["type"]
+        self._log("/exchange", kind)
+        if self._over_limit("/exchange", body):
+            return web.Response(status=429, text="rate limited")
+        await self._delay(kind)
+
+        if kind == "order":
+            taken = []
+            statuses = [self._place(w, taken) for w in action["orders"]]
+            if taken:
+                await self._push_user({"channel": "userFills", "data": {"fills": taken}})
+        elif kind == "cancel":
+            statuses = [self._cancel(c["o"]) for c in action["cancels"]]
+        elif kind == "batchModify":
+            statuses = [self._modify(m["oid"], m["order"]) for m in action["modifies"]]
+        else:
+            return web.json_response({"status": "err", "response": f"unsupported action {kind}"})
+
+        return web.json_response({
+            "status": "ok",
+            "response": {"type": kind, "data": {"statuses": statuses}},
+        })
+
+    async def handle_ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        coins = self.subscribers[ws] = set()
+        try:
+            async for msg in ws:
+                if msg.type != web.WSMsgType.TEXT:
+                    continue
+                body = json.loads(msg.data)
+                method = body.get("method")
+                if method == "ping":
+                    await ws.send_json({"channel": "pong"})
+                elif method == "subscribe":
+                    sub = body["subscription"]
+                    await ws.send_json({"channel": "subscriptionResponse", "data": body})
+                    if sub.get("type") == "l2Book":
+                        coins.add(sub["coin"])
+                        if sub["coin"] in self.books:
+                            await ws.send_json({"channel": "l2Book", "data": self.books[sub["coin"]]})
+                    elif sub.get("type") == "trades":
+                        self.trade_subscribers.setdefault(ws, set()).add(sub["coin"])
+                    elif sub.get("type") in ("orderUpdates", "userFills"):
+                        self.user_sockets.add(ws)
+                        if sub["type"] == "userFills":
+                            # like the exchange: recent history first, flagged as such
+                            await ws.send_json({"channel": "userFills",
+                                                "data": {"isSnapshot": True, "fills": self.fills[-100:]}})
+        finally:
+            self.subscribers.pop(ws, None)
+            self.trade_subscribers.pop(ws, None)
+            self.user_sockets.discard(ws)
+        return ws
+
+    async def publish_book(self, coin, bids, asks, ts=None):
+        """
+        Push one l2Book snapshot to every subscriber of `coin`.
+        """
+        data = self.books[coin] = {
+            "coin": coin,
+            "time": ts or int(time.time() * 1000),
+            "levels": [bids, asks],
+        }
+        msg = json.dumps({"channel": "l2Book", "data": data})
+        for ws, coins in list(self.subscribers.items()):
+            if coin in coins and not ws.closed:
+                try:
+                    await ws.send_str(msg)
+                except ConnectionError:
+                    pass
+        if (self.fill_on_cross or self.touch_fill_prob) and bids and asks:
+            await self._match(coin, float(bids[0]["px"]), float(asks[0]["px"]), data["time"])
+
+    async def publish_trades(self, coin, trades):
+        """
+        Push public trades ([{"side", "px", "sz"}, ...]) to trades subscribers.
+        """
+        ts = int(time.time() * 1000)
+        data = []
+        for tr in trades:
+            data.append({"coin": coin, "side": tr["side"], "px": str(tr["px"]), "sz": str(tr["sz"]),
+                         "time": ts, "hash": "0x0", "tid": self._next_tid})
+            self._next_tid += 1
+        msg = json.dumps({"channel": "trades", "data": data})
+        for ws, coins in list(self.trade_subscribers.items()):
+            if coin in coins and not ws.closed:
+                try:
+                    await ws.send_str(msg)
+                except ConnectionError:
+                    pass
+
+    async def replay(self, coin, events, speed=1.0):
+        """
+        Push `events` ((ts_ms, bids, asks), e.g. backtest.load_events or
+        random_walk) as live books, spaced by their recorded gaps / `speed`
+        (0: back to back). Books are stamped with the current time.
+        """
+        prev = None
+        for ts, bids, asks in events:
+            if speed and prev is not None and ts > prev:
+                await asyncio.sleep((ts - prev) / 1000 / speed)
+            prev = ts
+            await self.publish_book(coin, bids, asks)
+
+    async def drop_websockets(self):
+        """
+        Close every websocket connection, as an exchange‐side disconnect.
+        """
+        for ws in list(self.subscribers):
+            await ws.close()
+
+    #─── fills ─────────────────────────────────────────────────────────────────
+    async def _match(self, coin, best_bid, best_ask, ts):
+        filled = []
+        for o in list(self.open_orders.values()):
+            if o["coin"] != coin:
+                continue
+            px, buy = float(o["limitPx"]), o["side"] == "B"
+            crossed = px > best_ask if buy else px < best_bid
+            at_touch = px >= best_bid if buy else px <= best_ask
+            if (self.fill_on_cross and crossed) or (
+                    at_touch and self.touch_fill_prob and self._rng.random() < self.touch_fill_prob):
+                filled.append(self._fill(o, ts))
+        if filled:
+            await self._push_user({"channel": "userFills", "data": {"fills": [f for f, _ in filled]}})
+            await self._push_user({"channel": "orderUpdates", "data": [u for _, u in filled]})
+
+    def _fill(self, o, ts):
+        # the whole order, at its limit price, as the maker
+        del self.open_orders[o["oid"]]
+        fill = {
+            "coin": o["coin"], "px": o["limitPx"], "sz": o["sz"], "side": o["side"],
+            "time": ts, "oid": o["oid"], "tid": self._next_tid, "crossed": False,
+            "fee": f"{float(o['limitPx']) * float(o['sz']) * self.maker_fee:.6f}",
+            "cloid": o.get("cloid"),
+        }
+        self._next_tid += 1
+        self.fills.append(fill)
+        return fill, {"order": dict(o, sz="0.0"), "status": "filled", "statusTimestamp": ts}
+
+    async def _push_user(self, msg):
+        text = json.dumps(msg)
+        for ws in list(self.user_sockets):
+            if not ws.closed:
+                try:
+                    await ws.send_str(text)
+                except ConnectionError:
+                    pass
+
+    #─── book‐keeping ──────────────────────────────────────────────────────────
+    def clearinghouse_state(self):
+        """
+        Positions implied by `fills` (appended by tests), in the exchange's shape.
+        """
+        pos = {}
+        for f in self.fills:
+            sz = float(f["sz"]) * (1 if f["side"] == "B" else -1)
+            qty, cost = pos.get(f["coin"], (0.0, 0.0))
+            pos[f["coin"]] = (qty + sz, cost + sz * float(f["px"]))
+        return {
+            "assetPositions": [
+                {"type": "oneWay", "position": {"coin": coin, "szi": f"{qty:g}",
+                                                "entryPx": f"{cost / qty:g}" if qty else None}}
+                for coin, (qty, cost) in pos.items() if qty
+            ],
+            "time": int(time.time() * 1000),
+        }
+
+    def _coin(self, asset):
+        return self.meta["universe"][asset]["name"]
+
+    def _place(self, wire, taken=None):
+        if wire.get("t", {}).get("limit", {}).get("tif") == "Ioc":
+            return self._take(wire, taken if taken is not None else [])
+        oid = self._next_oid
+        self._next_oid += 1
+        self.open_orders[oid] = {
+            "coin": self._coin(wire["a"]),
+            "side": "B" if wire["b"] else "A",
+            "limitPx": wire["p"],
+            "sz": wire["s"],
+            "oid": oid,
+            "timestamp": int(time.time() * 1000),
+            "cloid": wire.get("c"),
+        }
+        return {"resting": {"oid": oid}}
+
+    def _take(self, wire, taken):
+        # the whole size at the touch of the last pushed book, as the taker
+        coin, buy = self._coin(wire["a"]), wire["b"]
+        book = self.books.get(coin)
+        side = book and book["levels"][1 if buy else 0]
+        if not side:
+            return {"error": "Order could not immediately match against any resting orders."}
+        touch, sz = side[0]["px"], float(wire["s"])
+        if wire.get("r"):
+            held = sum(float(f["sz"]) * (1 if f["side"] == "B" else -1) for f in self.fills if f["coin"] == coin)
+            sz = min(sz, max(0.0, -held if buy else held))
+            if sz <= 0:
+                return {"error": "Reduce only order would increase position."}
+        if (float(wire["p"]) < float(touch)) if buy else (float(wire["p"]) > float(touch)):
+            return {"error": "Order could not immediately match against any resting orders."}
+        oid = self._next_oid
+        self._next_oid += 1
+        fill = {
+            "coin": coin, "px": touch, "sz": f"{sz:g}", "side": "B" if buy else "A",
+            "time": int(time.time() * 1000), "oid": oid, "tid": self._next_tid, "crossed": True,
+            "fee": f"{float(touch) * sz * self.taker_fee:.6f}", "cloid": wire.get("c"),
+        }
+        self._next_tid += 1
+        self.fills.append(fill)
+        taken.append(fill)
+        return {"filled": {"totalSz": fill["sz"], "avgPx": touch, "oid": oid}}
+
+    def _cancel(self, oid):
+        if self.open_orders.pop(oid, None) is None:
+            return {"error": "Order was never placed, already canceled, or filled."}
+        return "success"
+
+    def _modify(self, oid, wire):
+        if self.open_orders.pop(oid, None) is None:
+            return {"error": "Cannot modify canceled or filled order"}
+        return self._place(wire)
+
+    #─── lifecycle ─────────────────────────────────────────────────────────────
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/info", self.handle_info)
+        app.router.add_post("/exchange", self.handle_exchange)
+        app.router.add_get("/ws", self.handle_ws)
+        return app
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        Start serving; returns the base URL. Port 0 picks a free port.
+        """
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def random_walk(coin="SOL", mid=150.0, tick=0.01, depth=20, interval_ms=100, n=None, seed=None):
+    """
+    Scripted l2Book stream: the mid takes a ±1 tick step (or none) per push,
+    `depth` levels a tick apart with random sizes. Endless unless `n`.
+    """
+    rng = random.Random(seed)
+    ts, k, i = int(time.time() * 1000), round(mid / tick), 0
+    while n is None or i < n:
+        k += rng.choice((-1, 0, 0, 1))
+        bids = [{"px": f"{(k - 1 - j) * tick:.6g}", "sz": f"{rng.uniform(1, 50):.2f}", "n": rng.randint(1, 5)}
+                for j in range(depth)]
+        asks = [{"px": f"{(k + 1 + j) * tick:.6g}", "sz": f"{rng.uniform(1, 50):.2f}", "n": rng.randint(1, 5)}
+                for j in range(depth)]
+        yield ts, bids, asks
+        ts += interval_ms
+        i += 1
+
+
+async def _serve(args):
+    server = LocalExchange(latency=args.latency_ms / 1000, fill_on_cross=args.fill_on_cross,
+                           touch_fill_prob=args.touch_fill_prob)
+    url = await server.start(args.host, args.port)
+    print(f"🏦 local exchange on {url} (ws {url.replace('http', 'ws')}/ws)")
+    try:
+        while True:
+            if args.replay:
+                from backtest import load_events
+                await server.replay(args.coin, load_events(args.replay, args.coin), args.speed)
+            elif args.walk:
+                await server.replay(args.coin, random_walk(args.coin), args.speed)
+            else:
+                await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Hyperliquid stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--coin", default="SOL")
+    parser.add_argument("--replay", help="recorded l2Book .jsonl or recorder directory, looped")
+    parser.add_argument("--walk", action="store_true", help="stream a scripted random walk")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed‐up (0: as fast as possible)")
+    parser.add_argument("--fill-on-cross", action="store_true")
+    parser.add_argument("--touch-fill-prob", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(_serve(args))
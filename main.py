@@ -2,61 +2,247 @@
 
 import asyncio
 import signal
+from multiprocessing import get_context
 from websocket_handler import listen_orderbook
 from order_manager import (
     market_maker_loop,
-    cancel_order,
+    stop_quoting,
+    cancel_all_orders,
+    reconcile_orders,
     submit_market_order,
-    get_current_order_id,
-    get_net_delta,
+    load_wallet,
+    init_exchange,
+    client,
 )
-from metrics import start_metrics
+from position_manager import get_net_deltas, ledger
+from fills import reconcile_fills, fill_tracker
+from db import fill_journal
+from candles import save_all as save_candles
+from metrics import start_metrics, monitor_loop_lag, flight_recorder
+from config import (
+    ML_FILTER, BOOK_FEED, TRADING_COIN, TRADING_COINS, SHARD_PROCESSES, PROMETHEUS_PORT, CANDLE_TRADES,
+    RATE_LIMIT_WEIGHT, REDIS_MIRROR,
+)
+from shm_book import follow_shared_book
+from latency import latency_guard
+from ratelimit import scheduler
+from redis_client import bus, follow_stream_book
 
 SHUTDOWN_TIMEOUT = 5 
 
 async def graceful_shutdown():
     print("\n⚠️  Shutdown requested – cleaning up…")
 
-    # 1) Cancel any outstanding limit order
-    oid = get_current_order_id()
-    if oid is not None:
-        print(f"➖ Cancelling open order {oid}")
-        try:
-            await cancel_order(oid)
-        except Exception as e:
-            print(f"[Cleanup] cancel_order failed: {e}")
+    # 1) Stop the quoters, then mass‐cancel every resting layer in one batched request
+    print("➖ Cancelling all open orders")
+    try:
+        await stop_quoting()
+        await cancel_all_orders()
+    except Exception as e:
+        print(f"[Cleanup] cancel_all_orders failed: {e}")
 
-    # 2) Flatten any residual position with a market order
-    delta = get_net_delta()
-    if delta != 0:
+    # 2) Flatten any residual position with a market order, per coin
+    for coin, delta in get_net_deltas().items():
+        if delta == 0:
+            continue
         side = "sell" if delta > 0 else "buy"
         size = abs(delta)
-        print(f"➖ Flattening position via market order: {side} {size}")
+        print(f"➖ Flattening {coin} position via market order: {side} {size}")
         try:
-            await submit_market_order(side, size)
+            await submit_market_order(side, size, coin, reduce_only=True)
         except Exception as e:
             print(f"[Cleanup] submit_market_order failed: {e}")
 
-    # 3) Give everything a moment, then stop
+    # 3) Persist every journaled fill (Postgres, or the spill file) and the positions
+    try:
+        await fill_journal.close()
+    except Exception as e:
+        print(f"[Cleanup] fill journal close failed: {e}")
+    try:
+        await bus.close()
+    except Exception as e:
+        print(f"[Cleanup] redis stream flush failed: {e}")
+    try:
+        ledger.save()
+        save_candles()
+    except OSError as e:
+        print(f"[Cleanup] position/candle snapshot failed: {e}")
+
+    # 4) Give everything a moment, then stop
     await asyncio.sleep(1)
     print("✅ Cleanup done, exiting.")
     asyncio.get_event_loop().stop()
 
-async def main():
-    print("👻 GhostBot starting...")
-    start_metrics()
-    print("📊 Prometheus metrics server running on port 8000")
+async def run_account(feeds, coins):
+    """
+    Read the key file off the event loop, then add the account's channels
+    to the primary feed and keep reconciling its fills, positions and open
+    orders.
+    """
+    _, user = await asyncio.to_thread(load_wallet)
+    feeds[0].add_user(user)
+    await asyncio.gather(reconcile_fills(client, user), ledger.run_reconcile(client, user, coins),
+                         reconcile_orders(user))
+
+async def main(coins=None, shard=0):
+    coins = list(coins or TRADING_COINS)
+    print(f"👻 GhostBot starting ({', '.join(coins)})...")
+    start_metrics(PROMETHEUS_PORT + shard)
+    print(f"📊 Prometheus metrics server running on port {PROMETHEUS_PORT + shard}")
     print("🌐 Starting orderbook listener and market maker loop...\n")
 
     loop = asyncio.get_event_loop()
     # register our shutdown handler
     for sig in (signal.SIGINT, signal.SIGTERM):
         loop.add_signal_handler(sig, lambda: asyncio.create_task(graceful_shutdown()))
+    # `kill -USR1 <pid>`: dump the last tick‐to‐trade traces
+    loop.add_signal_handler(signal.SIGUSR1, flight_recorder.dump)
+
+    # books stream from the start; the key file, the signing SDK and the
+    # exchange meta load alongside (market_maker_loop waits for them)
+    ledger.load(coins)
+    feeds, on_trades = [], None
+    ml = ML_FILTER and TRADING_COIN in coins
+    if ml:
+        from hl_ml_bot import signal_loop, builder
+        if CANDLE_TRADES and BOOK_FEED == "ws":
+            # ignored until signal_loop's warm start is done (builder.attach)
+            on_trades = builder.on_trades
+    if REDIS_MIRROR:
+        fill_tracker.add_listener(bus.on_fill)
+        bus.start()
+    tasks = [
+        listen_orderbook(l2book=BOOK_FEED == "ws", coins=coins, feeds=feeds, on_trades=on_trades),
+        run_account(feeds, coins),
+        init_exchange(),
+        fill_journal.run(),
+        ledger.persist(),
+        market_maker_loop(coins),
+        monitor_loop_lag(),
+        latency_guard.run(client),
+    ]
+    if BOOK_FEED == "shm":
+        print("📡 Book from the shared‐memory ingest process (python shm_book.py)")
+        tasks.extend(follow_shared_book(coin) for coin in coins)
+    elif BOOK_FEED == "redis":
+        print("📡 Book from Redis Streams (another host's listener)")
+        tasks.extend(follow_stream_book(coin) for coin in coins)
+    if ml:
+        print("🧠 ML filter enabled – quoting pauses on strong model calls")
+        tasks.append(signal_loop())
+
+    await asyncio.gather(*tasks)
+
+#─── sharding ──────────────────────────────────────────────────────────────────
+def shard_coins(coins, n):
+    """
+    Round‐robin `coins` over at most `n` shards.
+    """
+    return [s for s in (coins[i::n] for i in range(n)) if s]
+
+def run_shard(coins, shard, n_shards=1):
+    # the request‐weight budget is per IP: every shard gets its share
+    scheduler.set_budget(RATE_LIMIT_WEIGHT / n_shards)
+    asyncio.run(main(coins, shard))
+
+def run_sharded(coins=TRADING_COINS, n=SHARD_PROCESSES):
+    """
+    One worker process per shard, each with its own websocket, quoting
+    loops and metrics port (PROMETHEUS_PORT + shard). Ctrl‐C reaches every
+    worker through the process group; SIGTERM is forwarded.
+    """
+    ctx = get_context("spawn")
+    shards = shard_coins(list(coins), n)
+    procs = [ctx.Process(target=run_shard, args=(s, i, len(shards)), name=f"ghostbot-shard-{i}")
+             for i, s in enumerate(shards)]
+    for p in procs:
+        p.start()
+        print(f"🧩 shard {p.name} (pid {p.pid})")
+    signal.signal(signal.SIGTERM, lambda *_: [p.terminate() for p in procs])
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for p in procs:
+        p.join()
+
+#─── cold start ────────────────────────────────────────────────────────────────
+_CHILD = """
+import time; t0 = time.perf_counter()
+import sys, config
+url, key, snapshot, port = sys.argv[1:5]
+config.EXCHANGE_HTTP_URL  = url
+config.API_URL            = url.replace("http", "ws") + "/ws"
+config.SDK_CONFIG_PATH    = key
+config.META_SNAPSHOT_PATH = snapshot
+config.PROMETHEUS_PORT    = int(port)
+config.TRADING_COINS      = [config.TRADING_COIN]
+config.REDIS_MIRROR = config.ML_FILTER = False
+config.BOOK_FEED          = "ws"
+import asyncio, main
+print(f"imported {(time.perf_counter() - t0) * 1e3:.0f}", flush=True)
+asyncio.run(main.main())
+"""
+
+async def _cold_start_bench(runs=3, rtt_ms=100):
+    """
+    Process start → first quote on the exchange, against local_exchange
+    with `rtt_ms` on every request: once without a meta snapshot (cold),
+    then with the one that run left behind (warm).
+    """
+    import json, os, socket, sys, tempfile, time
+    from eth_account import Account
+    from local_exchange import LocalExchange
+
+    server = LocalExchange(latency=rtt_ms / 1000)
+    url = await server.start()
+    tmp = tempfile.mkdtemp()
+    key, snapshot = os.path.join(tmp, "key.json"), os.path.join(tmp, "meta.json")
+    acct = Account.create()
+    with open(key, "w") as f:
+        json.dump({"secret_key": acct.key.hex(), "account_address": acct.address}, f)
+
+    async def publish():
+        while True:
+            await server.publish_book(TRADING_COIN, [{"px": "150.0", "sz": "10", "n": 1}],
+                                      [{"px": "150.1", "sz": "10", "n": 1}])
+            await asyncio.sleep(0.1)
+    pusher = asyncio.create_task(publish())
+
+    async def one():
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        server.requests.clear()
+        t0 = time.perf_counter()
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-c", _CHILD, url, key, snapshot, str(port),
+            cwd=os.path.dirname(os.path.abspath(__file__)), stdout=asyncio.subprocess.PIPE)
+        imported = float((await proc.stdout.readline()).split()[1])
+        while ("/exchange", "order") not in server.requests:
+            if proc.returncode is not None:
+                raise RuntimeError("bot exited before quoting")
+            await asyncio.sleep(0.001)
+        dt = (time.perf_counter() - t0) * 1e3
+        proc.kill()
+        await proc.wait()
+        return imported, dt
 
-    await asyncio.gather(
-        listen_orderbook(),
-        market_maker_loop()
-    )
+    try:
+        for label in ("cold", "warm"):
+            for _ in range(runs):
+                if label == "cold" and os.path.exists(snapshot):
+                    os.remove(snapshot)
+                imported, dt = await one()
+                print(f"{label}: imports {imported:5.0f} ms, process start → first quote {dt:5.0f} ms")
+    finally:
+        pusher.cancel()
+        await server.stop()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    import sys
+    if "--cold-start" in sys.argv:
+        # python main.py --cold-start [rtt_ms]
+        args = sys.argv[sys.argv.index("--cold-start") + 1:]
+        asyncio.run(_cold_start_bench(rtt_ms=float(args[0]) if args else 100))
+    elif SHARD_PROCESSES > 1 and len(TRADING_COINS) > 1:
+        run_sharded()
+    else:
+        asyncio.run(main())
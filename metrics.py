@@ -1,6 +1,15 @@
 # metrics.py
-from prometheus_client import start_http_server, Gauge, Counter
-from config import PROMETHEUS_PORT
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from prometheus_client import start_http_server, Gauge, Counter, Histogram
+from config import (
+    PROMETHEUS_PORT,
+    FLIGHT_RECORDER_SIZE, FLIGHT_RECORDER_DIR, FLIGHT_DUMP_MIN_SEC, LOOP_LAG_SEC,
+)
 
 # total rebates collected (USD)
 rebate_total = Counter(
@@ -11,15 +20,227 @@ rebate_total = Counter(
 # current position exposure (USD)
 delta_exposure = Gauge(
     "ghostbot_delta_exposure_usd",
-    "Current unrealized net position in USD"
+    "Current unrealized net position in USD",
+    ["coin"]
 )
 
 # total realized PnL (USD)
 realized_pnl = Gauge(
     "ghostbot_realized_pnl_usd",
-    "Cumulative realized PnL in USD"
+    "Cumulative realized PnL in USD, net of fees and rebates"
+)
+
+# position ledger (position_manager.py)
+unrealized_pnl = Gauge(
+    "ghostbot_unrealized_pnl_usd",
+    "Open position marked to the mid, in USD",
+    ["coin"]
+)
+position_resyncs_total = Counter(
+    "ghostbot_position_resyncs_total",
+    "Positions reset to the exchange's clearinghouse state",
+    ["coin"]
+)
+
+# fill journal (db.py)
+db_queue_depth = Gauge(
+    "ghostbot_db_queue_depth",
+    "Fills waiting in memory for the database writer or, past DB_QUEUE_SIZE, for the spill file"
+)
+db_flush_seconds = Histogram(
+    "ghostbot_db_flush_seconds",
+    "Time to write one batch of fills to Postgres",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+db_spilled_total = Counter(
+    "ghostbot_db_spilled_fills_total",
+    "Fills written to the local spill file instead of Postgres"
+)
+
+# hot‐path latency, one histogram labelled by stage
+latency_ms = Histogram(
+    "ghostbot_latency_ms",
+    "Hot‐path latency in ms, by pipeline stage",
+    ["stage"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+# children bound once, so observing skips the label lookup
+ws_parse_ms   = latency_ms.labels("ws_parse")     # websocket frame received → book updated
+decision_ms   = latency_ms.labels("decision")     # book frame received → quotes decided
+submit_rtt_ms = latency_ms.labels("submit_rtt")   # bulk order / modify round trip
+cancel_rtt_ms = latency_ms.labels("cancel_rtt")   # bulk cancel round trip
+loop_iter_ms  = latency_ms.labels("loop_iter")    # one quoting loop iteration, wake → synced
+loop_lag_ms   = latency_ms.labels("loop_lag")     # event‐loop scheduling delay
+# (latency.py adds "info_rtt" and "ws_age")
+
+# latency guard (latency.py)
+exchange_latency = Gauge(
+    "ghostbot_exchange_latency_ms",
+    "Exchange latency estimates in ms",
+    ["source", "stat"]
+)
+latency_guard_state = Gauge(
+    "ghostbot_latency_guard_state",
+    "Latency guard mode: 0 quoting, 1 widened, 2 pulled"
+)
+
+# websocket supervisor (websocket_handler.py)
+ws_reconnects_total = Counter(
+    "ghostbot_ws_reconnects_total",
+    "Websocket connections lost or failed to open",
+    ["feed"]
+)
+ws_recovery_seconds = Histogram(
+    "ghostbot_ws_recovery_seconds",
+    "Connection lost to first valid book on the new connection",
+    ["feed"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+# request‐weight scheduler (ratelimit.py)
+ratelimit_budget = Gauge(
+    "ghostbot_ratelimit_budget_weight",
+    "Request weight left in the per‐minute budget"
+)
+ratelimit_weight_total = Counter(
+    "ghostbot_ratelimit_weight_total",
+    "Request weight spent, by priority",
+    ["priority"]
+)
+ratelimit_wait_ms = Histogram(
+    "ghostbot_ratelimit_wait_ms",
+    "Time a request waited for budget, by priority",
+    ["priority"],
+    buckets=(0.1, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+)
+ratelimit_throttled_total = Counter(
+    "ghostbot_ratelimit_throttled_total",
+    "Requests the exchange answered with 429"
+)
+info_coalesced_total = Counter(
+    "ghostbot_info_coalesced_total",
+    "/info requests served by an identical one already in flight"
 )
 
-def start_metrics():
-    # spin up the HTTP endpoint on PROMETHEUS_PORT
-    start_http_server(PROMETHEUS_PORT)
+# Redis Streams bus (redis_client.py)
+redis_published_total = Counter(
+    "ghostbot_redis_published_total",
+    "Stream entries written to Redis"
+)
+redis_dropped_total = Counter(
+    "ghostbot_redis_dropped_total",
+    "Stream entries dropped (publish queue full or a failed round trip)"
+)
+redis_flush_ms = Histogram(
+    "ghostbot_redis_flush_ms",
+    "Round trip of one pipelined batch of XADDs",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+)
+redis_read_lag_ms = Histogram(
+    "ghostbot_redis_read_lag_ms",
+    "Publish to consumer‐group read, by stream",
+    ["stream"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000, 5000)
+)
+
+# quotes resting on the book
+unfilled_orders = Gauge(
+    "ghostbot_unfilled_orders",
+    "Live quotes not yet (fully) filled",
+    ["coin"]
+)
+
+def start_metrics(port=PROMETHEUS_PORT):
+    # spin up the HTTP endpoint (PROMETHEUS_PORT, + shard index when sharded)
+    start_http_server(port)
+
+async def monitor_loop_lag(interval=LOOP_LAG_SEC):
+    """
+    How late the event loop wakes a plain sleep: time the hot path spends
+    waiting behind other callbacks.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        t = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag_ms.observe(max(0.0, (loop.time() - t - interval) * 1e3))
+
+
+#─── flight recorder ───────────────────────────────────────────────────────────
+class FlightRecorder:
+    """
+    Ring buffer of the last `size` tick‐to‐trade traces. `trace()` appends
+    one tuple of raw perf_counter stamps; nothing is formatted until `dump()`.
+    """
+
+    def __init__(self, size=FLIGHT_RECORDER_SIZE, out_dir=FLIGHT_RECORDER_DIR):
+        self.traces     = deque(maxlen=size)
+        self.out_dir    = out_dir
+        self._last_dump = float("-inf")
+
+    def trace(self, ts, coin, book_seq, t_recv, t_decided, t_done, modify, cancel, place, errors=0):
+        self.traces.append((ts, coin, book_seq, t_recv, t_decided, t_done, modify, cancel, place, errors))
+
+    def rows(self):
+        for ts, coin, seq, t_recv, t_decided, t_done, modify, cancel, place, errors in list(self.traces):
+            yield {
+                "ts": ts, "coin": coin, "book_seq": seq,
+                "decision_us": round((t_decided - t_recv) * 1e6, 1),
+                "sync_us": round((t_done - t_decided) * 1e6, 1),
+                "tick_to_ack_us": round((t_done - t_recv) * 1e6, 1),
+                "modify": modify, "cancel": cancel, "place": place, "errors": errors,
+            }
+
+    def dump(self, reason="manual"):
+        """
+        Write the buffer, oldest first, as JSON lines; returns the path.
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        path = os.path.join(self.out_dir, f"flight-{stamp}-{os.getpid()}-{reason}.jsonl")
+        with open(path, "w") as f:
+            f.writelines(json.dumps(r) + "\n" for r in self.rows())
+        print(f"🛩️  flight recorder: {len(self.traces)} traces → {path}")
+        return path
+
+    def dump_on_error(self, reason):
+        """
+        `dump()`, at most once per FLIGHT_DUMP_MIN_SEC so a failing endpoint
+        doesn't turn into a disk‐filling loop.
+        """
+        t = time.monotonic()
+        if t - self._last_dump < FLIGHT_DUMP_MIN_SEC:
+            return None
+        self._last_dump = t
+        try:
+            return self.dump(reason)
+        except OSError as e:
+            print(f"[METRICS] flight recorder dump failed: {e}")
+
+flight_recorder = FlightRecorder()
+
+
+#─── overhead ──────────────────────────────────────────────────────────────────
+def bench(n=200_000):
+    """
+    Per‐event cost of the instrumentation on the hot path.
+    """
+    pc = time.perf_counter
+    rec = FlightRecorder(out_dir="/tmp")
+
+    def per_call(fn):
+        t0 = pc()
+        for _ in range(n):
+            fn()
+        return (pc() - t0) / n * 1e6
+
+    base = per_call(lambda: None)
+    print(f"perf_counter()          {per_call(pc) - base:.3f} µs")
+    print(f"histogram observe()     {per_call(lambda: decision_ms.observe(0.3)) - base:.3f} µs")
+    print(f"gauge set()             {per_call(lambda: unfilled_orders.labels('X').set(3)) - base:.3f} µs (with label lookup)")
+    print(f"flight recorder trace() "
+          f"{per_call(lambda: rec.trace(0.0, 'X', 1, 0.0, 1e-4, 1e-3, 1, 0, 2)) - base:.3f} µs")
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        bench()
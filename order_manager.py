@@ -1,79 +1,182 @@
 # order_manager.py
-import os, json, asyncio, time, redis
-from collections import deque
-from web3 import Web3
-from eth_account import Account
+import os, json, time, asyncio, threading
 
 from config import (
-    TRADING_COIN, REDIS_HOST, REDIS_PORT,
+    TRADING_COIN,
     ORDER_SIZE_USD, MIN_ORDER_SIZE_USD,
-    TICK_SIZE, QUOTE_OFFSET_TICKS,
-    BASE_MAKER_FEE_PCT, REBATE_PCT,
-    VOLATILITY_THRESHOLD_PCT,
+    QUOTE_OFFSET_TICKS,
+    NUM_LAYERS, LAYER_OFFSETS,
+    BASE_MAKER_FEE_PCT, REBATE_PCT, TAKER_FEE_PCT, MARKET_SLIPPAGE_PCT,
+    VOLATILITY_THRESHOLD_PCT, IMBALANCE_SIZE_MULT,
     MAX_DELTA_USD,
-    API_URL, EXCHANGE_HTTP_URL,
-    STALE_TIMEOUT, LOOP_SLEEP, BACKTEST_MODE
+    EXCHANGE_HTTP_URL, SDK_CONFIG_PATH,
+    STALE_TIMEOUT, LOOP_SLEEP, BACKTEST_MODE, BOOK_STALE_SEC, ORDER_RECONCILE_SEC
 )
-from position_manager import get_net_delta, update_net_delta
+from position_manager import ledger
 from db import record_fill
-from metrics import rebate_total, delta_exposure, realized_pnl
-from hyperliquid.exchange import Exchange
+from metrics import (
+    rebate_total, delta_exposure, unfilled_orders,
+    decision_ms, loop_iter_ms, flight_recorder,
+)
+from utils import now
+from orderbook import get_book
+from instruments import get_instrument, use_info, fetch_meta, load_meta_snapshot, save_meta_snapshot
+from fills import fill_tracker
+from exchange_client import AsyncExchange, DryRunExchange, load_signing
+from quoting import QuoteEngine
+from predictor import ml_gate
+from latency import latency_guard
 
-#─── backward‐compat shim ─────────────────────────────────────────────────────────
-_last_order_id = None
-def get_current_order_id():
-    return _last_order_id
+#─── public helpers ────────────────────────────────────────────────────────────
+def get_open_orders(coin=None):
+    """
+    Live quotes as tracked by the quoting engines (one coin, or all).
+    """
+    qs = [quoters[coin]] if coin else quoters.values()
+    return [o for q in qs for o in q.engine.registry]
 
-async def cancel_order(oid: int):
+async def cancel_order(oid: int, coin=TRADING_COIN):
     """
     Cancel a resting order.
     """
-    if BACKTEST_MODE:
-        print(f"[DRY RUN] Cancel {oid}")
-        return
-
     try:
-        hl.cancel(TRADING_COIN, oid)
+        await client.cancel(coin, oid)
     except Exception as e:
         print(f"[OM ERROR] cancel_order: {e}")
 
-async def submit_market_order(side: str, size: float) -> int:
+async def cancel_all_orders():
     """
-    Immediate IOC market fill for flatten/emergency.
+    Mass‐cancel every quote we track plus anything else the exchange still
+    shows open for our coins: one open_orders lookup, then one batched
+    cancel per coin, sent concurrently.
     """
-    is_buy = side.lower() == "buy"
-    dec    = hl.info.asset_to_sz_decimals[asset_id]
-    size   = round(size, dec)
-    px     = hl._slippage_price(TRADING_COIN, is_buy, slippage=0.0, px=0.0)
+    try:
+        open_orders = await client.open_orders(MAIN_ADDR)
+    except Exception as e:
+        print(f"[OM ERROR] open_orders: {e}")
+        open_orders = []
+    jobs = []
+    for coin, q in quoters.items():
+        extra = [o["oid"] for o in open_orders if o.get("coin") == coin]
+        jobs.append(q.engine.cancel_all(extra))
+    await asyncio.gather(*jobs)
 
-    print(f"🚀 MARKET {side.upper():4} {size} @ market")
-    fee = px * size * (BASE_MAKER_FEE_PCT - REBATE_PCT)
+async def reconcile_orders(user, interval=ORDER_RECONCILE_SEC):
+    """
+    Sweep orders the exchange shows open that no quote engine tracks: every
+    `interval`, or within a second of a failed or unanswered order request.
+    One open_orders lookup covers every coin.
+    """
+    await init_exchange()
+    last = time.monotonic()
+    while True:
+        await asyncio.sleep(1.0)
+        if time.monotonic() - last < interval and not any(q.engine.unsettled for q in quoters.values()):
+            continue
+        last = time.monotonic()
+        try:
+            open_orders = await client.open_orders(user)
+        except Exception as e:
+            print(f"[OM ERROR] open_orders: {e}")
+            continue
+        await asyncio.gather(*(q.engine.reconcile(open_orders) for q in quoters.values()))
 
-    record_fill(side, px, size, fee)
-    rebate_total.inc(abs(size * px * REBATE_PCT))
-    pnl = px * size * (1 if side == "sell" else -1)
-    (realized_pnl.inc if pnl >= 0 else realized_pnl.dec)(abs(pnl))
-    update_net_delta(-size if side == "sell" else size)
-    return 0
+async def submit_market_order(side: str, size: float, coin=TRADING_COIN, reduce_only=False) -> float:
+    """
+    IOC market order (entries, flattens); returns the size filled.
+    """
+    return await get_quoter(coin).submit_market(side.lower(), size, reduce_only)
 
 
 #─── setup ───────────────────────────────────────────────────────────────────────
-_here = os.path.dirname(__file__)
-with open(os.path.join(_here, "examples", "config.json")) as f:
-    sdk_cfg = json.load(f)
-raw_wallet = Account.from_key(sdk_cfg["secret_key"])
-MAIN_ADDR  = Web3.to_checksum_address(sdk_cfg["account_address"])
-
-hl = Exchange(
-    wallet=raw_wallet,
-    base_url=EXCHANGE_HTTP_URL,
-    account_address=MAIN_ADDR,
-)
-asset_id   = hl.info.name_to_asset(TRADING_COIN)
-r          = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+# Importing reads no keys, makes no requests and leaves the SDK's signing
+# stack unloaded: `load_wallet()` reads the key file, `init_exchange()`
+# builds the signing Exchange, and main.py runs both alongside the feeds.
+# Until then `client` can already make /info requests; only order actions
+# need `hl`.
+hl        = None
+MAIN_ADDR = "0x0000000000000000000000000000000000000000"
+if BACKTEST_MODE:
+    # offline: no keys, no network; backtest.py swaps in a simulated exchange
+    client = DryRunExchange()
+else:
+    client = AsyncExchange(None, base_url=EXCHANGE_HTTP_URL)
 
-# mid‐price history for optional volatility gating
-mid_prices = deque(maxlen=5)
+_wallet      = None
+_wallet_lock = threading.Lock()   # load_wallet runs in worker threads
+_init        = None
+
+def load_wallet():
+    """
+    (wallet, checksummed account address) from SDK_CONFIG_PATH, read once;
+    also sets MAIN_ADDR.
+    """
+    global _wallet, MAIN_ADDR
+    with _wallet_lock:
+        if _wallet is None:
+            from eth_account import Account
+            from eth_utils import to_checksum_address
+            with open(os.path.join(os.path.dirname(__file__), SDK_CONFIG_PATH)) as f:
+                sdk_cfg = json.load(f)
+            MAIN_ADDR = to_checksum_address(sdk_cfg["account_address"])
+            _wallet   = Account.from_key(sdk_cfg["secret_key"])
+    return _wallet, MAIN_ADDR
+
+async def init_exchange():
+    """
+    Build the signing Exchange once; every caller awaits the same setup.
+    No‐op in backtests.
+    """
+    global _init
+    if BACKTEST_MODE:
+        return
+    if _init is None:
+        _init = asyncio.ensure_future(_build_exchange())
+    await _init
+
+def _load_sdk():
+    # the imports and the key file; run off the event loop
+    from hyperliquid.exchange import Exchange
+    load_signing()
+    return Exchange, load_wallet()
+
+async def _build_exchange():
+    global hl
+    t0 = time.perf_counter()
+    # meta from the warm‐start snapshot when there is one, so the SDK makes
+    # no requests; otherwise fetched (async, while the SDK loads) and snapshotted
+    snap = load_meta_snapshot()
+    (Exchange, (wallet, addr)), (meta, spot_meta) = await asyncio.gather(
+        asyncio.to_thread(_load_sdk), asyncio.sleep(0, snap) if snap else fetch_meta(client))
+    hl = Exchange(wallet=wallet, base_url=EXCHANGE_HTTP_URL, account_address=addr,
+                  meta=meta, spot_meta=spot_meta)
+    client.hl = hl
+    use_info(hl.info)
+    asyncio.create_task(client.signer().warm_up())
+    print(f"🔑 exchange ready in {(time.perf_counter() - t0) * 1e3:.0f} ms "
+          f"({'warm start' if snap else 'meta fetched'})")
+    if snap:
+        asyncio.create_task(_refresh_meta(meta))
+    else:
+        save_meta_snapshot(meta, spot_meta)
+
+async def _refresh_meta(old_meta):
+    """
+    After a warm start: fetch meta again, save it for the next start, and
+    apply it if the perp universe changed since the snapshot.
+    """
+    try:
+        meta, spot_meta = await fetch_meta(client)
+    except Exception as e:
+        print(f"[OM ERROR] meta refresh: {e}")
+        return
+    save_meta_snapshot(meta, spot_meta)
+    if meta["universe"] != old_meta["universe"]:
+        print("🔑 exchange meta changed since the snapshot – reloading instrument rules")
+        hl.info.set_perp_meta(meta, 0)
+        use_info(hl.info)
+        for q in quoters.values():
+            q.inst = get_instrument(q.coin)
 
 #─── helpers ────────────────────────────────────────────────────────────────────
 def parse_orderbook(raw):
@@ -83,148 +186,216 @@ def parse_orderbook(raw):
     bids, asks = ob["bids"], ob["asks"]
     return float(bids[0]["px"]), float(asks[0]["px"])
 
-def compute_size_usd():
-    delta = abs(get_net_delta())
-    cap   = ORDER_SIZE_USD - delta
-    if cap <= 0:
-        return 0.0
-    if cap >= ORDER_SIZE_USD * 0.9:
-        return ORDER_SIZE_USD
-    return max(MIN_ORDER_SIZE_USD, cap)
-
-def compute_price(side, bid, ask):
-    # dynamic spread: widen if vol ↑
-    mid = (bid+ask)/2
-    mid_prices.append(mid)
-    if len(mid_prices)==mid_prices.maxlen:
-        vol = (max(mid_prices)-min(mid_prices))/mid
-    else:
-        vol = 0.0
-    # offset ticks scales linearly with vol
-    ticks = max(1, int(QUOTE_OFFSET_TICKS*(1 + vol/VOLATILITY_THRESHOLD_PCT)))
-    if side=="buy":
-        return bid - ticks * TICK_SIZE
-    else:
-        return ask + ticks * TICK_SIZE
-
-async def submit_limit(side, price, size):
-    global _last_order_id
-    is_buy = side=="buy"
-    dec    = hl.info.asset_to_sz_decimals[asset_id]
-    size   = round(size, dec)
-    px     = hl._slippage_price(TRADING_COIN, is_buy, slippage=0.0, px=price)
-
-    if BACKTEST_MODE:
-        print(f"[DRY] {side} {size}@{px}")
-        return int(time.time()*1000)
-
-    resp = hl.order(
-        TRADING_COIN, is_buy, size, px,
-        order_type={"limit":{"tif":"Alo"}},  # post‐only
-        reduce_only=False,
-    )
-    statuses = resp["response"]["data"]["statuses"]
-
-    # resting
-    for s in statuses:
-        if "resting" in s:
-            oid = s["resting"]["oid"]
-            _last_order_id = oid
-            return oid
-
-    # fill
-    for s in statuses:
-        if "filled" in s:
-            f=s["filled"]
-            sz, avg = float(f["totalSz"]), float(f["avgPx"])
-            fee = avg*sz*(BASE_MAKER_FEE_PCT-REBATE_PCT)
-            record_fill(side, avg, sz, fee)
-            rebate_total.inc(abs(sz*avg*REBATE_PCT))
-            pnl = avg*sz*(1 if side=="sell" else -1)
-            (realized_pnl.inc if pnl>=0 else realized_pnl.dec)(abs(pnl))
-            update_net_delta(sz if side=="buy" else -sz)
-            return -1
-
-    return 0
-
-async def cancel(oid):
-    if BACKTEST_MODE:
-        print(f"[DRY] cancel {oid}")
+async def wait_for_event(book, book_seq, fill_seq):
+    """
+    Block until the book or the fill tracker moves past the given seqs, or
+    STALE_TIMEOUT passes so stale orders still get pulled on a quiet book.
+    """
+    if book.seq != book_seq or fill_tracker.seq != fill_seq:
         return
+    waiters = [
+        asyncio.ensure_future(book.wait_for_update(book_seq)),
+        asyncio.ensure_future(fill_tracker.wait_for_update(fill_seq)),
+    ]
     try:
-        hl.cancel(TRADING_COIN, oid)
-    except Exception as e:
-        print("cancel error", e)
-
-async def submit_market(side, size):
-    # for auto‐flatten
-    is_buy = side=="buy"
-    dec    = hl.info.asset_to_sz_decimals[asset_id]
-    size   = round(size, dec)
-    px     = hl._slippage_price(TRADING_COIN, is_buy, slippage=0.0, px=0.0)
-    print(f"🚀 MARKET {side} {size}")
-    fee = px*size*(BASE_MAKER_FEE_PCT-REBATE_PCT)
-    record_fill(side, px, size, fee)
-    rebate_total.inc(abs(size*px*REBATE_PCT))
-    pnl = px*size*(1 if side=="sell" else -1)
-    (realized_pnl.inc if pnl>=0 else realized_pnl.dec)(abs(pnl))
-    update_net_delta(-size if side=="sell" else size)
-    return 0
+        await asyncio.wait(waiters, timeout=STALE_TIMEOUT, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for w in waiters:
+            w.cancel()
+
+#─── per‐coin quoting ──────────────────────────────────────────────────────────
+class CoinQuoter:
+    """
+    Everything the market maker keeps per coin: book (and its streaming
+    signals, for spread and skew), instrument rules, quote engine and its
+    own delta limit. Coins share the HTTP client and the fill tracker.
+    """
+
+    def __init__(self, coin):
+        self.coin        = coin
+        self.inst        = get_instrument(coin)
+        self.book        = get_book(coin)
+        self.sig         = self.book.signals
+        self.pos         = ledger.get(coin)
+        self.engine      = QuoteEngine(client, coin, on_fill=self._on_quote_fill)
+        self.unfilled    = unfilled_orders.labels(coin)
+
+    def compute_size_usd(self, side):
+        # exposure only caps the side that adds to it
+        delta = self.pos.notional()
+        if delta and (delta > 0) == (side == "sell"):
+            return ORDER_SIZE_USD
+        cap   = ORDER_SIZE_USD - abs(delta)
+        if cap <= 0:
+            return 0.0
+        size  = ORDER_SIZE_USD if cap >= ORDER_SIZE_USD * 0.9 else max(MIN_ORDER_SIZE_USD, cap)
+        # smaller where the book leans against the quote (selling into bid pressure)
+        lean  = self.sig.lean()
+        if lean and (lean > 0) == (side == "sell"):
+            size = max(MIN_ORDER_SIZE_USD, size * IMBALANCE_SIZE_MULT)
+        return size
+
+    def compute_price(self, side, bid, ask, layer=0):
+        # in price units (instruments.py), on the tick grid
+        # dynamic spread: widen with the mid's move over VOL_WINDOW_SEC (signals.py)
+        vol = self.sig.vol()
+        # offset ticks scales linearly with vol, and with the layer multiple
+        ticks = max(1, int(QUOTE_OFFSET_TICKS*(1 + vol/VOLATILITY_THRESHOLD_PCT)))
+        ticks *= LAYER_OFFSETS[layer] * latency_guard.widen
+        # skew: a tick closer on the side the book leans toward, a tick further on the other
+        lean = self.sig.lean()
+        if lean:
+            ticks += -1 if (lean > 0) == (side == "buy") else 1
+        return self.inst.offset(bid if side=="buy" else ask, ticks, side)
+
+    def round_px(self, px):
+        return self.inst.round_px(px)
+
+    def round_sz(self, sz):
+        return self.inst.round_sz(sz)
+
+    def build_quotes(self, bid, ask):
+        """
+        Wanted {(side, layer): (px, sz)} for every bid and ask layer; a side is
+        left out when risk leaves no room for a minimum‐size order on it.
+        """
+        quotes = {}
+        for side in ("buy", "sell"):
+            size_usd = self.compute_size_usd(side)
+            if size_usd < MIN_ORDER_SIZE_USD:
+                continue
+            for layer in range(min(NUM_LAYERS, len(LAYER_OFFSETS))):
+                px = self.inst.price(self.compute_price(side, bid, ask, layer))
+                sz = self.inst.size_for_usd(size_usd, px)
+                if sz > 0:
+                    quotes[(side, layer)] = (px, sz)
+        return quotes
+
+    def book_fill(self, side, px, sz, taker=False):
+        fee    = px*sz*(TAKER_FEE_PCT if taker else BASE_MAKER_FEE_PCT)
+        rebate = 0.0 if taker else px*sz*REBATE_PCT
+        record_fill(side, px, sz, fee - rebate, self.coin)
+        rebate_total.inc(rebate)
+        ledger.on_fill(self.coin, side, px, sz, fee, rebate)
+
+    def _on_quote_fill(self, side, px, sz):
+        self.book_fill(side, px, sz)
+
+    async def submit_market(self, side, size, reduce_only=True):
+        """
+        IOC through the touch by MARKET_SLIPPAGE_PCT; the fill is booked from
+        the exchange's ack at its price, with taker fees. Returns the size
+        filled.
+        """
+        size = self.round_sz(size)
+        # a stale book's last touch still bounds the price (flattens on shutdown)
+        if size <= 0 or not (self.book.bids and self.book.asks):
+            print(f"[OM] {self.coin} market {side} {size}: no size or no book, not sent")
+            return 0.0
+        bid, ask = self.book.best_bid_ask()
+        px = self.round_px(ask*(1 + MARKET_SLIPPAGE_PCT) if side == "buy" else bid*(1 - MARKET_SLIPPAGE_PCT))
+        print(f"🚀 MARKET {self.coin} {side} {size} (IOC @ {px}{', reduce‐only' if reduce_only else ''})")
+        avg_px, filled = await self.engine.take(side, px, size, reduce_only)
+        if filled:
+            self.book_fill(side, avg_px, filled, taker=True)
+        return filled
+
+    async def run(self):
+        book, engine = self.book, self.engine
+        seq = fill_seq = 0
+
+        while True:
+            # wake on every book update or fill push; always act on the latest state
+            await wait_for_event(book, seq, fill_seq)
+            t_wake = time.perf_counter()
+            new_book = book.seq != seq
+            seq, fill_seq = book.seq, fill_tracker.seq
+            if not book.ready() or now() - book.recv_ts > BOOK_STALE_SEC:
+                # no book, or the feed is down/silent: never leave quotes on a stale view
+                if len(engine.registry):
+                    print(f"⏸️  {self.coin}: book stale – pulling quotes until the feed recovers")
+                    await engine.sync({})
+                continue
+
+            bid, ask = book.best_bid_ask()
+            if new_book:
+                self.pos.mark = (bid+ask)/2
+
+            # 1) Risk & auto‐flatten (exposure in USD at the mid)
+            delta = self.pos.notional(); delta_exposure.labels(self.coin).set(delta)
+            if abs(delta)>=MAX_DELTA_USD*0.95:
+                await engine.cancel_all()
+                flat = "sell" if delta>0 else "buy"
+                await self.submit_market(flat, abs(self.pos.qty))
+                await asyncio.sleep(LOOP_SLEEP); continue
+
+            # 2) Latency guard: pull all quotes while the exchange is too slow
+            #    for them to be trusted (widening is applied in compute_price)
+            if latency_guard.paused:
+                if len(engine.registry):
+                    print(f"⏸️  {self.coin}: exchange latency over budget – pulling quotes")
+                await engine.sync({})
+                continue
+
+            # 3) ML filter: pull all quotes while the model calls a strong move
+            #    (the model scores TRADING_COIN only)
+            if self.coin == TRADING_COIN and ml_gate.paused:
+                if len(engine.registry):
+                    print(f"⏸️  ML pause (P(up)={ml_gate.prob:.2f}) – pulling quotes")
+                await engine.sync({})
+                continue
+
+            # 4) Requote: keep/modify/cancel/place the bid & ask layers in bulk
+            quotes = self.build_quotes(bid, ask)
+            t_decided = time.perf_counter()
+            if new_book:
+                decision_ms.observe((t_decided - book.recv_perf) * 1e3)
+            errors = engine.errors
+            counts = await engine.sync(quotes)
+            t_done = time.perf_counter()
+            if any(counts):
+                flight_recorder.trace(now(), self.coin, seq, book.recv_perf, t_decided, t_done,
+                                      *counts, engine.errors - errors)
+            self.unfilled.set(len(engine.registry))
+            loop_iter_ms.observe((t_done - t_wake) * 1e3)
+
+
+quoters = {}
+
+def get_quoter(coin=TRADING_COIN):
+    q = quoters.get(coin)
+    if q is None:
+        q = quoters[coin] = CoinQuoter(coin)
+    return q
 
 #─── main loop ─────────────────────────────────────────────────────────────────
-async def market_maker_loop():
-    side = "buy"
-    current_oid = None
-    ts = 0.0
+_quoting = []      # the CoinQuoter.run tasks of market_maker_loop
+_stopped = False   # set by stop_quoting
 
-    while True:
-        raw = r.get(f"{TRADING_COIN}_orderbook")
-        if not raw:
-            await asyncio.sleep(LOOP_SLEEP); continue
-
-        bid, ask = parse_orderbook(raw)
-
-        # 1) Risk & auto‐flatten
-        delta = get_net_delta(); delta_exposure.set(delta)
-        if abs(delta)>=MAX_DELTA_USD*0.95:
-            flat = "sell" if delta>0 else "buy"
-            amt  = abs(delta)/((bid+ask)/2)
-            await submit_market(flat, amt)
-            current_oid = None
-            ts = 0
-            await asyncio.sleep(LOOP_SLEEP); continue
-
-        # 2) Cancel stale
-        if current_oid and (time.time()-ts)>STALE_TIMEOUT:
-            await cancel(current_oid)
-            current_oid = None
-
-        # 3) Place new if none
-        if not current_oid:
-            size = compute_size_usd()
-            if size>=MIN_ORDER_SIZE_USD:
-                price = compute_price(side, bid, ask)
-                oid   = await submit_limit(side, price, size)
-                if oid>0:
-                    current_oid = oid
-                    ts = time.time()
-                elif oid==-1:
-                    # immediate fill → flip
-                    side = "sell" if side=="buy" else "buy"
-                    current_oid = None
-                    mid_prices.clear()
-
-        # 4) Check fills
-        if current_oid:
-            fills = hl.info.user_fills(MAIN_ADDR)
-            for f in fills:
-                if f.get("oid")==current_oid:
-                    side = "sell" if side=="buy" else "buy"
-                    current_oid = None
-                    mid_prices.clear()
-                    break
-
-        await asyncio.sleep(LOOP_SLEEP)
+async def market_maker_loop(coins=None):
+    """
+    Quote every coin in `coins` (default TRADING_COIN), each in its own task,
+    once the exchange is set up.
+    """
+    await init_exchange()
+    _quoting.extend(asyncio.ensure_future(get_quoter(c).run()) for c in coins or [TRADING_COIN])
+    try:
+        await asyncio.gather(*_quoting)
+    except asyncio.CancelledError:
+        if not _stopped:
+            raise
+
+async def stop_quoting():
+    """
+    Stop every quoter task, so nothing re‐places quotes after a mass cancel;
+    market_maker_loop then returns.
+    """
+    global _stopped
+    _stopped = True
+    for t in _quoting:
+        t.cancel()
+    await asyncio.gather(*_quoting, return_exceptions=True)
+    _quoting.clear()
 
 if __name__=="__main__":
     asyncio.run(market_maker_loop())
@@ -0,0 +1,169 @@
+# orderbook.py
+
+import asyncio
+import time
+import numpy as np
+from config import TRADING_COIN
+from utils import now
+from signals import BookSignals
+
+# fixed‐point encoding of prices and sizes, shared with recorder.py and shm_book.py
+PX_DECIMALS = 8
+SZ_DECIMALS = 8
+PX_MUL      = 10 ** PX_DECIMALS
+SZ_MUL      = 10 ** SZ_DECIMALS
+
+
+class Levels:
+    """
+    One side of an L2 snapshot, decoded once at ingest: price and size as
+    fixed‐point int64 (× PX_MUL / SZ_MUL) plus the order count, best level
+    first. Indexing a position gives the websocket form ({"px", "sz", "n"})
+    for code that still wants dicts; hot paths read the arrays.
+    """
+    __slots__ = ("px", "sz", "n")
+
+    def __init__(self, px, sz, n):
+        self.px = px
+        self.sz = sz
+        self.n  = n
+
+    @classmethod
+    def from_fixed(cls, a):
+        """
+        From an int64 (levels, 3) array of px, sz, n columns (views, no copy).
+        """
+        return cls(a[:, 0], a[:, 1], a[:, 2])
+
+    @classmethod
+    def from_levels(cls, levels, depth=None):
+        """
+        From websocket‐form dicts, keeping at most `depth` levels.
+        """
+        levels = levels[:depth]
+        a = np.array([(l["px"], l["sz"], l.get("n", 0)) for l in levels], dtype=np.float64).reshape(-1, 3)
+        return cls.from_fixed(np.rint(a * (PX_MUL, SZ_MUL, 1)).astype(np.int64))
+
+    def best(self):
+        # exact: both ints are < 2^53, so this is the float of the original decimal
+        return int(self.px[0]) / PX_MUL
+
+    def __len__(self):
+        return len(self.px)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Levels(self.px[i], self.sz[i], self.n[i])
+        return {"px": str(int(self.px[i]) / PX_MUL), "sz": str(int(self.sz[i]) / SZ_MUL), "n": int(self.n[i])}
+
+    def __iter__(self):
+        return iter(self.to_levels())
+
+    def to_levels(self):
+        return [
+            {"px": str(p / PX_MUL), "sz": str(s / SZ_MUL), "n": c}
+            for p, s, c in zip(self.px.tolist(), self.sz.tolist(), self.n.tolist())
+        ]
+
+EMPTY = Levels.from_levels([])
+
+
+class OrderBook:
+    """
+    Latest L2 snapshot for one coin, updated in-process by the websocket
+    listener. Every update bumps `seq` and wakes all waiters; a consumer that
+    falls behind simply sees the newest state on its next wait instead of
+    replaying the snapshots it missed.
+    """
+
+    def __init__(self, coin):
+        self.coin    = coin
+        self.bids    = EMPTY
+        self.asks    = EMPTY
+        self.seq     = 0
+        self.ts      = 0      # exchange timestamp (ms) of the snapshot
+        self.recv_ts = 0.0    # local wall-clock time the snapshot arrived
+        self.recv_perf = 0.0  # perf_counter() when its frame was received (latency metrics)
+        self.stale   = False  # feed lost; not ready() until the next update
+        self.signals = BookSignals()   # microstructure signals, fed every update
+        self.listeners = []            # fn(book) after every update and on going stale (candles.py, redis_client.py)
+        self._top_seq = -1
+        self._top     = None
+        self._updated = asyncio.Event()
+
+    def update(self, bids, asks, ts=None, recv_perf=None):
+        """
+        `bids`/`asks` as Levels, or websocket‐form lists (decoded here).
+        """
+        self.bids    = bids if isinstance(bids, Levels) else Levels.from_levels(bids)
+        self.asks    = asks if isinstance(asks, Levels) else Levels.from_levels(asks)
+        self.ts      = ts or 0
+        self.recv_ts = now()
+        self.recv_perf = recv_perf or time.perf_counter()
+        self.stale   = False
+        self._notify()
+        if self.bids and self.asks:
+            bid, ask = self.best_bid_ask()
+            self.signals.on_book(self.recv_ts, bid, ask, self.bids.sz, self.asks.sz)
+            for fn in self.listeners:
+                fn(self)
+
+    def mark_stale(self):
+        """
+        The feed behind this book is gone. Bumps `seq` so waiters wake up,
+        see `ready()` is False and stop acting on the old snapshot; listeners
+        are called with `stale` set.
+        """
+        if not self.stale:
+            self.stale = True
+            self._notify()
+            for fn in self.listeners:
+                fn(self)
+
+    def _notify(self):
+        self.seq += 1
+        # wake everyone parked on the current generation, then start a new one
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def ready(self):
+        return not self.stale and bool(self.bids) and bool(self.asks)
+
+    def best_bid_ask(self):
+        """
+        Top of book as floats, computed at most once per snapshot.
+        """
+        if self._top_seq != self.seq:
+            self._top = (self.bids.best(), self.asks.best())
+            self._top_seq = self.seq
+        return self._top
+
+    def mid(self):
+        bid, ask = self.best_bid_ask()
+        return (bid + ask) / 2
+
+    def snapshot(self):
+        return {"bids": self.bids.to_levels(), "asks": self.asks.to_levels()}
+
+    async def wait_for_update(self, last_seq, timeout=None):
+        """
+        Return as soon as the book is newer than `last_seq` (immediately if it
+        already is). Returns the current seq, which equals `last_seq` only
+        when `timeout` expired without an update.
+        """
+        while self.seq == last_seq:
+            try:
+                await asyncio.wait_for(self._updated.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+        return self.seq
+
+
+#─── registry ──────────────────────────────────────────────────────────────────
+_books = {}
+
+def get_book(coin=TRADING_COIN):
+    book = _books.get(coin)
+    if book is None:
+        book = _books[coin] = OrderBook(coin)
+    return book
@@ -1,11 +1,230 @@
 # position_manager.py
+#
+# Position ledger: per coin, the signed size (coin units), average entry
+# price, realized PnL, fees and rebates, updated in O(1) per fill, and the
+# last mid it was marked to (each book update), which gives unrealized PnL
+# and USD exposure. Each coin's state is snapshotted to POSITION_SNAPSHOT_DIR
+# when it changes, so a restart picks up where it left off, and a slow
+# timer checks sizes against the exchange's clearinghouseState (one request
+# for every coin) instead of anything running on the hot path.
 
-_net_delta = 0
+import asyncio
+import json
+import os
 
-def get_net_delta():
-    return _net_delta
+from config import (
+    TRADING_COIN, POSITION_SNAPSHOT_DIR, POSITION_SNAPSHOT_SEC, POSITION_RECONCILE_SEC,
+)
+from metrics import realized_pnl, unrealized_pnl, position_resyncs_total
+from utils import now
 
-def update_net_delta(change):
-    global _net_delta
-    _net_delta += change
+SIZE_EPS = 1e-9   # sizes closer than this are equal (float sums of decimal lots)
 
+
+class Position:
+    """
+    One coin. `qty` > 0 long, < 0 short; `avg_px` is the entry price of
+    what is still open (0 when flat).
+    """
+
+    __slots__ = ("coin", "qty", "avg_px", "realized", "fees", "rebates", "mark", "dirty")
+
+    def __init__(self, coin):
+        self.coin     = coin
+        self.qty      = 0.0
+        self.avg_px   = 0.0
+        self.realized = 0.0   # closed‐trade PnL, before fees
+        self.fees     = 0.0
+        self.rebates  = 0.0
+        self.mark     = 0.0
+        self.dirty    = False   # changed since the last snapshot
+
+    def on_fill(self, side, px, sz, fee=0.0, rebate=0.0):
+        """
+        Apply one fill; returns the PnL it realized.
+        """
+        signed = sz if side == "buy" else -sz
+        qty, pnl = self.qty, 0.0
+        if qty * signed >= 0:
+            # opening or adding: size‐weighted entry
+            self.avg_px = (self.avg_px * abs(qty) + px * sz) / (abs(qty) + sz)
+        else:
+            closed = min(sz, abs(qty))
+            pnl = closed * (px - self.avg_px) * (1 if qty > 0 else -1)
+            if sz > abs(qty) + SIZE_EPS:
+                self.avg_px = px   # flipped: the remainder opened here
+        self.qty = qty + signed
+        if abs(self.qty) <= SIZE_EPS:
+            self.qty, self.avg_px = 0.0, 0.0
+        self.realized += pnl
+        self.fees     += fee
+        self.rebates  += rebate
+        if not self.mark:
+            self.mark = px
+        self.dirty = True
+        return pnl
+
+    def unrealized(self):
+        return self.qty * (self.mark - self.avg_px) if self.qty else 0.0
+
+    def notional(self):
+        """
+        Signed USD exposure at the last mark.
+        """
+        return self.qty * self.mark
+
+    def net_realized(self):
+        return self.realized - self.fees + self.rebates
+
+    def state(self):
+        return {"qty": self.qty, "avg_px": self.avg_px, "realized": self.realized,
+                "fees": self.fees, "rebates": self.rebates, "mark": self.mark}
+
+
+class PositionLedger:
+    """
+    Every coin's Position plus running totals, so no per‐fill update has to
+    walk the coins.
+    """
+
+    def __init__(self, snapshot_dir=POSITION_SNAPSHOT_DIR):
+        self.positions    = {}
+        self.snapshot_dir = snapshot_dir
+        self.net_realized = 0.0   # all coins: realized − fees + rebates
+        self._mismatch    = {}    # coin -> exchange size seen on the last reconcile
+
+    def get(self, coin=TRADING_COIN):
+        pos = self.positions.get(coin)
+        if pos is None:
+            pos = self.positions[coin] = Position(coin)
+        return pos
+
+    def on_fill(self, coin, side, px, sz, fee=0.0, rebate=0.0):
+        pnl = self.get(coin).on_fill(side, px, sz, fee, rebate)
+        self.net_realized += pnl - fee + rebate
+        realized_pnl.set(self.net_realized)
+
+    #─── snapshot ──────────────────────────────────────────────────────────────
+    def _path(self, coin):
+        return os.path.join(self.snapshot_dir, f"{coin}.json")
+
+    def load(self, coins):
+        """
+        Restore `coins` from their snapshots (a missing one starts flat).
+        """
+        for coin in coins:
+            try:
+                with open(self._path(coin)) as f:
+                    st = json.load(f)
+            except (OSError, ValueError):
+                continue
+            pos = self.get(coin)
+            for k in ("qty", "avg_px", "realized", "fees", "rebates", "mark"):
+                setattr(pos, k, float(st.get(k, 0.0)))
+            print(f"📒 {coin}: restored position {pos.qty:+g} @ {pos.avg_px:g} "
+                  f"(realized {pos.net_realized():+.2f} USD, snapshot {now() - st.get('saved', 0):.0f}s old)")
+        self.net_realized = sum(p.net_realized() for p in self.positions.values())
+        realized_pnl.set(self.net_realized)
+
+    def save(self):
+        """
+        Write every position changed since the last save.
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        for pos in self.positions.values():
+            if not pos.dirty:
+                continue
+            pos.dirty = False
+            tmp = self._path(pos.coin) + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({**pos.state(), "saved": now()}, f)
+            os.replace(tmp, self._path(pos.coin))
+
+    def publish(self):
+        for pos in self.positions.values():
+            unrealized_pnl.labels(pos.coin).set(pos.unrealized())
+
+    async def persist(self, interval=POSITION_SNAPSHOT_SEC):
+        while True:
+            await asyncio.sleep(interval)
+            self.publish()
+            try:
+                self.save()
+            except OSError as e:
+                print(f"[POS] snapshot failed: {e}")
+
+    #─── reconciliation ────────────────────────────────────────────────────────
+    def reconcile(self, state, coins):
+        """
+        Compare `coins` with a clearinghouseState response. A size mismatch
+        has to show up on two checks in a row with the same exchange size
+        before the exchange's size and entry are adopted, so a fill still in
+        flight on either side isn't mistaken for drift. Realized PnL is kept.
+        """
+        theirs = {}
+        for ap in state.get("assetPositions", []):
+            p = ap.get("position", ap)
+            theirs[p["coin"]] = (float(p["szi"]), float(p.get("entryPx") or 0.0))
+        for coin in coins:
+            pos = self.get(coin)
+            szi, entry = theirs.get(coin, (0.0, 0.0))
+            if abs(szi - pos.qty) <= SIZE_EPS:
+                self._mismatch.pop(coin, None)
+                continue
+            if self._mismatch.get(coin) != szi:
+                self._mismatch[coin] = szi   # first sighting: wait for the next check
+                continue
+            print(f"📒 {coin}: position {pos.qty:+g} @ {pos.avg_px:g} disagrees with the exchange "
+                  f"({szi:+g} @ {entry:g}) – adopting the exchange's")
+            pos.qty, pos.avg_px, pos.dirty = szi, entry if szi else 0.0, True
+            position_resyncs_total.labels(coin).inc()
+            del self._mismatch[coin]
+
+    async def run_reconcile(self, client, user, coins, interval=POSITION_RECONCILE_SEC):
+        while True:
+            try:
+                state = await client.info({"type": "clearinghouseState", "user": user})
+                self.reconcile(state, coins)
+            except Exception as e:
+                print(f"[POS] reconcile error: {e}")
+            await asyncio.sleep(interval)
+
+
+ledger = PositionLedger()
+
+
+def get_net_delta(coin=TRADING_COIN):
+    """
+    Signed position in coin units.
+    """
+    pos = ledger.positions.get(coin)
+    return pos.qty if pos else 0.0
+
+def get_net_deltas():
+    return {coin: pos.qty for coin, pos in ledger.positions.items()}
+
+
+if __name__ == "__main__":
+    # per‐fill cost, and the ledger against a full recomputation from the fills
+    import random
+    import time
+    random.seed(7)
+    fills, px = [], 150.0
+    for _ in range(200_000):
+        px *= 1 + random.gauss(0, 1e-4)
+        fills.append((random.choice(("buy", "sell")), round(px, 2), round(random.uniform(0.01, 0.5), 2)))
+
+    pos = Position("X")
+    t0 = time.perf_counter()
+    for side, p, sz in fills:
+        pos.on_fill(side, p, sz, p * sz * 1.5e-4, p * sz * 3e-5)
+    dt = time.perf_counter() - t0
+    pos.mark = px
+
+    # reference: with average cost, realized + unrealized must equal cash + marked inventory
+    cash = sum((-p * sz if side == "buy" else p * sz) for side, p, sz in fills)
+    qty = sum((sz if side == "buy" else -sz) for side, p, sz in fills)
+    total = cash + qty * px
+    print(f"{len(fills)} fills: {dt / len(fills) * 1e6:.2f} µs per fill")
+    print(f"position {pos.qty:+.2f} (reference {qty:+.2f}); realized + unrealized "
+          f"{pos.realized + pos.unrealized():.6f} vs cash + marked inventory {total:.6f}")
@@ -0,0 +1,173 @@
+# predictor.py
+#
+# Runtime scoring for the model trained by train_model.py. The artifact is a
+# single .npz holding the fitted scaler, the feature order and the XGBoost
+# trees flattened into arrays, so scoring needs NumPy only — no xgboost or
+# sklearn import on the hot path.
+
+import json
+import time
+import numpy as np
+
+from config import MIN_PROB, ML_SIGNAL_MAX_AGE
+from utils import now
+
+ARTIFACT_VERSION = 1
+MODEL_PATH       = "model_artifact.npz"
+
+
+#─── export (training side) ────────────────────────────────────────────────────
+def _flatten_trees(booster, features):
+    """
+    Turn the booster's JSON dump into parallel node arrays. Children are
+    global node indices; leaves point at themselves, so walking every tree
+    for `depth` steps always ends on a leaf.
+    """
+    feat, thresh, left, right, missing, value, roots = [], [], [], [], [], [], []
+    depth = 0
+
+    def index_of(split):
+        if split in features:
+            return features.index(split)
+        return int(split.lstrip("f"))   # unnamed columns: f0, f1, ...
+
+    for dump in booster.get_dump(dump_format="json"):
+        nodes, stack = [], [json.loads(dump)]
+        while stack:
+            n = stack.pop()
+            nodes.append(n)
+            stack.extend(n.get("children", ()))
+        # node ids can have gaps after pruning; re-index them densely
+        slot = {n["nodeid"]: len(feat) + i for i, n in enumerate(nodes)}
+        roots.append(slot[0])
+        for n in nodes:
+            me = slot[n["nodeid"]]
+            depth = max(depth, n.get("depth", 0) + 1)
+            if "leaf" in n:
+                feat.append(0); thresh.append(0.0); value.append(n["leaf"])
+                left.append(me); right.append(me); missing.append(me)
+            else:
+                feat.append(index_of(n["split"])); thresh.append(n["split_condition"]); value.append(0.0)
+                left.append(slot[n["yes"]]); right.append(slot[n["no"]]); missing.append(slot[n["missing"]])
+
+    return {
+        "feat":    np.asarray(feat, dtype=np.intp),
+        "thresh":  np.asarray(thresh, dtype=np.float32),
+        "left":    np.asarray(left, dtype=np.intp),
+        "right":   np.asarray(right, dtype=np.intp),
+        "missing": np.asarray(missing, dtype=np.intp),
+        "value":   np.asarray(value, dtype=np.float64),
+        "roots":   np.asarray(roots, dtype=np.intp),
+        "depth":   np.asarray(depth),
+    }
+
+
+def _base_margin(booster):
+    cfg = json.loads(booster.save_config())
+    raw = str(cfg["learner"]["learner_model_param"]["base_score"]).strip("[]")
+    p = float(raw)
+    return float(np.log(p / (1 - p)))
+
+
+def save_artifact(path, model, scaler, features):
+    """
+    Write scaler + model + feature order as one versioned .npz.
+    """
+    booster = model.get_booster()
+    np.savez(
+        path,
+        version=np.asarray(ARTIFACT_VERSION),
+        created=np.asarray(int(time.time())),
+        features=np.asarray(features),
+        scaler_mean=np.asarray(scaler.mean_, dtype=np.float64),
+        scaler_scale=np.asarray(scaler.scale_, dtype=np.float64),
+        base_margin=np.asarray(_base_margin(booster)),
+        **_flatten_trees(booster, list(features)),
+    )
+
+
+#─── runtime ───────────────────────────────────────────────────────────────────
+class Predictor:
+    """
+    P(next candle closes higher) for one raw feature vector in FEATURES order.
+    Every tree is walked at once, one vectorized step per tree level.
+    """
+
+    def __init__(self, path=MODEL_PATH):
+        a = np.load(path, allow_pickle=False)
+        if int(a["version"]) != ARTIFACT_VERSION:
+            raise ValueError(f"{path}: artifact version {int(a['version'])}, expected {ARTIFACT_VERSION}")
+        self.features    = [str(f) for f in a["features"]]
+        self.mean        = a["scaler_mean"]
+        self.scale       = a["scaler_scale"]
+        self.base_margin = float(a["base_margin"])
+        self.feat        = a["feat"]
+        self.thresh      = a["thresh"]
+        self.left        = a["left"]
+        self.right       = a["right"]
+        self.missing     = a["missing"]
+        self.value       = a["value"]
+        self.roots       = a["roots"]
+        self.depth       = int(a["depth"])
+        # [right | left] so the next node is child[node + went_left * n]
+        self._n          = len(self.feat)
+        self._child      = np.concatenate([self.right, self.left])
+
+    def margin(self, x):
+        xs = ((np.asarray(x, dtype=np.float64) - self.mean) / self.scale).astype(np.float32)
+        node = self.roots
+        if np.isnan(xs).any():
+            for _ in range(self.depth):
+                v = xs[self.feat[node]]
+                nxt = np.where(v < self.thresh[node], self.left[node], self.right[node])
+                node = np.where(np.isnan(v), self.missing[node], nxt)
+        else:
+            feat, thresh, child, n = self.feat, self.thresh, self._child, self._n
+            for _ in range(self.depth):
+                went_left = xs.take(feat.take(node)) < thresh.take(node)
+                node = child.take(node + went_left * n)
+        return self.base_margin + self.value.take(node).sum()
+
+    def predict_proba(self, x):
+        return 1.0 / (1.0 + np.exp(-self.margin(x)))
+
+
+#─── market‐maker pause signal ─────────────────────────────────────────────────
+class SignalGate:
+    """
+    Pause switch fed by the model. A strong directional call either way
+    (P(up) ≥ MIN_PROB or ≤ 1 − MIN_PROB) is exactly when resting two‐sided
+    quotes get picked off, so market_maker_loop pulls them while it lasts.
+    A score older than `max_age` seconds no longer pauses anything.
+    """
+
+    def __init__(self, min_prob=MIN_PROB, max_age=ML_SIGNAL_MAX_AGE):
+        self.min_prob = min_prob
+        self.max_age  = max_age
+        self.prob     = None
+        self.ts       = 0.0
+
+    def update(self, prob):
+        self.prob = float(prob)
+        self.ts   = now()
+
+    @property
+    def paused(self):
+        if self.prob is None or now() - self.ts > self.max_age:
+            return False
+        return max(self.prob, 1.0 - self.prob) >= self.min_prob
+
+
+ml_gate = SignalGate()
+
+
+if __name__ == "__main__":
+    import sys
+    p = Predictor(sys.argv[1] if len(sys.argv) > 1 else MODEL_PATH)
+    x = p.mean.copy()
+    n = 10_000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        p.predict_proba(x)
+    dt = time.perf_counter() - t0
+    print(f"{len(p.roots)} trees, depth {p.depth}: {dt / n * 1e6:.1f} µs/score")
@@ -0,0 +1,380 @@
+# quoting.py
+
+import asyncio
+import time
+from collections import OrderedDict
+from hyperliquid.utils.types import Cloid
+
+from config import STALE_TIMEOUT, ORDER_RECONCILE_GRACE
+from fills import fill_tracker
+from metrics import submit_rtt_ms, cancel_rtt_ms, flight_recorder
+from utils import now
+
+ALO = {"limit": {"tif": "Alo"}}   # post‐only
+IOC = {"limit": {"tif": "Ioc"}}   # market orders: fill what crosses, cancel the rest
+MAX_RECENT_OIDS = 1_000
+
+
+class Quote:
+    """
+    One live layer. `oid` is known once the exchange acks the order; `cloid`
+    is ours and known from the start.
+    """
+    __slots__ = ("side", "layer", "px", "sz", "filled", "oid", "cloid", "ts")
+
+    def __init__(self, side, layer, px, sz, cloid):
+        self.side   = side
+        self.layer  = layer
+        self.px     = px
+        self.sz     = sz
+        self.filled = 0.0
+        self.oid    = None
+        self.cloid  = cloid
+        self.ts     = now()
+
+    @property
+    def is_buy(self):
+        return self.side == "buy"
+
+    @property
+    def remaining(self):
+        return self.sz - self.filled
+
+
+class OrderRegistry:
+    """
+    Live quotes indexed by oid, cloid and (side, layer) slot.
+    """
+
+    def __init__(self):
+        self.by_oid   = {}
+        self.by_cloid = {}
+        self.by_slot  = {}
+
+    def add(self, q):
+        self.by_slot[(q.side, q.layer)] = q
+        self.by_cloid[q.cloid.to_raw()] = q
+        if q.oid is not None:
+            self.by_oid[q.oid] = q
+
+    def set_oid(self, q, oid):
+        if q.oid is not None:
+            self.by_oid.pop(q.oid, None)
+        q.oid = oid
+        self.by_oid[oid] = q
+
+    def remove(self, q):
+        if self.by_slot.get((q.side, q.layer)) is q:
+            del self.by_slot[(q.side, q.layer)]
+        self.by_cloid.pop(q.cloid.to_raw(), None)
+        if q.oid is not None:
+            self.by_oid.pop(q.oid, None)
+
+    def oids(self):
+        return list(self.by_oid)
+
+    def __iter__(self):
+        return iter(list(self.by_slot.values()))
+
+    def __len__(self):
+        return len(self.by_slot)
+
+
+class QuoteEngine:
+    """
+    Keeps a set of (side, layer) -> (px, sz) quotes live with as few requests
+    as possible. Each `sync` diffs the wanted quotes against the registry:
+    unchanged layers are kept, repriced or stale ones go out as one
+    batchModify, unwanted ones as one bulk cancel and missing ones as one
+    bulk order; the (at most three) requests are sent concurrently.
+
+    `on_fill(side, px, sz)` is called once per fill of one of our orders,
+    whether it filled on placement or later while resting. Market orders
+    (`take`) are separate: they never enter the registry and their fill
+    is returned to the caller instead.
+    """
+
+    def __init__(self, client, coin, on_fill, tracker=fill_tracker):
+        self.client    = client
+        self.coin      = coin
+        self.on_fill   = on_fill
+        self.tracker   = tracker
+        self.registry  = OrderRegistry()
+        self._cloid    = int(time.time() * 1000) << 20   # unique across restarts
+        self._recent   = OrderedDict()                   # oid -> side, for late fills
+        self._orphans  = OrderedDict()                   # oid -> fills pushed before the ack
+        self.errors    = 0                               # failed requests, for flight traces
+        self.unsettled = False                           # an order request failed or its outcome is unknown
+        tracker.add_listener(self._on_tracker_fill)
+
+    def _next_cloid(self):
+        self._cloid += 1
+        return Cloid.from_int(self._cloid)
+
+    def _remember(self, q):
+        if q.oid is not None:
+            self._recent[q.oid] = q.side
+            if len(self._recent) > MAX_RECENT_OIDS:
+                self._recent.popitem(last=False)
+
+    def _drop(self, q):
+        self._remember(q)
+        self.registry.remove(q)
+
+    def _request(self, q, px=None, sz=None):
+        return {
+            "coin": self.coin,
+            "is_buy": q.is_buy,
+            "sz": q.sz if sz is None else sz,
+            "limit_px": q.px if px is None else px,
+            "order_type": ALO,
+            "reduce_only": False,
+            "cloid": q.cloid,
+        }
+
+    #─── fills & exchange‐side closes ──────────────────────────────────────────
+    def _on_tracker_fill(self, f):
+        if f.get("coin", self.coin) != self.coin:
+            return   # another coin's engine owns it
+        oid = f.get("oid")
+        q = self.registry.by_oid.get(oid)
+        side = q.side if q is not None else self._recent.get(oid)
+        if side is None:
+            # the push can beat the order ack; hold it until the oid is known
+            self._orphans.setdefault(oid, []).append(f)
+            if len(self._orphans) > MAX_RECENT_OIDS:
+                self._orphans.popitem(last=False)
+            return
+        sz = float(f["sz"])
+        self.on_fill(side, float(f["px"]), sz)
+        if q is not None:
+            q.filled += sz
+            if q.remaining <= 1e-12:
+                self._drop(q)
+
+    def prune(self):
+        """
+        Forget quotes the exchange has closed on its own (e.g. an Alo order
+        that would have crossed).
+        """
+        for q in self.registry:
+            if q.oid is not None and self.tracker.is_closed(q.oid):
+                self._drop(q)
+                self.tracker.forget(q.oid)
+
+    #─── diff ──────────────────────────────────────────────────────────────────
+    def diff(self, desired, at=None):
+        """
+        Split `desired` {(side, layer): (px, sz)} into (modify, cancel, place)
+        against the live registry. A layer is kept when its price is unchanged,
+        at least half of its size is still resting and it is not stale.
+        """
+        at = at or now()
+        modify, cancel, place = [], [], []
+        for slot, q in list(self.registry.by_slot.items()):
+            want = desired.get(slot)
+            if want is None:
+                cancel.append(q)
+                continue
+            px, sz = want
+            if px == q.px and q.remaining >= sz / 2 and at - q.ts <= STALE_TIMEOUT:
+                continue
+            modify.append((q, px, sz))
+        for slot, (px, sz) in desired.items():
+            if slot not in self.registry.by_slot:
+                place.append((slot, px, sz))
+        return modify, cancel, place
+
+    async def sync(self, desired):
+        """
+        Bring the live quotes to `desired`; returns the (modify, cancel,
+        place) counts sent.
+        """
+        self.prune()
+        modify, cancel, place = self.diff(desired)
+        jobs = []
+        if cancel:
+            jobs.append(self._cancel(cancel))
+        if modify:
+            jobs.append(self._modify(modify))
+        if place:
+            jobs.append(self._place(place))
+        if jobs:
+            await asyncio.gather(*jobs)
+        return len(modify), len(cancel), len(place)
+
+    #─── requests ──────────────────────────────────────────────────────────────
+    def _apply_status(self, q, st):
+        if "resting" in st:
+            oid = st["resting"]["oid"]
+            self.registry.set_oid(q, oid)
+            for f in self._orphans.pop(oid, ()):
+                self._on_tracker_fill(f)
+        elif "filled" in st:
+            # counted from the ack; the oid is not remembered, so the
+            # websocket copies of the same fill are ignored
+            f = st["filled"]
+            self._orphans.pop(f["oid"], None)
+            self.registry.remove(q)
+            self.on_fill(q.side, float(f["avgPx"]), float(f["totalSz"]))
+        else:
+            print(f"[QUOTE] {q.side} L{q.layer} {q.sz}@{q.px} rejected: {st.get('error', st)}")
+            self._drop(q)
+
+    def _failed(self, what, e):
+        print(f"[QUOTE] {what} failed: {e}")
+        self.errors += 1
+        self.unsettled = True
+        flight_recorder.dump_on_error(what)
+
+    def _statuses(self, resp):
+        try:
+            return resp["response"]["data"]["statuses"]
+        except (KeyError, TypeError):
+            print(f"[QUOTE] bad response: {resp}")
+            self.unsettled = True
+            return None
+
+    async def _place(self, items):
+        quotes = []
+        for (side, layer), px, sz in items:
+            q = Quote(side, layer, px, sz, self._next_cloid())
+            self.registry.add(q)
+            quotes.append(q)
+        t0 = time.perf_counter()
+        try:
+            resp = await self.client.bulk_orders([self._request(q) for q in quotes])
+            submit_rtt_ms.observe((time.perf_counter() - t0) * 1e3)
+            statuses = self._statuses(resp)
+        except Exception as e:
+            self._failed("bulk_orders", e)
+            statuses = None
+        if statuses is None:
+            for q in quotes:
+                self._drop(q)
+            return
+        for q, st in zip(quotes, statuses):
+            self._apply_status(q, st)
+
+    async def _modify(self, items):
+        # the quote keeps describing the old order (px, sz, filled, oid)
+        # until the ack: a fill on it during the round trip still counts
+        # against the old size
+        reqs = [{"oid": q.oid, "order": self._request(q, px, sz)} for q, px, sz in items]
+        t0 = time.perf_counter()
+        try:
+            resp = await self.client.bulk_modify(reqs)
+            submit_rtt_ms.observe((time.perf_counter() - t0) * 1e3)
+            statuses = self._statuses(resp)
+        except Exception as e:
+            self._failed("bulk_modify", e)
+            statuses = None
+        if statuses is None:
+            # unknown outcome: forget them here, the next sync re‐places
+            # and whatever is still live is swept by `reconcile`
+            for q, _, _ in items:
+                self._drop(q)
+            return
+        stray = []
+        for (q, px, sz), st in zip(items, statuses):
+            if "resting" in st and self.registry.by_cloid.get(q.cloid.to_raw()) is not q:
+                # the old order filled out during the round trip and was
+                # dropped; don't track its replacement, take it down
+                stray.append(st["resting"]["oid"])
+                continue
+            if "error" not in st:
+                # the old oid's late fills go through _recent from here
+                self._remember(q)
+                q.px, q.sz, q.filled, q.ts = px, sz, 0.0, now()
+            self._apply_status(q, st)
+        if stray:
+            try:
+                await self.client.bulk_cancel([{"coin": self.coin, "oid": oid} for oid in stray])
+            except Exception as e:
+                self._failed("bulk_cancel", e)
+
+    async def _cancel(self, quotes):
+        # dropped up front; if the cancel fails, `reconcile` sweeps them
+        for q in quotes:
+            self._drop(q)
+        t0 = time.perf_counter()
+        try:
+            await self.client.bulk_cancel([{"coin": self.coin, "oid": q.oid} for q in quotes])
+            cancel_rtt_ms.observe((time.perf_counter() - t0) * 1e3)
+        except Exception as e:
+            self._failed("bulk_cancel", e)
+
+    async def take(self, side, px, sz, reduce_only=False):
+        """
+        IOC order for `sz` at `px` or better; returns (avg_px, filled_sz)
+        from the ack, (0.0, 0.0) when nothing filled or the outcome is
+        unknown (the position reconcile then catches up). Like a quote that
+        fills on placement, its websocket fill copies are ignored.
+        """
+        req = {
+            "coin": self.coin,
+            "is_buy": side == "buy",
+            "sz": sz,
+            "limit_px": px,
+            "order_type": IOC,
+            "reduce_only": reduce_only,
+            "cloid": self._next_cloid(),
+        }
+        t0 = time.perf_counter()
+        try:
+            resp = await self.client.bulk_orders([req])
+            submit_rtt_ms.observe((time.perf_counter() - t0) * 1e3)
+            statuses = self._statuses(resp)
+        except Exception as e:
+            self._failed("market order", e)
+            return 0.0, 0.0
+        st = statuses[0] if statuses else {}
+        if "filled" not in st:
+            print(f"[QUOTE] {side} IOC {sz}@{px} not filled: {st.get('error', st)}")
+            return 0.0, 0.0
+        f = st["filled"]
+        self._orphans.pop(f["oid"], None)
+        return float(f["avgPx"]), float(f["totalSz"])
+
+    async def reconcile(self, open_orders, grace=ORDER_RECONCILE_GRACE):
+        """
+        Cancel this coin's orders that the exchange reports open (its
+        openOrders) but the registry doesn't track: left live by a failed
+        cancel, or by a modify or placement whose outcome was unknown.
+        Orders younger than `grace` seconds may still be waiting for their
+        ack and are left for the next pass. Returns the number cancelled.
+        """
+        self.unsettled = False
+        cutoff = (now() - grace) * 1000
+        oids = [o["oid"] for o in open_orders
+                if o.get("coin") == self.coin
+                and o["oid"] not in self.registry.by_oid
+                and o.get("cloid") not in self.registry.by_cloid
+                and o.get("timestamp", 0) <= cutoff]
+        if not oids:
+            return 0
+        print(f"[QUOTE] {self.coin}: cancelling {len(oids)} untracked open order(s)")
+        t0 = time.perf_counter()
+        try:
+            await self.client.bulk_cancel([{"coin": self.coin, "oid": oid} for oid in oids])
+            cancel_rtt_ms.observe((time.perf_counter() - t0) * 1e3)
+        except Exception as e:
+            self._failed("reconcile cancel", e)
+        return len(oids)
+
+    async def cancel_all(self, extra_oids=()):
+        """
+        Mass‐cancel every live quote (plus `extra_oids`, e.g. open orders
+        reported by the exchange) in one batched request.
+        """
+        oids = set(self.registry.oids()) | set(extra_oids)
+        for q in self.registry:
+            self._drop(q)
+        if not oids:
+            return
+        t0 = time.perf_counter()
+        try:
+            await self.client.bulk_cancel([{"coin": self.coin, "oid": oid} for oid in oids])
+            cancel_rtt_ms.observe((time.perf_counter() - t0) * 1e3)
+        except Exception as e:
+            self._failed("cancel_all", e)
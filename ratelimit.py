@@ -0,0 +1,272 @@
+# ratelimit.py
+#
+# One scheduler in front of every exchange request (AsyncExchange.post), so
+# the bot stays inside Hyperliquid's per‐IP budget of RATE_LIMIT_WEIGHT
+# request weight per minute:
+#   /exchange  1 + floor(batch length / 40)
+#   /info      2 for l2Book, allMids, clearinghouseState, orderStatus,
+#              spotClearinghouseState, exchangeStatus; 60 for userRole;
+#              20 for everything else
+# The budget is a sliding 60 s window of the weight spent — the exchange's
+# own per‐minute window, which a token bucket refilled at a constant rate
+# would overrun by up to a full burst. Requests are admitted in
+# strict priority:
+#   URGENT  cancels and flattens (reduce‐only IOC orders)
+#   QUOTE   new and modified quotes, IOC entries, the latency ping
+#   INFO    /info queries
+# and keeps RATE_LIMIT_RESERVE weight that only URGENT may spend, so quoting
+# and polling can never use up what a mass cancel needs. Identical /info
+# requests in flight at the same time share one response.
+#
+# A 429 pauses every request for a backoff that doubles per repeat
+# (RATE_LIMIT_BACKOFF_MIN_SEC … MAX_SEC) and cuts what QUOTE and INFO may
+# use to RATE_LIMIT_SLOWDOWN of the budget, recovering linearly over
+# RATE_LIMIT_RECOVER_SEC; URGENT keeps all of it.
+#
+#   python ratelimit.py    # flood local_exchange (with its own limit) and report
+
+import asyncio
+import json
+import time
+from collections import deque
+
+from config import (
+    RATE_LIMIT_WEIGHT, RATE_LIMIT_RESERVE, RATE_LIMIT_BACKOFF_MIN_SEC, RATE_LIMIT_BACKOFF_MAX_SEC,
+    RATE_LIMIT_SLOWDOWN, RATE_LIMIT_RECOVER_SEC,
+)
+from metrics import (
+    ratelimit_budget, ratelimit_weight_total, ratelimit_wait_ms, ratelimit_throttled_total,
+    info_coalesced_total,
+)
+
+URGENT, QUOTE, INFO = 0, 1, 2
+PRIORITY_NAMES = {URGENT: "urgent", QUOTE: "quote", INFO: "info"}
+
+LIGHT_INFO = {"l2Book", "allMids", "clearinghouseState", "orderStatus",
+              "spotClearinghouseState", "exchangeStatus"}
+
+def request_weight(path, payload):
+    if path == "/exchange":
+        action = payload.get("action", {})
+        n = len(action.get("orders") or action.get("cancels") or action.get("modifies") or ())
+        return 1 + n // 40
+    kind = payload.get("type")
+    if kind in LIGHT_INFO:
+        return 2
+    if kind == "userRole":
+        return 60
+    return 20
+
+
+class RequestScheduler:
+    """
+    Per‐minute weight budget with strict‐priority waiters. `acquire`
+    returns at once when the budget allows and nothing of equal or higher
+    priority is queued; otherwise it waits its turn.
+    """
+
+    def __init__(self, weight_per_min=RATE_LIMIT_WEIGHT, reserve=RATE_LIMIT_RESERVE):
+        self.capacity   = weight_per_min
+        self.reserve    = reserve
+        self.tokens     = float(weight_per_min)
+        self.speed      = 1.0    # share of the budget QUOTE/INFO may use, < 1 while recovering from a 429
+        self.paused_until = 0.0
+        self.backoff    = 0.0
+        self._t         = time.monotonic()
+        self._spent_log = deque()   # (time, weight) spent in the last minute
+        self._window    = 0         # their sum
+        self._queues    = (deque(), deque(), deque())   # per priority: (weight, future, t_queued)
+        self._wake      = None
+        self._task      = None
+        self._inflight  = {}     # /info payload key -> shared future
+        self._waits     = [ratelimit_wait_ms.labels(PRIORITY_NAMES[p]) for p in (URGENT, QUOTE, INFO)]
+        self._spent     = [ratelimit_weight_total.labels(PRIORITY_NAMES[p]) for p in (URGENT, QUOTE, INFO)]
+
+    def set_budget(self, weight_per_min):
+        """
+        E.g. a share of the IP's budget when several processes trade from it.
+        """
+        self.capacity = weight_per_min
+        self.reserve  = min(self.reserve, weight_per_min / 4)
+
+    #─── budget ────────────────────────────────────────────────────────────────
+    def _refill(self):
+        t = time.monotonic()
+        dt, self._t = t - self._t, t
+        if self.speed < 1.0 and t >= self.paused_until:
+            self.speed = min(1.0, self.speed + dt / RATE_LIMIT_RECOVER_SEC)
+        log = self._spent_log
+        while log and log[0][0] <= t - 60:
+            self._window -= log.popleft()[1]
+        self.tokens = self.capacity - self._window
+        return t
+
+    def _wait_for(self, need, t):
+        # seconds until `need` more weight has aged out of the window
+        if need <= 0:
+            return 0.0
+        freed = 0
+        for ts, w in self._spent_log:
+            freed += w
+            if freed >= need:
+                return ts + 60 - t
+        return 1.0   # only the post‐429 recovery can free it: look again shortly
+
+    def _floor(self, priority):
+        # weight QUOTE and INFO must leave: the reserve, plus the share of the
+        # budget cut after a 429 (URGENT may still spend it)
+        if priority == URGENT:
+            return 0
+        return self.reserve + self.capacity * (1.0 - self.speed)
+
+    def _fits(self, priority, weight, t):
+        return t >= self.paused_until and self.tokens - weight >= self._floor(priority)
+
+    def _take(self, priority, weight):
+        self.tokens -= weight
+        self._window += weight
+        self._spent_log.append((self._t, weight))
+        self._spent[priority].inc(weight)
+        ratelimit_budget.set(self.tokens)
+
+    async def acquire(self, priority, weight):
+        t = self._refill()
+        if self._fits(priority, weight, t) and not any(self._queues[p] for p in range(priority + 1)):
+            self._take(priority, weight)
+            self._waits[priority].observe(0.0)
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._queues[priority].append((weight, fut, t))
+        self._kick()
+        await fut   # cancelled while queued: the dispatcher skips it
+        self._waits[priority].observe((time.monotonic() - t) * 1e3)
+
+    def _kick(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._dispatch())
+        else:
+            self._wake.set()
+
+    async def _dispatch(self):
+        while True:
+            p = next((p for p, q in enumerate(self._queues) if q), None)
+            if p is None:
+                return
+            q = self._queues[p]
+            weight, fut, _ = q[0]
+            if fut.done():
+                q.popleft()   # its caller gave up
+                continue
+            t = self._refill()
+            if self._fits(p, weight, t):
+                q.popleft()
+                self._take(p, weight)
+                fut.set_result(None)
+                continue
+            wait = max(self.paused_until - t, self._wait_for(weight + self._floor(p) - self.tokens, t))
+            # a new, more urgent request wakes us early
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(wait, 0.001))
+            except asyncio.TimeoutError:
+                pass
+
+    def queued(self):
+        return sum(len(q) for q in self._queues)
+
+    #─── 429s ──────────────────────────────────────────────────────────────────
+    def throttled(self):
+        t = time.monotonic()
+        self.backoff = min(RATE_LIMIT_BACKOFF_MAX_SEC, self.backoff * 2 or RATE_LIMIT_BACKOFF_MIN_SEC)
+        self.paused_until = max(self.paused_until, t + self.backoff)
+        self.speed  = RATE_LIMIT_SLOWDOWN
+        ratelimit_throttled_total.inc()
+        print(f"🚦 rate limited (429): pausing requests {self.backoff:.1f}s, then {self.speed:.0%} of the budget")
+
+    def succeeded(self):
+        self.backoff = 0.0
+
+    #─── coalescing ────────────────────────────────────────────────────────────
+    async def coalesce(self, payload, request):
+        """
+        `request()` for this /info payload, or the result of the identical
+        one already in flight. The shared request is shielded, so one caller
+        timing out doesn't cancel it for the others; callers must not mutate
+        the response.
+        """
+        key = json.dumps(payload, sort_keys=True)
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = self._inflight[key] = asyncio.ensure_future(request())
+            fut.add_done_callback(lambda f: self._done(key, f))
+        else:
+            info_coalesced_total.inc()
+        return await asyncio.shield(fut)
+
+    def _done(self, key, fut):
+        self._inflight.pop(key, None)
+        if not fut.cancelled():
+            fut.exception()   # retrieved: no warning if every caller gave up
+
+
+scheduler = RequestScheduler()
+
+
+#─── local check ───────────────────────────────────────────────────────────────
+async def _demo(server_limit, seconds=10.0):
+    """
+    Quote, cancel and info traffic at well over a 600/min budget against a
+    local exchange that enforces `server_limit` with the same weights (and
+    answers 429 past it).
+    """
+    from exchange_client import AsyncExchange
+    from local_exchange import LocalExchange
+
+    server = LocalExchange(weight_per_min=server_limit)
+    url = await server.start()
+    sched = RequestScheduler(weight_per_min=600, reserve=50)
+    client = AsyncExchange(hl=None, base_url=url, scheduler=sched)
+    coalesced = info_coalesced_total._value.get()
+    done = {URGENT: [], QUOTE: [], INFO: []}
+    errors = {URGENT: 0, QUOTE: 0, INFO: 0}
+
+    async def flood(priority, payload, every):
+        path = "/info" if priority == INFO else "/exchange"
+        while True:
+            t0 = time.perf_counter()
+            try:
+                if priority == INFO:
+                    await client.info(payload)
+                else:
+                    await client.post(path, payload, priority=priority)
+                done[priority].append((time.perf_counter() - t0) * 1e3)
+            except Exception:
+                errors[priority] += 1
+            await asyncio.sleep(every)
+
+    # unsigned actions are fine here: local_exchange doesn't check signatures
+    order = {"action": {"type": "order", "orders": [{"a": 2, "b": True, "p": "150", "s": "1", "r": False,
+                                                      "t": {"limit": {"tif": "Alo"}}}], "grouping": "na"}}
+    cancel = {"action": {"type": "cancel", "cancels": [{"a": 2, "o": 1}]}}
+    tasks = [asyncio.create_task(flood(QUOTE, order, 0.01)) for _ in range(4)]
+    tasks += [asyncio.create_task(flood(INFO, {"type": "userFills", "user": "0x0"}, 0.01)) for _ in range(4)]
+    tasks += [asyncio.create_task(flood(URGENT, cancel, 0.2))]
+    await asyncio.sleep(seconds)
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await client.close()
+    await server.stop()
+
+    print(f"{seconds:.0f}s, server limit {server_limit}/min: admitted weight {server.weight_used}, "
+          f"{server.throttled} answered 429, "
+          f"{info_coalesced_total._value.get() - coalesced:.0f} info requests coalesced")
+    for p, name in PRIORITY_NAMES.items():
+        ms = sorted(done[p]) or [0.0]
+        print(f"  {name:6}  {len(done[p]):5} done, {errors[p]:3} failed, "
+              f"median {ms[len(ms) // 2]:7.1f} ms, max {ms[-1]:7.1f} ms")
+
+if __name__ == "__main__":
+    asyncio.run(_demo(600))
+    asyncio.run(_demo(300))   # the exchange allows less than configured (another process on the IP)
@@ -0,0 +1,270 @@
+# recorder.py
+#
+# Append‐only binary capture of l2Book pushes, plus a memory‐mapped reader.
+#
+# One file per coin per RECORD_ROTATE_MIN window:
+#   {RECORD_DIR}/{coin}/{coin}-YYYYmmddTHHMM.l2b
+# A 64‐byte header (magic, version, depth, decimals) is followed by
+# fixed‐size records, one per push (see record_dtype):
+#   ts               int64          exchange time, ms
+#   recv_us          int64          local receive time, µs
+#   bid_px, ask_px   int64[depth]   price × 10^PX_DECIMALS (0 = no level)
+#   bid_sz, ask_sz   int64[depth]   size  × 10^SZ_DECIMALS
+#   bid_n,  ask_n    int32[depth]   order count
+# Each column is a strided view of the mapped file, so a time range is two
+# binary searches on `ts` and nothing outside it is paged in. A crash can
+# leave a torn last record; readers ignore trailing partial bytes.
+
+import glob
+import os
+import queue
+import struct
+import threading
+import time
+import numpy as np
+
+from config import TRADING_COIN, RECORD_DIR, RECORD_DEPTH, RECORD_ROTATE_MIN, RECORD_QUEUE
+from orderbook import Levels, PX_DECIMALS, SZ_DECIMALS
+from utils import now
+
+MAGIC       = b"GHL2BOOK"
+VERSION     = 1
+HEADER      = struct.Struct("<8sHHBB")
+HEADER_SIZE = 64
+
+
+def record_dtype(depth):
+    return np.dtype([
+        ("ts",      "<i8"),
+        ("recv_us", "<i8"),
+        ("bid_px",  "<i8", (depth,)),
+        ("bid_sz",  "<i8", (depth,)),
+        ("bid_n",   "<i4", (depth,)),
+        ("ask_px",  "<i8", (depth,)),
+        ("ask_sz",  "<i8", (depth,)),
+        ("ask_n",   "<i4", (depth,)),
+    ])
+
+
+def _header(depth):
+    return HEADER.pack(MAGIC, VERSION, depth, PX_DECIMALS, SZ_DECIMALS).ljust(HEADER_SIZE, b"\0")
+
+
+#─── writer ────────────────────────────────────────────────────────────────────
+class BookRecorder:
+    """
+    Recorder stage for the websocket listener. `record()` only enqueues the
+    levels (Levels, or websocket‐form lists); a writer thread encodes them
+    in batches and appends to the
+    current file, so disk I/O never runs on the event loop. When the queue is
+    full the push is dropped and counted rather than blocking the listener.
+    """
+
+    def __init__(self, root=RECORD_DIR, depth=RECORD_DEPTH, rotate_min=RECORD_ROTATE_MIN, max_queue=RECORD_QUEUE):
+        self.root       = root
+        self.depth      = depth
+        self.rotate_ms  = rotate_min * 60_000
+        self.dtype      = record_dtype(depth)
+        self.queue      = queue.Queue(max_queue)
+        self.written    = 0
+        self.dropped    = 0
+        self._files     = {}   # coin -> (window start ms, file)
+        self._thread    = threading.Thread(target=self._run, name="book-recorder", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def record(self, coin, ts, bids, asks):
+        try:
+            self.queue.put_nowait((coin, ts, int(now() * 1e6), bids, asks))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """
+        Flush everything queued so far and stop the writer. Blocking.
+        """
+        self.queue.put(None)
+        self._thread.join()
+
+    #─── writer thread ─────────────────────────────────────────────────────────
+    def _run(self):
+        try:
+            while True:
+                batch = [self.queue.get()]
+                while len(batch) < 1_000:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = None in batch
+                rows = [b for b in batch if b is not None]
+                try:
+                    self._write(rows)
+                except Exception as e:
+                    print(f"[REC] write error: {e}")
+                if stop:
+                    return
+        finally:
+            for _, f in self._files.values():
+                f.close()
+            self._files.clear()
+
+    def _write(self, rows):
+        # consecutive rows for the same file go out as one write
+        start = 0
+        for i in range(1, len(rows) + 1):
+            if i == len(rows) or self._key(rows[i]) != self._key(rows[start]):
+                coin, window = self._key(rows[start])
+                f = self._file(coin, window)
+                f.write(self._encode(rows[start:i]).tobytes())
+                f.flush()
+                self.written += i - start
+                start = i
+
+    def _key(self, row):
+        coin, ts = row[0], row[1] or 0
+        return coin, ts - ts % self.rotate_ms
+
+    def _file(self, coin, window):
+        cur = self._files.get(coin)
+        if cur is not None and cur[0] == window:
+            return cur[1]
+        if cur is not None:
+            cur[1].close()
+        d = os.path.join(self.root, coin)
+        os.makedirs(d, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M", time.gmtime(window / 1000))
+        path = os.path.join(d, f"{coin}-{stamp}.l2b")
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE:
+            if _read_header(path)[0] != self.depth:
+                # depth changed since that file was started; keep it readable
+                path = path[:-4] + f"-d{self.depth}.l2b"
+        f = open(path, "ab")
+        if f.tell() == 0:
+            f.write(_header(self.depth))
+        else:
+            # drop a torn record left by a crash so new rows stay aligned
+            extra = (f.tell() - HEADER_SIZE) % self.dtype.itemsize
+            if extra:
+                f.truncate(f.tell() - extra)
+                f.seek(0, os.SEEK_END)
+        self._files[coin] = (window, f)
+        return f
+
+    def _encode(self, rows):
+        d = self.depth
+        a = np.zeros(len(rows), self.dtype)
+        a["ts"]      = [r[1] or 0 for r in rows]
+        a["recv_us"] = [r[2] for r in rows]
+        for i, r in enumerate(rows):
+            for side, levels in (("bid", r[3]), ("ask", r[4])):
+                if not isinstance(levels, Levels):
+                    levels = Levels.from_levels(levels, d)
+                k = min(len(levels), d)
+                # already fixed‐point: plain array copies
+                a[side + "_px"][i, :k] = levels.px[:k]
+                a[side + "_sz"][i, :k] = levels.sz[:k]
+                a[side + "_n"][i, :k]  = levels.n[:k]
+        return a
+
+
+#─── reader ────────────────────────────────────────────────────────────────────
+def _read_header(path):
+    with open(path, "rb") as f:
+        magic, version, depth, px_dec, sz_dec = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path}: not a v{VERSION} l2Book recording")
+    return depth, px_dec, sz_dec
+
+
+def open_recording(path):
+    """
+    Memory‐map one file as a structured array of its complete records.
+    """
+    depth, _, _ = _read_header(path)
+    dt = record_dtype(depth)
+    n = (os.path.getsize(path) - HEADER_SIZE) // dt.itemsize
+    if n <= 0:
+        return np.empty(0, dt)
+    return np.memmap(path, dt, mode="r", offset=HEADER_SIZE, shape=(n,))
+
+
+class BookReader:
+    """
+    Time‐range access to one coin's recordings under `root`.
+    """
+
+    def __init__(self, root=RECORD_DIR, coin=TRADING_COIN):
+        self.root  = root
+        self.coin  = coin
+        # by window stamp; a "-d{depth}" continuation sorts after its window's first file
+        stamp = lambda p: (os.path.basename(p)[len(coin) + 1:len(coin) + 14], len(p))
+        self.paths = sorted(glob.glob(os.path.join(root, coin, f"{coin}-*.l2b")), key=stamp)
+
+    def slices(self, start_ms=None, end_ms=None):
+        """
+        Yield one memmap view per file covering [start_ms, end_ms).
+        """
+        for path in self.paths:
+            a = open_recording(path)
+            if not len(a):
+                continue
+            if end_ms is not None and a[0]["ts"] >= end_ms:
+                continue
+            if start_ms is not None and a[-1]["ts"] < start_ms:
+                continue
+            ts = a["ts"]
+            lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, "left"))
+            hi = len(a) if end_ms is None else int(np.searchsorted(ts, end_ms, "left"))
+            if hi > lo:
+                yield a[lo:hi]
+
+    def read(self, start_ms=None, end_ms=None):
+        """
+        Copy [start_ms, end_ms) into one in‐memory array.
+        """
+        parts = list(self.slices(start_ms, end_ms))
+        if not parts:
+            return np.empty(0, record_dtype(RECORD_DEPTH))
+        return np.concatenate(parts)
+
+    def events(self, start_ms=None, end_ms=None):
+        """
+        Yield (ts, bids, asks) with levels in websocket form ({"px", "sz", "n"}
+        strings/ints), for replay through code written against live pushes.
+        """
+        px_div, sz_div = 10 ** PX_DECIMALS, 10 ** SZ_DECIMALS
+        for a in self.slices(start_ms, end_ms):
+            for r in a:
+                yield int(r["ts"]), _levels(r["bid_px"], r["bid_sz"], r["bid_n"], px_div, sz_div), \
+                    _levels(r["ask_px"], r["ask_sz"], r["ask_n"], px_div, sz_div)
+
+
+def _levels(px, sz, n, px_div, sz_div):
+    return [
+        {"px": str(p / px_div), "sz": str(s / sz_div), "n": c}
+        for p, s, c in zip(px.tolist(), sz.tolist(), n.tolist()) if p
+    ]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Summarize recorded l2Book files")
+    parser.add_argument("root", nargs="?", default=RECORD_DIR)
+    parser.add_argument("--coin", default=TRADING_COIN)
+    parser.add_argument("--start", type=int, default=None, help="ms")
+    parser.add_argument("--end", type=int, default=None, help="ms")
+    args = parser.parse_args()
+
+    reader = BookReader(args.root, args.coin)
+    t0 = time.perf_counter()
+    n = 0
+    spread_sum = 0
+    for a in reader.slices(args.start, args.end):
+        n += len(a)
+        spread_sum += int((a["ask_px"][:, 0] - a["bid_px"][:, 0]).sum())
+    dt = time.perf_counter() - t0
+    print(f"{len(reader.paths)} files, {n} snapshots in range, "
+          f"mean spread {spread_sum / max(n, 1) / 10 ** PX_DECIMALS:.6f}, scanned in {dt * 1e3:.1f} ms")
@@ -0,0 +1,426 @@
+# redis_client.py
+#
+# Shared Redis access and the Redis Streams event bus. One pooled async
+# client per process (`get_redis`). Producers call `bus.publish(stream,
+# fields)`, which only appends to an in‐memory queue; `StreamBus.run`
+# drains it with pipelined XADDs (up to REDIS_STREAM_BATCH per round trip,
+# every stream capped at ~REDIS_STREAM_MAXLEN entries), so Redis never
+# sits on the trading path. Entries that pile up while a round trip is in
+# flight go out together in the next one.
+#
+#   ghostbot:book:{coin}      top REDIS_BOOK_DEPTH levels, fixed‐point, every book update;
+#                             {"stale": 1} when the publisher's feed is lost
+#   ghostbot:signals:{coin}   mid, microprice, imbalance, vol, lean, every book update
+#   ghostbot:fills:{coin}     every de‐duplicated fill of the account
+#
+# Every entry carries `t`, the publisher's wall clock (s), for lag. Readers
+# that must see every entry once (dashboards, risk, the fills stream) use
+# consumer groups through `StreamReader`: the group remembers the last
+# entry it was given, so a restarted reader continues from there, and the
+# entries it read but never acknowledged are delivered again first. Book
+# followers (BOOK_FEED = "redis") only want the current book: each process
+# tails the stream on its own (`StreamTail`, from the newest entry on) and
+# skips entries older than BOOK_STALE_SEC.
+#
+# The bus is best effort (a full queue or a failed round trip drops
+# entries, counted in redis_dropped_total); fills of record are in db.py.
+#
+#   python redis_client.py bench [n]       # publish throughput and read lag against REDIS_HOST
+#   python redis_client.py tail STREAM...  # follow streams through a consumer group
+
+import asyncio
+import json
+import socket
+import sys
+import time
+from collections import deque
+
+import numpy as np
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError, ResponseError
+
+from config import (
+    TRADING_COIN, REDIS_HOST, REDIS_PORT, BOOK_STALE_SEC,
+    REDIS_MAX_CONNECTIONS, REDIS_STREAM_MAXLEN, REDIS_STREAM_QUEUE, REDIS_STREAM_BATCH,
+    REDIS_BOOK_DEPTH, REDIS_READ_COUNT, REDIS_READ_BLOCK_MS,
+)
+from metrics import redis_published_total, redis_dropped_total, redis_flush_ms, redis_read_lag_ms
+from orderbook import Levels, get_book
+
+RETRY_SEC = 1.0   # after a failed round trip
+
+
+def book_stream(coin):
+    return f"ghostbot:book:{coin}"
+
+def signals_stream(coin):
+    return f"ghostbot:signals:{coin}"
+
+def fills_stream(coin):
+    return f"ghostbot:fills:{coin}"
+
+
+#─── client ────────────────────────────────────────────────────────────────────
+_client = None
+
+def get_redis():
+    """
+    The process's pooled client (responses decoded to str). Connections are
+    made on first use, inside the event loop that uses them.
+    """
+    global _client
+    if _client is None:
+        pool = aioredis.ConnectionPool(host=REDIS_HOST, port=REDIS_PORT, max_connections=REDIS_MAX_CONNECTIONS,
+                                       decode_responses=True)
+        _client = aioredis.Redis(connection_pool=pool)
+    return _client
+
+async def close_redis():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+#─── encoding ──────────────────────────────────────────────────────────────────
+def _side(levels, depth):
+    return json.dumps([levels.px[:depth].tolist(), levels.sz[:depth].tolist(), levels.n[:depth].tolist()])
+
+def book_fields(book, depth=REDIS_BOOK_DEPTH):
+    return _encode_book((time.time(), book.ts, book.bids, book.asks), depth)
+
+def _encode_book(entry, depth=REDIS_BOOK_DEPTH):
+    t, ts, bids, asks = entry
+    return {"t": t, "ts": ts, "bids": _side(bids, depth), "asks": _side(asks, depth)}
+
+def book_levels(fields):
+    """
+    (ts, bids, asks) back from a book entry, levels as Levels.
+    """
+    sides = []
+    for key in ("bids", "asks"):
+        px, sz, n = json.loads(fields[key])
+        sides.append(Levels(np.array(px, dtype=np.int64), np.array(sz, dtype=np.int64), np.array(n, dtype=np.int64)))
+    return int(fields["ts"]), sides[0], sides[1]
+
+def signals_fields(book, t=None):
+    sig = book.signals
+    return {"t": t or time.time(), "ts": book.ts, "mid": sig.mid, "microprice": sig.microprice,
+            "imbalance": sig.imbalance, "vol": sig.vol(), "lean": sig.lean()}
+
+
+#─── publisher ─────────────────────────────────────────────────────────────────
+class StreamBus:
+    def __init__(self, max_queue=REDIS_STREAM_QUEUE, batch=REDIS_STREAM_BATCH, maxlen=REDIS_STREAM_MAXLEN):
+        self.max_queue = max_queue
+        self.batch     = batch
+        self.maxlen    = maxlen
+        self.queue     = deque()   # (stream, fields, encode)
+        self.published = 0
+        self.dropped   = 0
+        self.flushes   = 0
+        self._wake     = None
+        self._task     = None
+
+    #─── producer side (trading loop) ──────────────────────────────────────────
+    def publish(self, stream, fields, encode=None):
+        """
+        With `encode`, the writer task stores encode(fields) instead: the
+        serializing happens off the caller's path.
+        """
+        if len(self.queue) >= self.max_queue:
+            # Redis can't keep up (or is down): the oldest entry goes
+            self.queue.popleft()
+            self._drop(1)
+        self.queue.append((stream, fields, encode))
+        if self._wake is not None:
+            self._wake.set()
+
+    def on_book(self, book):
+        # OrderBook listener: Levels are replaced, never changed in place, so
+        # holding on to them until the writer encodes them is safe
+        t = time.time()
+        if book.stale:
+            self.publish(book_stream(book.coin), {"t": t, "ts": book.ts, "stale": 1})
+            return
+        self.publish(book_stream(book.coin), (t, book.ts, book.bids, book.asks), _encode_book)
+        self.publish(signals_stream(book.coin), signals_fields(book, t))
+
+    def on_fill(self, fill):
+        # FillTracker listener
+        self.publish(fills_stream(fill.get("coin", TRADING_COIN)), {"t": time.time(), "fill": json.dumps(fill)})
+
+    def attach(self, book):
+        if self.on_book not in book.listeners:
+            book.listeners.append(self.on_book)
+
+    def start(self):
+        """
+        The writer task, once per process.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    #─── writer task ───────────────────────────────────────────────────────────
+    async def run(self):
+        self._wake = asyncio.Event()
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        r = get_redis()
+        while self.queue:
+            n = min(self.batch, len(self.queue))
+            entries = [self.queue.popleft() for _ in range(n)]
+            pipe = r.pipeline(transaction=False)
+            for stream, fields, encode in entries:
+                pipe.xadd(stream, encode(fields) if encode else fields, maxlen=self.maxlen, approximate=True)
+            t0 = time.perf_counter()
+            try:
+                await pipe.execute()
+            except Exception as e:
+                print(f"[REDIS] XADD of {n} entries failed: {e!r}")
+                self._drop(n)
+                await asyncio.sleep(RETRY_SEC)
+                continue
+            redis_flush_ms.observe((time.perf_counter() - t0) * 1e3)
+            redis_published_total.inc(n)
+            self.published += n
+            self.flushes += 1
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        await self.flush()
+
+    def _drop(self, n):
+        self.dropped += n
+        redis_dropped_total.inc(n)
+
+bus = StreamBus()
+
+
+#─── consumer groups ───────────────────────────────────────────────────────────
+class StreamReader:
+    """
+    Reads `streams` as `consumer` of consumer group `group`, created if
+    it doesn't exist yet at `start` ("$": entries added from then on, "0":
+    the whole stream). Iterate it for (stream, id, fields); a batch is
+    acknowledged once the loop body has finished with all of it, so a
+    crash redelivers what wasn't done. Readers that each need every entry
+    use their own group; readers sharing a group split the entries between
+    them.
+    """
+
+    def __init__(self, streams, group, consumer=None, start="$",
+                 count=REDIS_READ_COUNT, block_ms=REDIS_READ_BLOCK_MS, redis=None):
+        self.streams  = list(streams)
+        self.group    = group
+        self.consumer = consumer or socket.gethostname()
+        self.start    = start
+        self.count    = count
+        self.block_ms = block_ms
+        self.redis    = redis or get_redis()
+        self._lag     = {s: redis_read_lag_ms.labels(s) for s in self.streams}
+
+    async def create_groups(self):
+        for s in self.streams:
+            try:
+                await self.redis.xgroup_create(s, self.group, id=self.start, mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def read(self, pending=False):
+        """
+        One XREADGROUP: new entries, or with `pending` this consumer's
+        unacknowledged ones. [(stream, id, fields)], oldest first per stream.
+        """
+        ids = "0" if pending else ">"
+        resp = await self.redis.xreadgroup(self.group, self.consumer, {s: ids for s in self.streams},
+                                           count=self.count, block=None if pending else self.block_ms)
+        out = []
+        for stream, entries in resp or ():
+            for entry_id, fields in entries:
+                out.append((stream, entry_id, fields))
+        return out
+
+    async def ack(self, stream, *ids):
+        if ids:
+            await self.redis.xack(stream, self.group, *ids)
+
+    async def __aiter__(self):
+        ready, pending = False, True   # entries left over from the last run first
+        while True:
+            try:
+                if not ready:
+                    await self.create_groups()
+                    ready = True
+                entries = await self.read(pending)
+            except (RedisError, OSError) as e:
+                print(f"[REDIS] read failed: {e!r}")
+                await asyncio.sleep(RETRY_SEC)
+                continue
+            if pending and not entries:
+                pending = False
+                continue
+            now, done = time.time(), {}
+            for stream, entry_id, fields in entries:
+                if fields:   # a pending entry trimmed away since is redelivered empty
+                    if "t" in fields:
+                        self._lag[stream].observe((now - float(fields["t"])) * 1e3)
+                    yield stream, entry_id, fields
+                done.setdefault(stream, []).append(entry_id)
+            try:
+                for stream, ids in done.items():
+                    await self.ack(stream, *ids)
+            except (RedisError, OSError) as e:
+                print(f"[REDIS] ack failed: {e!r}")   # redelivered as pending after a restart
+
+
+class StreamTail:
+    """
+    Plain XREAD of `streams` from `start` ("$": entries added from now on),
+    no group: every tail sees every entry, and a restarted one starts over
+    from `start`. Iterate it for (stream, id, fields).
+    """
+
+    def __init__(self, streams, start="$", count=REDIS_READ_COUNT, block_ms=REDIS_READ_BLOCK_MS, redis=None):
+        self.streams  = list(streams)
+        self.start    = start
+        self.count    = count
+        self.block_ms = block_ms
+        self.redis    = redis or get_redis()
+        self._lag     = {s: redis_read_lag_ms.labels(s) for s in self.streams}
+
+    async def __aiter__(self):
+        last = {s: self.start for s in self.streams}
+        while True:
+            try:
+                for s, pos in last.items():
+                    if pos == "$":
+                        # pinned to the newest id, so nothing added between two reads is skipped
+                        newest = await self.redis.xrevrange(s, count=1)
+                        last[s] = newest[0][0] if newest else "0-0"
+                resp = await self.redis.xread(last, count=self.count, block=self.block_ms)
+            except (RedisError, OSError) as e:
+                print(f"[REDIS] read failed: {e!r}")
+                await asyncio.sleep(RETRY_SEC)
+                continue
+            now = time.time()
+            for stream, entries in resp or ():
+                for entry_id, fields in entries:
+                    last[stream] = entry_id
+                    if "t" in fields:
+                        self._lag[stream].observe((now - float(fields["t"])) * 1e3)
+                    yield stream, entry_id, fields
+
+
+async def follow_stream_book(coin=TRADING_COIN, max_age=BOOK_STALE_SEC):
+    """
+    Strategy side on another host: apply the book entries another process's
+    listener publishes, in order, to the in‐process book (its listeners,
+    candles included, see each one), and its stale markers. Entries older
+    than `max_age` (a backlog after a Redis stall) are skipped rather than
+    applied as live.
+    """
+    from latency import latency_guard
+    book = get_book(coin)
+    print(f"📡 Following {book_stream(coin)}")
+    async for _, _, fields in StreamTail([book_stream(coin)]):
+        if fields.get("stale"):
+            book.mark_stale()
+            continue
+        if time.time() - float(fields["t"]) > max_age:
+            continue
+        ts, bids, asks = book_levels(fields)
+        if len(bids) and len(asks):
+            book.update(bids, asks, ts)
+            latency_guard.on_message(ts, book.recv_ts)
+
+
+#─── benchmark / tail ──────────────────────────────────────────────────────────
+def _bench_book(depth=REDIS_BOOK_DEPTH):
+    book = get_book("BENCH")
+    bids = [{"px": f"{150 - i * 0.01:.2f}", "sz": "12.5", "n": 3} for i in range(20)]
+    asks = [{"px": f"{150.01 + i * 0.01:.2f}", "sz": "7.25", "n": 2} for i in range(20)]
+    book.update(bids, asks, 1_700_000_000_000)
+    return book
+
+
+async def bench(n=50_000):
+    """
+    Against the Redis at REDIS_HOST: one awaited XADD per entry against the
+    pipelined bus, then the read lag of a consumer group while books are
+    published at a steady rate.
+    """
+    r = get_redis()
+    try:
+        await r.ping()
+    except Exception as e:
+        print(f"no Redis at {REDIS_HOST}:{REDIS_PORT}: {e!r}")
+        return 1
+    stream = book_stream("BENCH")
+    await r.delete(stream)
+    book = _bench_book()
+
+    t0 = time.perf_counter()
+    for _ in range(n // 10):
+        await r.xadd(stream, book_fields(book), maxlen=REDIS_STREAM_MAXLEN, approximate=True)
+    single = (n // 10) / (time.perf_counter() - t0)
+
+    b = StreamBus(max_queue=n)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        b.publish(stream, (time.time(), book.ts, book.bids, book.asks), _encode_book)   # as on_book does
+    t1 = time.perf_counter()
+    await b.flush()
+    t2 = time.perf_counter()
+    print(f"XADD one at a time     {single:10,.0f} entries/s")
+    print(f"pipelined bus          {n / (t2 - t0):10,.0f} entries/s  "
+          f"({b.flushes} round trips of ≤ {b.batch}; enqueue {(t1 - t0) / n * 1e6:.2f} µs per entry)")
+
+    # lag: 2 s of books at 5,000/s, read through a consumer group as they come
+    await r.delete(stream)
+    reader = StreamReader([stream], "bench", start="$")
+    lags, rate, seconds = [], 5_000, 2.0
+
+    async def consume():
+        async for _, _, fields in reader:
+            lags.append((time.time() - float(fields["t"])) * 1e3)
+
+    await reader.create_groups()
+    consumer = asyncio.create_task(consume())
+    b = StreamBus()
+    writer = b.start()
+    t_end = time.perf_counter() + seconds
+    while time.perf_counter() < t_end:
+        for _ in range(rate // 100):
+            b.publish(stream, (time.time(), book.ts, book.bids, book.asks), _encode_book)
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.5)
+    for t in (consumer, writer):
+        t.cancel()
+    await asyncio.gather(consumer, writer, return_exceptions=True)
+    await r.delete(stream)
+    lags.sort()
+    if lags:
+        print(f"read lag at {rate:,}/s    {len(lags)} entries, p50 {lags[len(lags) // 2]:.2f} ms, "
+              f"p99 {lags[int(len(lags) * 0.99)]:.2f} ms, max {lags[-1]:.2f} ms, {b.dropped} dropped")
+    await close_redis()
+    return 0
+
+
+async def tail(streams, group="tail"):
+    async for stream, entry_id, fields in StreamReader(streams, group, start="0"):
+        print(stream, entry_id, fields)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["tail"]:
+        asyncio.run(tail(sys.argv[2:] or [book_stream(TRADING_COIN)]))
+    else:
+        sys.exit(asyncio.run(bench(int(sys.argv[2]) if len(sys.argv) > 2 else 50_000)))
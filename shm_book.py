@@ -0,0 +1,269 @@
+# shm_book.py
+#
+# One ingest process, many strategy processes, one websocket. The ingest
+# side publishes the latest book (top SHM_BOOK_DEPTH levels, fixed‐point)
+# into a shared‐memory segment; readers copy it out lock‐free under a
+# seqlock and mirror it into their own in‐process OrderBook, so
+# market_maker_loop / trade_loop run unchanged in any process.
+#
+#   python shm_book.py            # ingest: websocket → shared memory
+#   python shm_book.py --bench    # publish / read cost
+#
+# Strategy processes opt in with BOOK_FEED = "shm".
+#
+# Segment layout, all little‐endian int64:
+#   [magic, depth, seq, ts, flags, n_bids, n_asks,
+#    bid_px[depth], bid_sz[depth], bid_n[depth],
+#    ask_px[depth], ask_sz[depth], ask_n[depth]]
+# `flags` has STALE set while the ingest side's feed is down (OrderBook.
+# mark_stale), so followers pull their quotes too. `seq` is odd while the
+# writer is mid‐update. A reader copies everything after it and keeps the
+# copy only if `seq` was even and unchanged around the copy; it gives up
+# after SPINS tries and polls again later. There is a single writer.
+# numpy issues no memory barriers, so this relies on x86‐64's ordering
+# (stores seen in program order, loads not reordered with older loads);
+# other architectures get a warning, not a guarantee.
+
+import asyncio
+import platform
+import sys
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+from config import TRADING_COIN, TRADING_COINS, SHM_BOOK_DEPTH, SHM_POLL_SEC
+from orderbook import get_book, Levels
+from latency import latency_guard
+
+MAGIC = 0x47484F5354424B32   # "GHOSTBK2"
+MAGIC_, DEPTH, SEQ, TS, FLAGS, NB, NA = range(7)
+HEADER = 7
+BODY   = HEADER - TS   # arrays start here in the copied body
+STALE  = 1         # flags bit
+SPINS  = 1000      # read attempts before yielding back to the poll loop
+
+if platform.machine().lower() not in ("x86_64", "amd64"):
+    print(f"[SHM] warning: the seqlock relies on x86‐64 memory ordering; "
+          f"reads on {platform.machine()} may be torn")
+
+
+def segment_name(coin):
+    return f"ghostbot_book_{coin}"
+
+
+_created = set()   # segments this process created (and will unlink)
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False)   # Python ≥ 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        if name not in _created:
+            # don't let this process's resource tracker unlink a segment it doesn't own
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+def _create(name, size):
+    shm = shared_memory.SharedMemory(name, create=True, size=size)
+    _created.add(name)
+    return shm
+
+
+#─── writer ────────────────────────────────────────────────────────────────────
+class SharedBookWriter:
+    """
+    Single publisher for one coin. Reuses a segment left by a previous
+    ingest run when its depth matches, so readers survive ingest restarts.
+    """
+
+    def __init__(self, coin=TRADING_COIN, depth=SHM_BOOK_DEPTH):
+        self.coin  = coin
+        self.depth = depth
+        size = (HEADER + 6 * depth) * 8
+        name = segment_name(coin)
+        try:
+            self.shm = _create(name, size)
+        except FileExistsError:
+            self.shm = _attach(name)
+            a = np.ndarray(HEADER, np.int64, self.shm.buf)
+            if self.shm.size < size or a[MAGIC_] != MAGIC or a[DEPTH] != depth:
+                self.shm.close()
+                self.shm.unlink()
+                self.shm = _create(name, size)
+        self.a = np.ndarray(HEADER + 6 * depth, np.int64, self.shm.buf)
+        if self.a[SEQ] & 1:
+            self.a[SEQ] += 1   # a crashed writer left it mid‐update
+        self.a[MAGIC_], self.a[DEPTH] = MAGIC, depth
+        # staged here, then copied in while seq is odd: the write window is one memcpy
+        self._body = np.zeros(len(self.a) - TS, np.int64)
+
+    def publish(self, bids, asks, ts, stale=False):
+        """
+        `bids`/`asks` as Levels (already fixed‐point: plain copies) or
+        websocket‐form lists.
+        """
+        d, body = self.depth, self._body
+        nb, na = min(len(bids), d), min(len(asks), d)
+        body[:] = 0
+        body[:BODY] = ts or 0, STALE if stale else 0, nb, na
+        for levels, n, base in ((bids, nb, BODY), (asks, na, BODY + 3 * d)):
+            if not n:
+                continue
+            if not isinstance(levels, Levels):
+                levels = Levels.from_levels(levels, d)
+            body[base:base + n]                 = levels.px[:n]
+            body[base + d:base + d + n]         = levels.sz[:n]
+            body[base + 2 * d:base + 2 * d + n] = levels.n[:n]
+        a = self.a
+        a[SEQ] += 1
+        a[TS:] = body
+        a[SEQ] += 1
+
+    def close(self, unlink=True):
+        self.a = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+async def publish_shared_book(book, writer):
+    """
+    Mirror every in‐process book update, and the book going stale, into
+    shared memory.
+    """
+    seq = book.seq
+    while True:
+        seq = await book.wait_for_update(seq)
+        writer.publish(book.bids, book.asks, book.ts, book.stale)
+
+
+#─── reader ────────────────────────────────────────────────────────────────────
+class SharedBookReader:
+    def __init__(self, coin=TRADING_COIN):
+        self.shm = _attach(segment_name(coin))
+        hdr = np.ndarray(HEADER, np.int64, self.shm.buf)
+        if hdr[MAGIC_] != MAGIC:
+            raise ValueError(f"{segment_name(coin)}: not a book segment")
+        self.depth = int(hdr[DEPTH])
+        self.a = np.ndarray(HEADER + 6 * self.depth, np.int64, self.shm.buf)
+
+    @property
+    def seq(self):
+        return int(self.a[SEQ])
+
+    def read_raw(self, spins=SPINS):
+        """
+        (seq, copy of [ts, flags, n_bids, n_asks, arrays...]) from a
+        consistent snapshot, or None if the writer was mid‐update for
+        `spins` tries (e.g. it died there).
+        """
+        a = self.a
+        for _ in range(spins):
+            s = a[SEQ]
+            if s & 1:
+                continue
+            body = a[TS:].copy()
+            if a[SEQ] == s:
+                return int(s), body
+        return None
+
+    def read(self, spins=SPINS):
+        """
+        (seq, ts, bids, asks, stale) with levels as Levels (views of the
+        copy), or None as for `read_raw`.
+        """
+        raw = self.read_raw(spins)
+        if raw is None:
+            return None
+        seq, body = raw
+        d = self.depth
+        ts, flags, nb, na = (int(v) for v in body[:BODY])
+        return seq, ts, _levels(body, BODY, nb, d), _levels(body, BODY + 3 * d, na, d), bool(flags & STALE)
+
+    def close(self):
+        self.a = None
+        self.shm.close()
+
+
+def _levels(body, base, n, d):
+    return Levels(body[base:base + n], body[base + d:base + d + n], body[base + 2 * d:base + 2 * d + n])
+
+
+async def follow_shared_book(coin=TRADING_COIN, poll=SHM_POLL_SEC):
+    """
+    Strategy side: keep the in‐process book equal to the shared one. Polls
+    the change counter; only a changed book is copied and decoded.
+    """
+    book = get_book(coin)
+    reader = None
+    while reader is None:
+        try:
+            reader = SharedBookReader(coin)
+        except FileNotFoundError:
+            print(f"[SHM] waiting for the {coin} ingest process…")
+            await asyncio.sleep(1)
+    print(f"📡 Following shared‐memory book for {coin} (depth {reader.depth})")
+
+    seq = 0
+    try:
+        while True:
+            s = reader.seq
+            if s != seq and not s & 1:
+                snap = reader.read()
+                if snap is not None:
+                    seq, ts, bids, asks, stale = snap
+                    if stale:
+                        book.mark_stale()
+                    elif bids and asks:
+                        book.update(bids, asks, ts)
+                        latency_guard.on_message(ts, book.recv_ts)
+            await asyncio.sleep(poll)
+    finally:
+        reader.close()
+
+
+#─── ingest process / benchmark ────────────────────────────────────────────────
+async def ingest(coins=TRADING_COINS):
+    from websocket_handler import listen_orderbook
+    writers = [SharedBookWriter(coin) for coin in coins]
+    for w in writers:
+        print(f"🧠 Publishing {w.coin} book to shared memory ({segment_name(w.coin)})")
+    try:
+        await asyncio.gather(listen_orderbook(coins=coins),
+                             *(publish_shared_book(get_book(w.coin), w) for w in writers))
+    finally:
+        for w in writers:
+            w.close(unlink=False)
+
+
+def bench(n=100_000, depth=SHM_BOOK_DEPTH):
+    # as the listener hands them over: decoded once, fixed‐point
+    bids = Levels.from_levels([{"px": f"{150 - i * 0.01:.2f}", "sz": "12.5", "n": 3} for i in range(depth)])
+    asks = Levels.from_levels([{"px": f"{150.01 + i * 0.01:.2f}", "sz": "7.25", "n": 2} for i in range(depth)])
+    w = SharedBookWriter("BENCH", depth)
+    r = SharedBookReader("BENCH")
+    try:
+        t0 = time.perf_counter()
+        for i in range(n):
+            w.publish(bids, asks, i)
+        t1 = time.perf_counter()
+        for _ in range(n):
+            r.read_raw()
+        t2 = time.perf_counter()
+        for _ in range(n // 10):
+            r.read()
+        t3 = time.perf_counter()
+        assert float(r.read()[2][0]["px"]) == float(bids[0]["px"])
+    finally:
+        r.close()
+        w.close()
+    print(f"depth {depth}: publish {(t1 - t0) / n * 1e6:.2f} µs, "
+          f"read (raw) {(t2 - t1) / n * 1e6:.2f} µs, read (decoded) {(t3 - t2) / (n // 10) * 1e6:.2f} µs")
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        bench()
+    else:
+        asyncio.run(ingest())
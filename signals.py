@@ -0,0 +1,195 @@
+# signals.py
+#
+# Streaming microstructure signals, updated on every book event by
+# OrderBook.update (so none is missed when the quoter is busy, whichever
+# feed delivered the book, backtest included). Each update is O(1) — the
+# rolling window is amortized O(1) with monotonic deques, depth is cut to
+# IMBALANCE_DEPTH levels — and time‐windowed on the book's receive clock
+# (utils.now, virtual in backtests), not counted in samples.
+#
+#   rolling high/low of the mid over VOL_WINDOW_SEC
+#   EWMA realized volatility of the mid (half‐life VOL_EWMA_HALFLIFE_SEC)
+#   depth imbalance over the top IMBALANCE_DEPTH levels, and the microprice
+#
+#   python signals.py        # per-update benchmark
+
+import math
+from collections import deque
+
+from config import VOL_WINDOW_SEC, VOL_EWMA_HALFLIFE_SEC, IMBALANCE_DEPTH, IMBALANCE_THRESHOLD
+
+
+class RollingMax:
+    """
+    Max of the values pushed in the last `window` seconds. The deque holds
+    only values that can still become the max (decreasing), so each value
+    is appended and popped once. Use RollingMin for the low.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._q     = deque()   # (t, x), x strictly decreasing
+
+    def _beats(self, a, b):
+        return a >= b
+
+    def push(self, t, x):
+        q = self._q
+        while q and self._beats(x, q[-1][1]):
+            q.pop()
+        q.append((t, x))
+        cutoff = t - self.window
+        while q[0][0] < cutoff:
+            q.popleft()
+
+    def value(self):
+        return self._q[0][1] if self._q else None
+
+
+class RollingMin(RollingMax):
+    def _beats(self, a, b):
+        return a <= b
+
+
+class EwmaVol:
+    """
+    Realized volatility of a price sampled at irregular times: exponentially
+    weighted sums of squared log returns and of elapsed time, with the same
+    decay, so `variance()` is per second however often it is fed.
+    """
+
+    def __init__(self, halflife):
+        self.rate = math.log(2) / halflife
+        self.sum_r2 = 0.0
+        self.sum_dt = 0.0
+        self._t     = None
+        self._px    = None
+
+    def push(self, t, px):
+        if self._t is not None:
+            dt = t - self._t
+            if dt > 0:
+                decay = math.exp(-self.rate * dt)
+                r = math.log(px / self._px)
+                self.sum_r2 = self.sum_r2 * decay + r * r
+                self.sum_dt = self.sum_dt * decay + dt
+            elif px != self._px:
+                r = math.log(px / self._px)   # same timestamp: count the move, not the time
+                self.sum_r2 += r * r
+        self._t, self._px = t, px
+
+    def variance(self):
+        return self.sum_r2 / self.sum_dt if self.sum_dt else 0.0
+
+    def over(self, seconds):
+        """
+        Expected fractional move (1σ) over `seconds`.
+        """
+        return math.sqrt(self.variance() * seconds)
+
+
+class BookSignals:
+    """
+    All signals for one coin's book. `on_book` takes the top of book as
+    floats and each side's sizes (any consistent unit: only ratios are used).
+    """
+
+    def __init__(self, window=VOL_WINDOW_SEC, halflife=VOL_EWMA_HALFLIFE_SEC,
+                 depth=IMBALANCE_DEPTH, threshold=IMBALANCE_THRESHOLD):
+        self.window    = window
+        self.depth     = depth
+        self.threshold = threshold
+        self.high      = RollingMax(window)
+        self.low       = RollingMin(window)
+        self.ewma      = EwmaVol(halflife)
+        self.mid       = 0.0
+        self.microprice = 0.0
+        self.imbalance = 1.0     # bid depth / ask depth over the top `depth` levels
+        self.t_first   = None    # the range is only trusted once it spans a full window
+        self.t_last    = None
+        self._vol      = None    # vol() of the current book, computed on first use
+
+    def on_book(self, t, bid, ask, bid_sz, ask_sz):
+        mid = (bid + ask) / 2
+        self.mid = mid
+        self.high.push(t, mid)
+        self.low.push(t, mid)
+        self.ewma.push(t, mid)
+        if self.t_first is None:
+            self.t_first = t
+        self.t_last = t
+        self._vol = None
+
+        # a handful of levels: summing Python ints beats a NumPy reduction here
+        bs, as_ = bid_sz[:self.depth].tolist(), ask_sz[:self.depth].tolist()
+        b0, a0, bd, ad = bs[0], as_[0], sum(bs), sum(as_)
+        # top‐level sizes weight the far side's price: a thin ask pulls it up
+        self.microprice = (bid * a0 + ask * b0) / (a0 + b0) if a0 + b0 else mid
+        self.imbalance  = bd / ad if ad else (self.threshold if bd else 1.0)
+
+    def vol(self):
+        """
+        Fractional mid move over the window: the larger of the observed
+        high‐low range (0 until a full window has been seen) and the EWMA
+        realized volatility scaled to the window.
+        """
+        if self._vol is None:
+            if self.t_first is None:
+                return 0.0
+            rng = 0.0
+            if self.t_last - self.t_first >= self.window:
+                rng = (self.high.value() - self.low.value()) / self.mid
+            self._vol = max(rng, self.ewma.over(self.window))
+        return self._vol
+
+    def lean(self):
+        """
+        +1 when bid depth outweighs the ask by IMBALANCE_THRESHOLD and the
+        microprice sits above the mid (buying pressure), −1 for the mirror
+        case, else 0. Both have to agree so one thick level far from the
+        touch doesn't tilt quotes on its own.
+        """
+        if self.imbalance >= self.threshold and self.microprice > self.mid:
+            return 1
+        if self.imbalance <= 1 / self.threshold and self.microprice < self.mid:
+            return -1
+        return 0
+
+
+if __name__ == "__main__":
+    import random
+    import time
+    import numpy as np
+
+    random.seed(3)
+    n, t, k = 200_000, 0.0, 15_000
+    events = []
+    for _ in range(n):
+        t += random.expovariate(10)   # ~10 books/s
+        k += random.choice((-1, 0, 0, 1))
+        bsz = np.array([random.randint(1, 5_000) for _ in range(20)], dtype=np.int64)
+        asz = np.array([random.randint(1, 5_000) for _ in range(20)], dtype=np.int64)
+        events.append((t, (k - 1) / 100, (k + 1) / 100, bsz, asz))
+
+    sig = BookSignals()
+    t0 = time.perf_counter()
+    for e in events:
+        sig.on_book(*e)
+    dt = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(n):
+        sig.vol(); sig.lean()
+    dq = time.perf_counter() - t0
+    print(f"{n} books: on_book {dt / n * 1e6:.2f} µs, vol()+lean() {dq / n * 1e6:.2f} µs")
+    print(f"window deque {len(sig.high._q)}/{len(sig.low._q)} entries; vol {sig.vol():.5f}, "
+          f"imbalance {sig.imbalance:.2f}, microprice {sig.microprice:.4f} (mid {sig.mid:.4f})")
+
+    # the deques against a brute‐force window
+    xs = [(e[0], (e[1] + e[2]) / 2) for e in events[:20_000]]
+    hi, lo = RollingMax(VOL_WINDOW_SEC), RollingMin(VOL_WINDOW_SEC)
+    bad = 0
+    for i, (t, x) in enumerate(xs):
+        hi.push(t, x); lo.push(t, x)
+        win = [v for (s, v) in xs[max(0, i - 500):i + 1] if s >= t - VOL_WINDOW_SEC]
+        bad += hi.value() != max(win) or lo.value() != min(win)
+    print(f"rolling high/low vs brute force: {bad} mismatches")
@@ -0,0 +1,11 @@
+# tests/conftest.py
+#
+# The bot is a flat set of modules run from the repo root; make them
+# importable from here too.
+#
+#   python -m pytest tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,37 @@
+# tests/test_db.py
+#
+# FillJournal without a database: everything goes to the spill file.
+
+import asyncio
+
+from db import FillJournal, _read_spill
+
+
+def test_close_stops_the_writer_and_keeps_every_row(tmp_path):
+    spill = str(tmp_path / "fills.jsonl")
+
+    async def run():
+        j = FillJournal(dsn=None, spill_path=spill, flush_sec=60)
+        task = asyncio.create_task(j.run())
+        await asyncio.sleep(0)
+        for i in range(5):
+            j.record("buy", 150.0 + i, 1.0, 0.0, coin="SOL")
+        await j.close()
+        assert task.done() and task.exception() is None
+
+    asyncio.run(run())
+    assert [r[4] for r in _read_spill(spill)] == [150.0, 151.0, 152.0, 153.0, 154.0]
+
+
+def test_queue_depth_counts_rows_waiting_to_spill(tmp_path):
+    from metrics import db_queue_depth
+
+    async def run():
+        j = FillJournal(dsn=None, spill_path=str(tmp_path / "fills.jsonl"), max_queue=2)
+        for _ in range(5):
+            j.record("sell", 150.0, 1.0, 0.0, coin="SOL")
+        assert db_queue_depth._value.get() == 5   # 2 queued, 3 for the spill task
+        await j.close()
+        assert db_queue_depth._value.get() == 0
+
+    asyncio.run(run())
@@ -0,0 +1,67 @@
+# tests/test_exchange_client.py
+#
+# AsyncExchange against local_exchange.py: signed order actions and the
+# signing pool, with a throwaway key.
+
+import asyncio
+
+import pytest
+
+from exchange_client import AsyncExchange, SigningPool, load_signing
+from local_exchange import LocalExchange, DEFAULT_META
+from ratelimit import RequestScheduler
+
+
+def _exchange(url):
+    from eth_account import Account
+    from hyperliquid.exchange import Exchange
+    return Exchange(Account.create(), url, meta=DEFAULT_META, spot_meta={"universe": [], "tokens": []})
+
+
+def test_needs_exchange_or_url():
+    with pytest.raises(ValueError):
+        AsyncExchange(None)
+
+
+def test_signing_pool_matches_sdk():
+    from eth_account import Account
+    signing = load_signing()
+    wallet = Account.create()
+    action = {"type": "cancel", "cancels": [{"a": 5, "o": 123}]}
+    want = signing.sign_l1_action(wallet, action, None, 1_700_000_000_000, None, True)
+
+    async def sign(workers):
+        pool = SigningPool(wallet, workers)
+        try:
+            await pool.warm_up()
+            return await pool.sign(action, None, 1_700_000_000_000, None, True)
+        finally:
+            pool.close()
+
+    assert asyncio.run(sign(0)) == want
+    assert asyncio.run(sign(1)) == want
+
+
+def test_orders_and_cancels():
+    async def run():
+        server = LocalExchange()
+        url = await server.start()
+        hl = await asyncio.to_thread(_exchange, url)
+        client = AsyncExchange(hl, base_url=url, scheduler=RequestScheduler(), sign_workers=0)
+        try:
+            order = {"coin": "SOL", "is_buy": True, "sz": 0.5, "limit_px": 140.0,
+                     "order_type": {"limit": {"tif": "Alo"}}, "reduce_only": False}
+            resp = await client.bulk_orders([order, dict(order, limit_px=139.0)])
+            statuses = resp["response"]["data"]["statuses"]
+            oids = [st["resting"]["oid"] for st in statuses]
+            assert sorted(server.open_orders) == sorted(oids)
+
+            resp = await client.bulk_cancel([{"coin": "SOL", "oid": oid} for oid in oids])
+            assert resp["response"]["data"]["statuses"] == ["success", "success"]
+            assert not server.open_orders
+        finally:
+            await client.close()
+            await server.stop()
+
+    asyncio.run(run())
+
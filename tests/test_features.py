@@ -0,0 +1,37 @@
+# tests/test_features.py
+#
+# The on‐disk feature cache: prefix reuse and the size bound.
+
+import os
+
+import pandas as pd
+import pytest
+
+from indicators import _random_walk
+
+features = pytest.importorskip("features")   # needs pandas_ta
+
+
+def _candles(n):
+    high, low, close = _random_walk(n)
+    return pd.DataFrame({"timestamp": range(n), "high": high, "low": low, "close": close})
+
+
+def test_extending_a_prefix_keeps_it(tmp_path):
+    df = _candles(3000)
+    short = features.cached_features(df.iloc[:2000], str(tmp_path))
+    full = features.cached_features(df, str(tmp_path))
+    assert sorted(e[0] for e in features._entries(str(tmp_path))) == [2000, 3000]
+    pd.testing.assert_frame_equal(full.iloc[:2000], short)
+    # a second extension of the same prefix still finds it
+    features.cached_features(df.iloc[:2500], str(tmp_path))
+    assert len(features._entries(str(tmp_path))) == 3
+
+
+def test_cache_is_bounded_by_size(tmp_path):
+    df = _candles(3000)
+    for n in (1000, 2000, 3000):
+        features.cached_features(df.iloc[:n], str(tmp_path))
+    sizes = {rows: os.path.getsize(p) for rows, _, p in features._entries(str(tmp_path))}
+    features._prune(str(tmp_path), sizes[3000] + sizes[2000], keep=None)
+    assert sorted(e[0] for e in features._entries(str(tmp_path))) == [2000, 3000]
@@ -0,0 +1,61 @@
+# tests/test_feeds.py
+#
+# Book feed recovery: the supervised websocket against local_exchange.py
+# (websocket_handler._recovery_check) and the shared‐memory fan‐out.
+
+import asyncio
+
+import shm_book
+from orderbook import get_book
+from websocket_handler import _recovery_check
+
+BIDS = [{"px": "150.0", "sz": "1.0", "n": 1}]
+ASKS = [{"px": "150.1", "sz": "1.0", "n": 1}]
+
+
+def test_reconnects_after_drops():
+    gaps, recoveries = asyncio.run(_recovery_check(drops=2))
+    assert len(gaps) == 2 and len(recoveries) == 2
+    assert max(gaps) < 1.0
+
+
+def test_standby_keeps_the_book_live():
+    gaps, _ = asyncio.run(_recovery_check(drops=2, standby=True))
+    assert gaps == []
+
+
+def test_shared_book_carries_stale_flag():
+    async def run():
+        w = shm_book.SharedBookWriter("TESTSHM", 5)
+        book = get_book("TESTSHM")
+        task = asyncio.create_task(shm_book.follow_shared_book("TESTSHM", poll=0.001))
+        try:
+            w.publish(BIDS, ASKS, 1)
+            await asyncio.sleep(0.05)
+            assert book.ready() and book.ts == 1
+            w.publish(BIDS, ASKS, 1, stale=True)
+            await asyncio.sleep(0.05)
+            assert book.stale
+            w.publish(BIDS, ASKS, 2)
+            await asyncio.sleep(0.05)
+            assert book.ready() and book.ts == 2
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            w.close()
+
+    asyncio.run(run())
+
+
+def test_shared_book_read_gives_up_on_a_torn_segment():
+    w = shm_book.SharedBookWriter("TESTSHM2", 5)
+    r = shm_book.SharedBookReader("TESTSHM2")
+    try:
+        w.publish(BIDS, ASKS, 3)
+        seq, ts, bids, asks, stale = r.read()
+        assert ts == 3 and not stale and float(bids[0]["px"]) == 150.0
+        w.a[shm_book.SEQ] += 1   # writer died mid‐update
+        assert r.read(spins=10) is None
+    finally:
+        r.close()
+        w.close()
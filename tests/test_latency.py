@@ -0,0 +1,155 @@
+# tests/test_latency.py
+#
+# LatencyGuard mode changes on a fake clock, and the RTT sampler against
+# local_exchange.py with injected delay.
+
+import asyncio
+
+import pytest
+
+import utils
+from latency import LatencyGuard, OK, WIDEN, PULL
+
+
+@pytest.fixture
+def clock():
+    t = [1000.0]
+    utils.set_clock(lambda: t[0])
+    yield t
+    utils.set_clock(__import__("time").time)
+
+
+def test_escalates_on_first_slow_sample(clock):
+    g = LatencyGuard(budget_ms=100, pull_mult=2, recover_sec=5)
+    g.rtt.alpha = 1.0   # EWMA = last sample
+    g.on_ping(50)
+    assert g.mode == OK and g.widen == 1
+    g.on_ping(150)
+    assert g.mode == WIDEN and g.widen == g.widen_mult
+    g.on_ping(None)
+    assert g.mode == PULL and g.paused
+
+
+def test_recovers_one_mode_at_a_time(clock):
+    g = LatencyGuard(budget_ms=100, pull_mult=2, recover_sec=5)
+    g.rtt.alpha = 1.0   # EWMA = last sample
+    g.on_ping(500)
+    assert g.mode == PULL
+    for _ in range(5):
+        clock[0] += 1
+        g.on_ping(10)
+    assert g.mode == PULL          # calm for 4 s only
+    clock[0] += 1
+    g.on_ping(10)
+    assert g.mode == WIDEN         # one step, not straight to OK
+    clock[0] += 4
+    g.on_ping(10)
+    assert g.mode == WIDEN         # the calm timer restarted with the step
+    clock[0] += 1
+    g.on_ping(10)
+    clock[0] += 1
+    g.on_ping(10)
+    assert g.mode == OK
+
+
+def test_slow_sample_resets_recovery(clock):
+    g = LatencyGuard(budget_ms=100, pull_mult=2, recover_sec=5)
+    g.rtt.alpha = 1.0
+    g.on_ping(150)
+    clock[0] += 4
+    g.on_ping(10)
+    g.on_ping(150)   # back over budget: the calm period starts again
+    clock[0] += 2
+    g.on_ping(10)
+    clock[0] += 4
+    g.on_ping(10)
+    assert g.mode == WIDEN
+
+
+def test_book_age_floor_does_not_follow_a_slowdown():
+    g = LatencyGuard(budget_ms=100, floor_sec=900)
+    g.age.alpha = 1.0
+    t = 1000.0
+    for _ in range(600):              # offset 50 ms: age 0
+        t += 0.1
+        g.on_message(t * 1000 - 50, t)
+    assert g.age.last == 0
+    for _ in range(6000):             # 10 min of pushes 300 ms late
+        t += 0.1
+        g.on_message(t * 1000 - 350, t)
+    assert g.age.last == 300 and g.mode == PULL
+    for _ in range(3000):             # past the window: the new offset is the floor
+        t += 0.1
+        g.on_message(t * 1000 - 350, t)
+    assert g.age.last == 0
+
+
+def test_only_timeouts_and_lost_connections_fail_a_ping():
+    import aiohttp
+    from hyperliquid.utils.error import ClientError
+
+    class Client:
+        async def ping(self, timeout=None):
+            raise self.error
+
+    async def sample(error):
+        g = LatencyGuard(budget_ms=100)
+        client = Client()
+        client.error = error
+        task = asyncio.create_task(g.run(client, interval=0.01))
+        await asyncio.sleep(0.03)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return g.mode
+
+    assert asyncio.run(sample(asyncio.TimeoutError())) == PULL
+    assert asyncio.run(sample(aiohttp.ServerDisconnectedError())) == PULL
+    assert asyncio.run(sample(ClientError(429, None, "rate limited", {}))) == OK
+    assert asyncio.run(sample(RuntimeError("scheduler"))) == OK
+
+
+def test_ping_times_the_round_trip():
+    from exchange_client import AsyncExchange
+    from local_exchange import LocalExchange
+    from ratelimit import RequestScheduler
+
+    async def run():
+        server = LocalExchange(latency=0.05)
+        url = await server.start()
+        client = AsyncExchange(None, base_url=url, scheduler=RequestScheduler())
+        try:
+            assert await client.ping() >= 50
+        finally:
+            await client.close()
+            await server.stop()
+
+    asyncio.run(run())
+
+
+def test_sampler_against_local_exchange():
+    from exchange_client import AsyncExchange
+    from local_exchange import LocalExchange
+    from ratelimit import RequestScheduler
+
+    async def run():
+        server = LocalExchange()
+        url = await server.start()
+        client = AsyncExchange(None, base_url=url, scheduler=RequestScheduler())
+        guard = LatencyGuard(budget_ms=100, pull_mult=2, recover_sec=60)
+        task = asyncio.create_task(guard.run(client, interval=0.05))
+        try:
+            await asyncio.sleep(0.3)
+            assert guard.mode == OK and guard.rtt.count
+            server.latency = 0.15
+            await asyncio.sleep(0.6)
+            assert guard.mode == WIDEN
+            server.latency = 0.5    # cut off at the pull threshold: a failed ping
+            await asyncio.sleep(0.6)
+            assert guard.mode == PULL and guard.ping_failed
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await client.close()
+            await server.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,92 @@
+# tests/test_quoting.py
+#
+# QuoteEngine against a scripted client: fills racing a modify, and the
+# sweep of open orders the registry doesn't track.
+
+import asyncio
+
+from quoting import QuoteEngine
+from utils import now
+
+
+class Tracker:
+    def add_listener(self, fn):
+        self.push = fn
+
+    def is_closed(self, oid):
+        return False
+
+    def forget(self, oid):
+        pass
+
+
+class Client:
+    """
+    Rests every order under a new oid; `during_modify` runs while a modify
+    is in flight.
+    """
+
+    def __init__(self):
+        self.oid = 100
+        self.cancelled = []
+        self.during_modify = None
+
+    def _ok(self, n):
+        statuses = []
+        for _ in range(n):
+            self.oid += 1
+            statuses.append({"resting": {"oid": self.oid}})
+        return {"status": "ok", "response": {"type": "order", "data": {"statuses": statuses}}}
+
+    async def bulk_orders(self, reqs, timeout=None):
+        return self._ok(len(reqs))
+
+    async def bulk_modify(self, reqs, timeout=None):
+        if self.during_modify:
+            self.during_modify()
+        return self._ok(len(reqs))
+
+    async def bulk_cancel(self, reqs, timeout=None):
+        self.cancelled += [c["oid"] for c in reqs]
+        return {"status": "ok", "response": {"type": "cancel", "data": {"statuses": ["success"] * len(reqs)}}}
+
+
+def _engine():
+    fills, tracker, client = [], Tracker(), Client()
+    engine = QuoteEngine(client, "SOL", lambda side, px, sz: fills.append((side, px, sz)), tracker)
+    asyncio.run(engine.sync({("buy", 0): (150.0, 1.0)}))
+    return engine, client, tracker, fills
+
+
+def test_fill_during_modify_counts_against_the_old_order():
+    engine, client, tracker, fills = _engine()
+    (q,) = engine.registry
+    client.during_modify = lambda: tracker.push({"coin": "SOL", "oid": 101, "px": "150.0", "sz": "0.4"})
+    asyncio.run(engine.sync({("buy", 0): (149.9, 1.0)}))
+    assert fills == [("buy", 150.0, 0.4)]
+    assert list(engine.registry) == [q]
+    assert (q.oid, q.px, q.sz, q.filled) == (102, 149.9, 1.0, 0.0)
+    tracker.push({"coin": "SOL", "oid": 101, "px": "150.0", "sz": "0.1"})   # later still
+    assert fills[-1] == ("buy", 150.0, 0.1) and q.filled == 0.0
+
+
+def test_order_filled_out_during_modify_cancels_the_replacement():
+    engine, client, tracker, fills = _engine()
+    client.during_modify = lambda: tracker.push({"coin": "SOL", "oid": 101, "px": "150.0", "sz": "1.0"})
+    asyncio.run(engine.sync({("buy", 0): (149.9, 1.0)}))
+    assert fills == [("buy", 150.0, 1.0)]
+    assert not len(engine.registry) and client.cancelled == [102]
+
+
+def test_reconcile_cancels_untracked_orders():
+    engine, client, tracker, fills = _engine()
+    engine.unsettled = True
+    old = (now() - 60) * 1000
+    open_orders = [
+        {"coin": "SOL", "oid": 101, "timestamp": old},              # tracked
+        {"coin": "SOL", "oid": 7, "timestamp": old},                # left by a failed cancel
+        {"coin": "SOL", "oid": 8, "timestamp": now() * 1000},       # may be awaiting its ack
+        {"coin": "ETH", "oid": 9, "timestamp": old},                # another engine's
+    ]
+    assert asyncio.run(engine.reconcile(open_orders)) == 1
+    assert client.cancelled == [7] and not engine.unsettled
@@ -0,0 +1,41 @@
+# tests/test_ratelimit.py
+#
+# RequestScheduler: the URGENT reserve, and identical /info requests
+# sharing one round trip through AsyncExchange against local_exchange.py.
+
+import asyncio
+
+from ratelimit import RequestScheduler, URGENT, QUOTE
+
+
+def test_reserve_is_left_for_urgent():
+    async def run():
+        sched = RequestScheduler(weight_per_min=10, reserve=4)
+        await sched.acquire(QUOTE, 6)
+        quote = asyncio.create_task(sched.acquire(QUOTE, 1))
+        await asyncio.sleep(0.01)
+        assert not quote.done() and sched.queued() == 1
+        await asyncio.wait_for(sched.acquire(URGENT, 1), 0.1)
+        quote.cancel()
+        await asyncio.gather(quote, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_identical_info_requests_share_one_round_trip():
+    from exchange_client import AsyncExchange
+    from local_exchange import LocalExchange, DEFAULT_META
+
+    async def run():
+        server = LocalExchange(latency=0.05)
+        url = await server.start()
+        client = AsyncExchange(None, base_url=url, scheduler=RequestScheduler())
+        try:
+            results = await asyncio.gather(*(client.info({"type": "meta"}) for _ in range(5)))
+            assert all(r == DEFAULT_META for r in results)
+            assert server.requests.count(("/info", "meta")) == 1
+        finally:
+            await client.close()
+            await server.stop()
+
+    asyncio.run(run())
@@ -1,36 +1,39 @@
-import ccxt
+import glob
+import itertools
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
 import pandas as pd
-import pandas_ta as ta
 from xgboost import XGBClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import classification_report
-from joblib import dump
-from datetime import datetime
+from sklearn.metrics import classification_report, accuracy_score, log_loss, roc_auc_score
+from predictor import save_artifact, MODEL_PATH
+from indicators import FEATURES
+from features import add_indicators, cached_features
+from config import MIN_PROB
+
+XGB_PARAMS = dict(
+    n_estimators=500,
+    max_depth=6,
+    learning_rate=0.03,
+    subsample=0.7,
+    colsample_bytree=0.9,
+    eval_metric="logloss",
+    random_state=42,
+)
 
 #─── Load OHLCV data ──────────────────────────────────────────
 def fetch_ohlcv(symbol="SOL/USDT", timeframe="5m", limit=1000):
+    import ccxt   # only the online path needs it
     binance = ccxt.binance()
     ohlcv = binance.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
     df = pd.DataFrame(ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"])
     df["time"] = pd.to_datetime(df["timestamp"], unit="ms")
     return df
 
-#─── Add technical indicators ─────────────────────────────────
-def add_indicators(df):
-    df["rsi"] = ta.rsi(df["close"], length=14)
-    df["ema"] = ta.ema(df["close"], length=14)
-    macd = ta.macd(df["close"])
-    df["macd"] = macd["MACD_12_26_9"]
-    df["macd_signal"] = macd["MACDs_12_26_9"]
-    df["macd_hist"] = macd["MACDh_12_26_9"]
-    df["stochrsi"] = ta.stochrsi(df["close"])["STOCHRSIk_14_14_3_3"]
-    df["adx"] = ta.adx(df["high"], df["low"], df["close"])["ADX_14"]
-    df["willr"] = ta.willr(df["high"], df["low"], df["close"])
-    df["atr"] = ta.atr(df["high"], df["low"], df["close"])
-    df["roc"] = ta.roc(df["close"])
-    return df
-
 #─── Label the data (1 = price goes up next candle) ───────────
 def add_labels(df):
     df["future_close"] = df["close"].shift(-1)
@@ -44,9 +47,7 @@ def train_model():
     df = add_labels(df)
     df.dropna(inplace=True)
 
-    features = ["rsi", "ema", "macd", "macd_signal", "macd_hist",
-                "stochrsi", "adx", "willr", "atr", "roc"]
-    X = df[features]
+    X = df[FEATURES]
     y = df["label"]
 
     scaler = StandardScaler()
@@ -56,16 +57,7 @@ def train_model():
         X_scaled, y, test_size=0.2, shuffle=False
     )
 
-    model = XGBClassifier(
-        n_estimators=500,
-        max_depth=6,
-        learning_rate=0.03,
-        subsample=0.7,
-        colsample_bytree=0.9,
-        use_label_encoder=False,
-        eval_metric="logloss",
-        random_state=42
-    )
+    model = XGBClassifier(**XGB_PARAMS)
 
     model.fit(X_train, y_train)
 
@@ -73,8 +65,205 @@ def train_model():
     print("📊 Classification Report:")
     print(classification_report(y_test, y_pred))
 
-    dump(model, "model_xgb.joblib")
-    print("✅ Model saved to model_xgb.joblib")
+    save_artifact(MODEL_PATH, model, scaler, FEATURES)
+    print(f"✅ Model + scaler saved to {MODEL_PATH}")
+
+#─── Offline: local OHLCV files ───────────────────────────────
+OHLCV_COLUMNS = ["timestamp", "time", "open", "high", "low", "close", "volume"]
+
+def _read_chunks(path, chunksize):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        cols = [c for c in pf.schema_arrow.names if c in OHLCV_COLUMNS]
+        for batch in pf.iter_batches(batch_size=chunksize, columns=cols):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=lambda c: c in OHLCV_COLUMNS)
+
+def load_local_ohlcv(pattern, start=None, end=None, chunksize=250_000):
+    """
+    Read every CSV/Parquet file matching `pattern` in chunks, keeping only
+    OHLCV columns inside [start, end) (ms). Files may overlap; rows are
+    de‐duplicated on timestamp.
+    """
+    parts = []
+    for path in sorted(glob.glob(pattern)):
+        for chunk in _read_chunks(path, chunksize):
+            if "timestamp" not in chunk:
+                chunk["timestamp"] = pd.to_datetime(chunk["time"], utc=True).astype("int64") // 1_000_000
+            ts = chunk["timestamp"].astype("int64")
+            keep = np.ones(len(chunk), bool)
+            if start is not None:
+                keep &= ts >= start
+            if end is not None:
+                keep &= ts < end
+            chunk = chunk.loc[keep, ["open", "high", "low", "close", "volume"]].astype("float64")
+            chunk.insert(0, "timestamp", ts[keep])
+            parts.append(chunk)
+    if not parts:
+        raise FileNotFoundError(f"no OHLCV rows for {pattern}")
+    df = pd.concat(parts, ignore_index=True)
+    df = df.sort_values("timestamp").drop_duplicates("timestamp").reset_index(drop=True)
+    df["time"] = pd.to_datetime(df["timestamp"], unit="ms")
+    return df
+
+def build_dataset(df):
+    """
+    Features (vectorized over the whole history, via the feature cache) and
+    next‐candle labels.
+    Returns X (float64, FEATURES order), y (int8) and timestamps (ms).
+    """
+    df[FEATURES] = cached_features(df)
+    df = add_labels(df)
+    df = df.iloc[:-1].dropna(subset=FEATURES)   # the last row has no next candle
+    return (df[FEATURES].to_numpy(np.float64), df["label"].to_numpy(np.int8),
+            df["timestamp"].to_numpy(np.int64))
+
+#─── Walk‐forward cross‐validation ────────────────────────────
+def walk_forward_folds(n, n_folds, test_size=None, train_size=None, gap=1):
+    """
+    (train_start, train_end, test_start, test_end) index ranges. Each test
+    block follows its training data in time, separated by `gap` rows since a
+    label looks one candle ahead. `train_size=None` is an expanding window.
+    """
+    test_size = test_size or n // (n_folds + 1)
+    folds = []
+    for k in range(n_folds):
+        test_end   = n - (n_folds - 1 - k) * test_size
+        test_start = test_end - test_size
+        train_end  = test_start - gap
+        train_start = 0 if train_size is None else max(0, train_end - train_size)
+        if train_end - train_start < 100 or test_start < 0:
+            continue
+        folds.append((train_start, train_end, test_start, test_end))
+    return folds
+
+def _combos(grid):
+    return [dict(zip(grid, vals)) for vals in itertools.product(*grid.values())]
+
+def _label(params):
+    return ", ".join(f"{k}={v}" for k, v in params.items()) or "defaults"
+
+_shared = {}
+
+def _init_worker(x_path, y_path):
+    # every worker maps the same on‐disk arrays instead of getting a copy
+    _shared["X"] = np.load(x_path, mmap_mode="r")
+    _shared["y"] = np.load(y_path, mmap_mode="r")
+
+def _run_fold(job):
+    fold, (tr0, tr1, te0, te1), params = job
+    X, y = _shared["X"], _shared["y"]
+    scaler = StandardScaler().fit(X[tr0:tr1])
+    model = XGBClassifier(**{**XGB_PARAMS, **params, "n_jobs": 1})
+    model.fit(scaler.transform(X[tr0:tr1]), y[tr0:tr1])
+    p = model.predict_proba(scaler.transform(X[te0:te1]))[:, 1]
+    y_test = np.asarray(y[te0:te1])
+
+    # what the bot acts on: only calls at least MIN_PROB confident
+    sure = (p >= MIN_PROB) | (p <= 1 - MIN_PROB)
+    return {
+        "params": params,
+        "fold": fold,
+        "n_train": tr1 - tr0,
+        "n_test": te1 - te0,
+        "accuracy": accuracy_score(y_test, p >= 0.5),
+        "logloss": log_loss(y_test, p, labels=[0, 1]),
+        "auc": roc_auc_score(y_test, p) if 0 < y_test.sum() < len(y_test) else np.nan,
+        "base_rate": y_test.mean(),
+        "coverage": sure.mean(),
+        "hit_rate": ((p[sure] >= 0.5) == y_test[sure]).mean() if sure.any() else np.nan,
+    }
+
+def walk_forward(X, y, ts, grid=None, n_folds=5, test_size=None, train_size=None, workers=None):
+    """
+    Evaluate every hyperparameter combination in `grid` ({name: [values]})
+    on every walk‐forward fold, in parallel across processes. Returns one row
+    per (params, fold).
+    """
+    combos = _combos(grid or {})
+    folds = walk_forward_folds(len(X), n_folds, test_size, train_size)
+    if not folds:
+        raise ValueError(f"{len(X)} rows is too little for {n_folds} folds")
+    jobs = [(k, f, c) for c in combos for k, f in enumerate(folds)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        x_path, y_path = os.path.join(tmp, "X.npy"), os.path.join(tmp, "y.npy")
+        np.save(x_path, X)
+        np.save(y_path, y)
+        with ProcessPoolExecutor(workers, mp_context=get_context("spawn"),
+                                 initializer=_init_worker, initargs=(x_path, y_path)) as pool:
+            rows = list(pool.map(_run_fold, jobs))
+
+    report = pd.DataFrame(rows)
+    report["test_from"] = pd.to_datetime([ts[folds[k][2]] for k in report["fold"]], unit="ms")
+    report["test_to"]   = pd.to_datetime([ts[folds[k][3] - 1] for k in report["fold"]], unit="ms")
+    report["params"]    = report["params"].map(_label)
+    return report
+
+def summarize(report):
+    metrics = ["accuracy", "logloss", "auc", "coverage", "hit_rate"]
+    return report.groupby("params")[metrics].agg(["mean", "std"]).sort_values(("logloss", "mean"))
+
+def train_offline(pattern, start=None, end=None, grid=None, n_folds=5, test_size=None,
+                  train_size=None, workers=None, report_path=None, save=True):
+    df = load_local_ohlcv(pattern, start, end)
+    X, y, ts = build_dataset(df)
+    print(f"📂 {len(df)} candles → {len(X)} samples "
+          f"({pd.to_datetime(ts[0], unit='ms')} … {pd.to_datetime(ts[-1], unit='ms')})")
+
+    grid = grid or {}
+    report = walk_forward(X, y, ts, grid, n_folds, test_size, train_size, workers)
+    pd.set_option("display.width", 200)
+    print("📊 Walk‐forward folds:")
+    print(report.drop(columns=["n_train"]).to_string(index=False, float_format="%.4f"))
+    summary = summarize(report)
+    print("📊 By parameters (best logloss first):")
+    print(summary.to_string(float_format="%.4f"))
+    if report_path:
+        report.to_csv(report_path, index=False)
+        print(f"📝 Fold report written to {report_path}")
+
+    if save:
+        # refit the best combination on the most recent training window
+        best = summary.index[0]
+        params = next(c for c in _combos(grid) if _label(c) == best)
+        recent = slice(max(0, len(X) - train_size) if train_size else 0, len(X))
+        scaler = StandardScaler().fit(X[recent])
+        model = XGBClassifier(**{**XGB_PARAMS, **params})
+        model.fit(scaler.transform(X[recent]), y[recent])
+        save_artifact(MODEL_PATH, model, scaler, FEATURES)
+        print(f"✅ Model ({best}) + scaler saved to {MODEL_PATH}")
+    return report
+
+def _parse_grid(items):
+    grid = {}
+    for item in items:
+        key, _, vals = item.partition("=")
+        grid[key] = [float(v) if "." in v else int(v) for v in vals.split(",")]
+    return grid
+
+def _ms(date):
+    return None if date is None else int(pd.Timestamp(date, tz="UTC").value // 1_000_000)
 
 if __name__ == "__main__":
-    train_model()
+    import argparse
+    parser = argparse.ArgumentParser(description="Train the ML filter model")
+    parser.add_argument("--data", help="glob of local OHLCV CSV/Parquet files (offline walk‐forward mode)")
+    parser.add_argument("--start", help="first date to use, e.g. 2024-01-01")
+    parser.add_argument("--end", help="date to stop before")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--test-size", type=int, default=None, help="rows per test fold")
+    parser.add_argument("--train-size", type=int, default=None, help="rolling training window (rows); default expanding")
+    parser.add_argument("--grid", nargs="*", default=[], metavar="PARAM=v1,v2", help="XGBoost hyperparameter grid")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--report", help="write the per‐fold report to this CSV")
+    parser.add_argument("--no-save", action="store_true", help="evaluate only, keep the current artifact")
+    args = parser.parse_args()
+
+    if args.data:
+        train_offline(args.data, _ms(args.start), _ms(args.end), _parse_grid(args.grid), args.folds,
+                      args.test_size, args.train_size, args.workers, args.report, not args.no_save)
+    else:
+        train_model()
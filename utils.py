@@ -0,0 +1,15 @@
+# utils.py
+
+import time
+
+#─── clock ─────────────────────────────────────────────────────────────────────
+# Strategy code reads wall time through `now()` so the backtest can run it on
+# a virtual clock. Live, this is plain time.time().
+_clock = time.time
+
+def now():
+    return _clock()
+
+def set_clock(fn):
+    global _clock
+    _clock = fn
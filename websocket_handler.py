@@ -1,56 +1,288 @@
 # websocket_handler.py
 
 import asyncio
+import random
+import time
 import websockets
 import json
-import redis
-from config import TRADING_COIN, REDIS_HOST, REDIS_PORT, API_URL
-
-r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
-
-async def listen_orderbook():
-    print(f"📡 Connecting to Hyperliquid WebSocket for {TRADING_COIN} @ {API_URL}")
-    async with websockets.connect(API_URL, ping_interval=None) as ws:
-        subscribe_msg = {
-            "method": "subscribe",
-            "subscription": {
-                "type": "l2Book",
-                "coin": TRADING_COIN
-            }
-        }
-
-        await ws.send(json.dumps(subscribe_msg))
-
-        async def send_heartbeat():
-            while True:
-                try:
-                    await ws.send(json.dumps({"method": "ping"}))
-                    await asyncio.sleep(10)
-                except Exception as e:
-                    break
-
-        asyncio.create_task(send_heartbeat())
+from config import (
+    TRADING_COIN, API_URL, REDIS_MIRROR, RECORD_BOOK,
+    WS_BACKOFF_MIN_SEC, WS_BACKOFF_MAX_SEC, WS_RECV_TIMEOUT, WS_STANDBY, WS_BOOK_DEPTH,
+)
+from orderbook import get_book
+from fills import fill_tracker
+from recorder import BookRecorder
+from metrics import ws_parse_ms, ws_reconnects_total, ws_recovery_seconds
+from latency import latency_guard
+from ws_decode import frame_channel, decode_l2book
+from redis_client import bus
 
+async def send_heartbeat(ws):
+    while True:
         try:
-            while True:
-                msg = await ws.recv()
+            await ws.send(json.dumps({"method": "ping"}))
+            await asyncio.sleep(10)
+        except Exception:
+            break
+
+def backoff(attempt):
+    """
+    Full‐jitter exponential backoff: uniform in [0, min(max, min·2^attempt)].
+    """
+    return random.uniform(0, min(WS_BACKOFF_MAX_SEC, WS_BACKOFF_MIN_SEC * 2 ** attempt))
+
+
+class BookFeed:
+    """
+    One supervised websocket connection feeding `books`, when `user` is
+    set the fill tracker, and when `on_trades` is set the coins' public
+    trades (on_trades(list of trades)). Reconnects forever and resubscribes as soon as
+    the socket is open. Several feeds can share the same books (hot
+    standby): a push older than what the book already has is skipped, and
+    the books are marked stale only when every feed in `group` is down.
+    """
+
+    def __init__(self, name, books, group, user=None, url=API_URL, recorder=None, on_trades=None):
+        self.name       = name
+        self.books      = books
+        self.group      = group
+        self.user       = user
+        self.on_trades  = on_trades
+        self.url        = url
+        self.recorder   = recorder
+        self.live       = False   # connected and delivered a valid book
+        self.down_since = None    # perf_counter() when the last connection was lost
+        self.recoveries = []      # seconds from connection lost to first valid book, per reconnect
+        self._ws        = None
+
+    #─── supervisor ────────────────────────────────────────────────────────────
+    async def run(self):
+        attempt = 0
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=None, open_timeout=WS_RECV_TIMEOUT) as ws:
+                    self._ws = ws
+                    await self._subscribe(ws)
+                    print(f"📡 [{self.name}] subscribed: {', '.join(self.books) or 'user channels'} @ {self.url}")
+                    if not self.books:
+                        self._went_live()
+                    heartbeat = asyncio.create_task(send_heartbeat(ws))
+                    try:
+                        await self._pump(ws)
+                    finally:
+                        heartbeat.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WS] [{self.name}] connection lost: {e!r}")
+            finally:
+                self._ws = None
+            if self.live:
+                attempt = 0   # that connection delivered data: restart the backoff
+            self._went_down()
+            await asyncio.sleep(backoff(attempt))
+            attempt += 1
+
+    def drop(self):
+        """
+        Close the current connection (tests / forced failover).
+        """
+        if self._ws is not None:
+            asyncio.create_task(self._ws.close())
+
+    def add_user(self, user):
+        """
+        Subscribe to `user`'s channels from now on, starting with the current
+        connection (main.py streams books before the key file is read).
+        """
+        self.user = user
+        if self._ws is not None:
+            asyncio.create_task(self._subscribe_user(self._ws))
+
+    async def _subscribe(self, ws):
+        for coin in self.books:
+            await ws.send(json.dumps({
+                "method": "subscribe",
+                "subscription": {"type": "l2Book", "coin": coin},
+            }))
+            if self.on_trades:
+                await ws.send(json.dumps({
+                    "method": "subscribe",
+                    "subscription": {"type": "trades", "coin": coin},
+                }))
+        if self.user:
+            await self._subscribe_user(ws)
+
+    async def _subscribe_user(self, ws):
+        for channel in ("orderUpdates", "userFills"):
+            await ws.send(json.dumps({
+                "method": "subscribe",
+                "subscription": {"type": channel, "user": self.user},
+            }))
+
+    def _went_live(self):
+        self.live = True
+        if self.down_since is not None:
+            dt = time.perf_counter() - self.down_since
+            self.recoveries.append(dt)
+            ws_recovery_seconds.labels(self.name).observe(dt)
+            print(f"✅ [{self.name}] feed back: first valid book {dt * 1e3:.0f} ms after the drop")
+            self.down_since = None
 
+    def _went_down(self):
+        ws_reconnects_total.labels(self.name).inc()
+        if self.down_since is None:
+            self.down_since = time.perf_counter()
+        self.live = False
+        if not any(f.live for f in self.group):
+            for book in self.books.values():
+                book.mark_stale()
+
+    #─── messages ──────────────────────────────────────────────────────────────
+    async def _pump(self, ws):
+        while True:
+            # any message, pongs included, proves the connection is alive
+            msg = await asyncio.wait_for(ws.recv(), WS_RECV_TIMEOUT)
+            t_recv = time.perf_counter()
+            if isinstance(msg, bytes):
+                msg = msg.decode()
+
+            # route on the raw text; pongs and acks are never parsed
+            channel = frame_channel(msg)
+            if channel == "l2Book":
+                self._on_book(msg, t_recv)
+            elif channel == "trades" and self.on_trades:
                 try:
-                    data = json.loads(msg)
+                    self.on_trades(json.loads(msg)["data"])
                 except Exception as e:
+                    print(f"[WS] trades error: {e!r}")
+            elif channel in ("orderUpdates", "userFills"):
+                try:
+                    data = json.loads(msg)["data"]
+                except Exception:
                     continue
+                if channel == "orderUpdates":
+                    fill_tracker.on_order_updates(data)
+                elif not data.get("isSnapshot"):
+                    # the first frame after (re)subscribing is the account's
+                    # recent fill history, not new fills; ones missed while
+                    # disconnected come in through reconcile_fills
+                    fill_tracker.on_fills(data.get("fills", []))
 
-                if data.get("channel") == "l2Book" and data["data"].get("coin") == TRADING_COIN:
-                    try:
-                        bids = data["data"]["levels"][0]
-                        asks = data["data"]["levels"][1]
+    def _on_book(self, msg, t_recv):
+        try:
+            coin, ts, bids, asks = decode_l2book(msg, WS_BOOK_DEPTH)
+        except (ValueError, KeyError, IndexError, TypeError):
+            return
+        book = self.books.get(coin)
+        if book is None:
+            return
+        # not yet applied (a standby connection may have delivered it first)
+        if not ts or book.stale or ts > book.ts:
+            if self.recorder:
+                self.recorder.record(coin, ts, bids, asks)
+            if bids and asks:
+                book.update(bids, asks, ts, t_recv)
+                ws_parse_ms.observe((time.perf_counter() - t_recv) * 1e3)
+                latency_guard.on_message(ts, book.recv_ts)
+        if bids and asks and not self.live:
+            self._went_live()
+
+
+async def listen_orderbook(user=None, l2book=True, coins=None, url=API_URL, standby=WS_STANDBY,
+                           mirror=REDIS_MIRROR, feeds=None, on_trades=None):
+    """
+    Stream l2Book for every coin in `coins` (default TRADING_COIN) over one
+    supervised connection, each into its own in-process book. When `user`
+    is given, also subscribe to that account's orderUpdates/userFills
+    channels and feed them into the fill tracker. `l2book=False` leaves only
+    the user channels, for processes that take the book from shm_book or
+    Redis. `mirror` publishes every book update to Redis Streams.
+    `standby` adds a second, book‐only connection. `on_trades` gets the
+    coins' public trades. The BookFeed objects are appended to `feeds` when
+    given.
+    """
+    coins = list(coins or [TRADING_COIN])
+    books = {coin: get_book(coin) for coin in coins} if l2book else {}
+    if mirror and books:
+        # every update to the Redis Streams bus (redis_client.py), off the listener's path
+        for book in books.values():
+            bus.attach(book)
+        bus.start()
+    recorder = BookRecorder().start() if RECORD_BOOK and books else None
+
+    group = []
+    group.append(BookFeed("primary", books, group, user, url, recorder, on_trades))
+    if standby and books:
+        group.append(BookFeed("standby", books, group, None, url, recorder))
+    if feeds is not None:
+        feeds.extend(group)
+
+    try:
+        await asyncio.gather(*(f.run() for f in group))
+    finally:
+        if recorder:
+            await asyncio.to_thread(recorder.close)
+            print(f"[REC] {recorder.written} snapshots written, {recorder.dropped} dropped")
+
+
+#─── local recovery check ──────────────────────────────────────────────────────
+async def _recovery_check(drops=5, standby=False, push_ms=50):
+    """
+    Against local_exchange: push a book every `push_ms`, kill the connection
+    `drops` times and report how long the book stayed stale each time.
+    With `standby`, only the primary is killed and the book should never go
+    stale. Returns (stale gaps, reconnect → first valid book times), in s.
+    """
+    from local_exchange import LocalExchange
+
+    server = LocalExchange()
+    url = (await server.start()).replace("http", "ws") + "/ws"
+    book = get_book("SOL")
+    feeds = []
+    listener = asyncio.create_task(listen_orderbook(coins=["SOL"], url=url, standby=standby, mirror=False, feeds=feeds))
+
+    async def publish():
+        while True:
+            await server.publish_book("SOL", [{"px": "150.0", "sz": "1.0", "n": 1}],
+                                      [{"px": "150.1", "sz": "1.0", "n": 1}])
+            await asyncio.sleep(push_ms / 1000)
+
+    gaps, stale_since = [], None
+    async def watch():
+        nonlocal stale_since
+        seq = book.seq
+        while True:
+            seq = await book.wait_for_update(seq)
+            if book.stale and stale_since is None:
+                stale_since = time.perf_counter()
+            elif not book.stale and stale_since is not None:
+                gaps.append(time.perf_counter() - stale_since)
+                stale_since = None
 
-                        if bids and asks:
-                            orderbook_data = json.dumps({"bids": bids, "asks": asks})
-                            r.set(f"{TRADING_COIN}_orderbook", orderbook_data)
+    tasks = [asyncio.create_task(publish()), asyncio.create_task(watch())]
+    try:
+        # every connection up (the book may still be live from an earlier run)
+        while not (feeds and all(f.live for f in feeds)):
+            await asyncio.sleep(0.01)
+        for _ in range(drops):
+            if standby:
+                feeds[0].drop()
+            else:
+                await server.drop_websockets()
+            await asyncio.sleep(1.0)
+    finally:
+        for t in tasks + [listener]:
+            t.cancel()
+        await asyncio.gather(*tasks, listener, return_exceptions=True)
+        await server.stop()
 
-                    except Exception as e:
-                        continue
+    rec = [r for f in feeds for r in f.recoveries]
+    print(f"{drops} drops{' (primary only, standby up)' if standby else ''}: "
+          f"book stale {len(gaps)}× {', '.join(f'{g * 1e3:.0f}' for g in gaps) or '–'} ms; "
+          f"reconnect → first valid book {', '.join(f'{r * 1e3:.0f}' for r in rec)} ms")
+    return gaps, rec
 
-        except Exception as e:
-            await asyncio.sleep(3)
+if __name__ == "__main__":
+    import sys
+    asyncio.run(_recovery_check(standby="--standby" in sys.argv))
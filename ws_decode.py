@@ -0,0 +1,180 @@
+# ws_decode.py
+#
+# Fast path for websocket frames. The channel is read off the raw text
+# before anything is parsed, so pongs and subscription acks cost one
+# substring search. l2Book frames are decoded straight from the text into
+# Levels (fixed‐point int64, see orderbook.py): the level arrays are cut to
+# WS_BOOK_DEPTH in the text, and the numbers left go through one NumPy
+# conversion for both sides. A frame the fast path can't vouch for (level
+# count doesn't match, unexpected layout) goes through json.loads instead,
+# so the result never depends on which path ran.
+#
+#   python ws_decode.py [frames.jsonl]   # msgs/s and retained allocations vs json.loads
+
+import json
+import re
+import numpy as np
+
+from config import WS_BOOK_DEPTH
+from orderbook import Levels, PX_MUL, SZ_MUL
+
+_COIN = re.compile(r'"coin":\s*"([^"]*)"')
+_TIME = re.compile(r'"time":\s*(\d+)')
+# everything that can't be part of a number becomes a separator
+_NUMBERS = str.maketrans({c: " " for c in range(128) if chr(c) not in "0123456789.eE+-"})
+_SCALE = np.array([PX_MUL, SZ_MUL, 1], dtype=np.float64)
+
+
+def frame_channel(msg):
+    """
+    The "channel" of a raw frame without parsing it; None if absent.
+    """
+    i = msg.find('"channel"')
+    if i < 0:
+        return None
+    j = msg.find('"', msg.find(":", i + 9) + 1)
+    return msg[j + 1:msg.find('"', j + 1)] if j >= 0 else None
+
+
+def decode_l2book(msg, depth=WS_BOOK_DEPTH):
+    """
+    (coin, ts, bids, asks) from a raw l2Book frame, levels as Levels.
+    """
+    try:
+        return _decode_fast(msg, depth)
+    except (ValueError, AttributeError):
+        return decode_l2book_json(json.loads(msg)["data"], depth)
+
+
+def decode_l2book_json(d, depth=WS_BOOK_DEPTH):
+    """
+    Same result from an already‐parsed `data` payload.
+    """
+    bids, asks = d["levels"][0], d["levels"][1]
+    return d.get("coin"), d.get("time"), Levels.from_levels(bids, depth), Levels.from_levels(asks, depth)
+
+
+def _cut(msg, start, end, n, depth):
+    # end of the `depth`‐th level object when the side has more than that
+    if n <= depth:
+        return end
+    for _ in range(depth):
+        start = msg.index("}", start) + 1
+    return start
+
+def _decode_fast(msg, depth):
+    i = msg.index('"levels"')
+    b0 = msg.index("[", msg.index("[", i) + 1)    # [[{bid}, ...], [{ask}, ...]]
+    b1 = msg.index("]", b0)                        # level objects hold no brackets
+    a0 = msg.index("[", b1 + 1)
+    a1 = msg.index("]", a0)
+    nb, na = msg.count("{", b0, b1), msg.count("{", a0, a1)
+    if nb + na:
+        # values are read by position: the (one) serializer must write px, sz, n in that order
+        first = msg.index("{", b0 if nb else a0)
+        if not first < msg.find('"px"', first) < msg.find('"sz"', first) < msg.find('"n"', first) < msg.index("}", first):
+            raise ValueError("l2Book levels not in px/sz/n order")
+    if nb > depth or na > depth:
+        b1, a1 = _cut(msg, b0, b1, nb, depth), _cut(msg, a0, a1, na, depth)
+        nb, na = min(nb, depth), min(na, depth)
+        vals = msg[b0 + 1:b1].translate(_NUMBERS).split() + msg[a0 + 1:a1].translate(_NUMBERS).split()
+    else:
+        vals = msg[b0 + 1:a1].translate(_NUMBERS).split()   # both sides in one pass
+    if len(vals) != 3 * (nb + na):
+        raise ValueError("l2Book levels not in px/sz/n form")
+    a = np.array(vals, dtype=np.float64).reshape(-1, 3)
+    a *= _SCALE
+    fixed = np.rint(a, out=a).astype(np.int64)
+
+    ts = _TIME.search(msg)
+    return (_COIN.search(msg).group(1), int(ts.group(1)) if ts else None,
+            Levels.from_fixed(fixed[:nb]), Levels.from_fixed(fixed[nb:]))
+
+
+#─── benchmark ─────────────────────────────────────────────────────────────────
+def _frames(n, depth=20, pong_every=10):
+    out = []
+    for i in range(n):
+        if i % pong_every == 0:
+            out.append('{"channel":"pong"}')
+            continue
+        mid = 150 + (i % 100) * 0.01
+        bids = [{"px": f"{mid - 0.01 * (k + 1):.2f}", "sz": f"{10 + k * 1.37:.2f}", "n": k % 4 + 1} for k in range(depth)]
+        asks = [{"px": f"{mid + 0.01 * (k + 1):.2f}", "sz": f"{12 + k * 0.91:.2f}", "n": k % 3 + 1} for k in range(depth)]
+        out.append(json.dumps({"channel": "l2Book", "data": {"coin": "SOL", "time": 1_700_000_000_000 + i,
+                                                             "levels": [bids, asks]}}, separators=(",", ":")))
+    return out
+
+
+def _old_path(msg):
+    # what the listener and the quoting loop used to do per frame: parse
+    # everything, then turn the top of book into floats (book, then candles)
+    data = json.loads(msg)
+    if data.get("channel") != "l2Book":
+        return None
+    d = data["data"]
+    bids, asks = d["levels"][0], d["levels"][1]
+    top = float(bids[0]["px"]), float(asks[0]["px"])
+    mid = (float(bids[0]["px"]) + float(asks[0]["px"])) / 2
+    return bids, asks, top, mid
+
+
+def _old_path_fixed(msg):
+    # ... plus the per‐level string → fixed‐point pass the shm ingest and the
+    # recorder each made on every push
+    out = _old_path(msg)
+    if out is not None:
+        Levels.from_levels(out[0]), Levels.from_levels(out[1])
+    return out
+
+
+def _new_path(msg):
+    if frame_channel(msg) != "l2Book":
+        return None
+    coin, ts, bids, asks = decode_l2book(msg)
+    top = bids.best(), asks.best()
+    return bids, asks, top, (top[0] + top[1]) / 2
+
+
+def bench(frames):
+    import sys
+    import time
+    import tracemalloc
+
+    for name, fn in (("json.loads", _old_path), ("+ consumer", _old_path_fixed), ("fast path", _new_path)):
+        t0 = time.perf_counter()
+        for m in frames:
+            fn(m)
+        dt = time.perf_counter() - t0
+        # what each decoded frame keeps alive (the book holds the last one)
+        tracemalloc.start()
+        blocks = sys.getallocatedblocks()
+        kept = [fn(m) for m in frames]
+        blocks = sys.getallocatedblocks() - blocks
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del kept
+        print(f"{name:10}  {len(frames) / dt:>9,.0f} msgs/s  {dt / len(frames) * 1e6:6.1f} µs/msg  "
+              f"retained {blocks / len(frames):6.1f} blocks, {size / len(frames):7.0f} B per msg")
+
+    # both paths must agree on every level
+    for m in frames:
+        old, new = _old_path(m), _new_path(m)
+        if old is None:
+            assert new is None
+            continue
+        assert old[2] == new[2]
+        for side_old, side_new in zip(old[:2], new[:2]):
+            ref = Levels.from_levels(side_old, WS_BOOK_DEPTH)
+            assert (ref.px == side_new.px).all() and (ref.sz == side_new.sz).all() and (ref.n == side_new.n).all()
+    print(f"{len(frames)} frames: identical levels and top of book")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            frames = [line.strip() for line in f if line.strip()]
+    else:
+        frames = _frames(20_000)
+    bench(frames)